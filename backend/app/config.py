@@ -1,10 +1,22 @@
 """Application configuration via pydantic-settings."""
 
 from functools import lru_cache
+from typing import Literal, Optional
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class LLMBackendConfig(BaseModel):
+    """An extra OpenAI-compatible chat completions endpoint."""
+
+    name: str
+    url: str
+    model: str
+    api_key: str = ""
+    tasks: list[str] = ["transcription", "synthesis"]
+
+
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
@@ -16,15 +28,54 @@ class Settings(BaseSettings):
 
     # OpenRouter API
     openrouter_api_key: str
+    openrouter_api_url: str = "https://openrouter.ai/api/v1/chat/completions"
     openrouter_model_transcription: str = "google/gemini-2.5-pro-preview"
     openrouter_model_synthesis: str = "google/gemini-2.5-pro-preview"
 
+    # LLM routing - extra backends as a JSON list of LLMBackendConfig objects
+    llm_backends: list[LLMBackendConfig] = []
+    llm_ewma_alpha: float = 0.3
+    llm_unhealthy_error_rate: float = 0.5
+    llm_error_half_life_seconds: float = 60
+    llm_hedge_requests: bool = False
+    llm_hedge_min_samples: int = 5
+
+    # Pipelining - synthesize transcript sections while transcription streams
+    pipeline_synthesis: bool = False
+    pipeline_section_chars: int = 4000
+    pipeline_min_duration_seconds: float = 0
+
+    # Progress - seconds per second of audio assumed until stage timings are learned
+    transcription_realtime_factor: float = 0.1
+    synthesis_realtime_factor: float = 0.05
+    progress_interval_seconds: float = 2.0
+
+    # Scheduling - inputs run at once per session (0 = no limit) and the order queued ones start in
+    session_max_concurrency: int = 0
+    session_order: Literal["sjf", "fifo"] = "sjf"
+    session_max_wait_seconds: float = 60
+
+    # Artifacts - payloads above this size spill to memory-mapped temp files
+    artifact_spill_bytes: int = 1024 * 1024
+    artifact_dir: Optional[str] = None
+
+    # Transcript store - SQLite file, a temp dir path when unset
+    transcript_db_path: Optional[str] = None
+    transcript_ttl_seconds: int = 30 * 24 * 3600
+
     # App settings
     max_file_size_mb: int = 5
     max_file_count: int = 10
     cors_origins: list[str] = ["http://localhost:5173"]
     request_timeout: int = 300
     max_retries: int = 3
+    job_ttl_seconds: int = 3600
+    export_max_mb: int = 256  # results kept for download; the oldest go first past this
+    session_timeout_seconds: int = 600
+    ws_coalesce_window_ms: int = 50
+    drain_timeout_seconds: int = 120
+    stats_enabled: bool = False  # serve GET /stats; keep off where the port is public
+    log_level: str = "DEBUG"
 
 
 @lru_cache
@@ -9,12 +9,16 @@ class ErrorCode(str, Enum):
     """Error codes for frontend mapping."""
 
     FILE_TOO_LARGE = "FILE_TOO_LARGE"
+    TOO_MANY_FILES = "TOO_MANY_FILES"
     UNSUPPORTED_FORMAT = "UNSUPPORTED_FORMAT"
     TRANSCRIPTION_FAILED = "TRANSCRIPTION_FAILED"
     SYNTHESIS_FAILED = "SYNTHESIS_FAILED"
     RATE_LIMITED = "RATE_LIMITED"
     ENCODING_ERROR = "ENCODING_ERROR"
     LLM_TIMEOUT = "LLM_TIMEOUT"
+    SERVER_DRAINING = "SERVER_DRAINING"
+    CANCELLED = "CANCELLED"
+    TRANSCRIPT_NOT_FOUND = "TRANSCRIPT_NOT_FOUND"
     UNKNOWN = "UNKNOWN"
 
 
@@ -43,6 +47,18 @@ class FileTooLargeError(SmeltError):
         )
 
 
+class TooManyFilesError(SmeltError):
+    """Raised when a session or job exceeds the file count limit."""
+
+    def __init__(self, max_count: int, actual_count: int):
+        super().__init__(
+            code=ErrorCode.TOO_MANY_FILES,
+            message=f"TOO MANY FILES. MAX {max_count}.",
+            http_status=400,
+            details=f"Got: {actual_count}",
+        )
+
+
 class UnsupportedFormatError(SmeltError):
     """Raised when file format is not supported."""
 
@@ -116,6 +132,55 @@ class LLMTimeoutError(SmeltError):
         )
 
 
+class ServerDrainingError(SmeltError):
+    """Raised when new work arrives while the server is draining for shutdown."""
+
+    def __init__(self, retry_after: int = 5):
+        super().__init__(
+            code=ErrorCode.SERVER_DRAINING,
+            message="SHIFT'S OVER HERE. RECONNECT AND TRY AGAIN.",
+            http_status=503,
+            details=f"Retry after: {retry_after}s",
+        )
+        self.retry_after = retry_after
+
+
+class ProcessingCancelledError(SmeltError):
+    """Raised in place of a result when the client cancels a file."""
+
+    def __init__(self, details: Optional[str] = None):
+        super().__init__(
+            code=ErrorCode.CANCELLED,
+            message="CANCELLED. AS YOU WISH.",
+            http_status=499,
+            details=details,
+        )
+
+
+class TranscriptNotFoundError(SmeltError):
+    """Raised when a re-synthesis references an unknown or expired transcript."""
+
+    def __init__(self, transcript_id: str):
+        super().__init__(
+            code=ErrorCode.TRANSCRIPT_NOT_FOUND,
+            message="NO SUCH TRANSCRIPT. UPLOAD THE AUDIO AGAIN.",
+            http_status=404,
+            details=f"Transcript: {transcript_id}",
+        )
+
+
+class InvalidMessageError(SmeltError):
+    """Raised when a WebSocket message is missing fields or carries the wrong types."""
+
+    def __init__(self, details: Optional[str] = None):
+        super().__init__(
+            code=ErrorCode.UNKNOWN,
+            message="MALFORMED MESSAGE. READ THE PROTOCOL.",
+            http_status=400,
+            details=details,
+        )
+
+
 class LLMError(SmeltError):
     """Generic LLM error."""
 
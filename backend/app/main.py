@@ -1,12 +1,98 @@
 """SMELT - Raw notes in, clean markdown out."""
 
+import asyncio
+import logging
+import signal
+import sys
+import threading
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .config import get_settings
-from .routers import process
+from .errors import SmeltError
+from .routers import export, jobs, process
+from .services.artifacts import get_artifact_store
+from .services.drain import Drain, get_drain
+from .services.export import export_count
+from .services.llm import OpenRouterClient, get_llm_client
+from .services.timings import get_timing_model
+
+# Pause between warm-up attempts while upstream is unreachable
+WARM_UP_RETRY_SECONDS = 5
+
+
+def configure_logging(level: str):
+    """Send app logs to stdout. Called at startup, never at import."""
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stdout,
+    )
+
+
+class SettingsCORSMiddleware(CORSMiddleware):
+    """CORS middleware that reads allowed origins when the middleware stack is built."""
+
+    def __init__(self, app):
+        super().__init__(
+            app,
+            allow_origins=get_settings().cors_origins,
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+
+
+async def warm_all_backends(client: OpenRouterClient):
+    """Retry the connection pool warm-up until every backend host has answered."""
+    while not await client.warm_up():
+        await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+
+
+def install_drain_handler(drain: Drain, timeout: float):
+    """
+    Drain on SIGTERM before letting the server's own handler shut it down.
+
+    uvicorn closes every WebSocket as soon as it sees SIGTERM, so the drain
+    has to run first: readiness fails, new sessions are refused, in-flight
+    ones get up to timeout seconds, and then the signal is handed on. A
+    second SIGTERM skips the wait.
+    """
+    # Signal handlers can only be installed from the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def hand_over():
+        signal.signal(signal.SIGTERM, previous)
+        if callable(previous):
+            previous(signal.SIGTERM, None)
+        else:
+            signal.raise_signal(signal.SIGTERM)
+
+    draining: set[asyncio.Task] = set()  # keeps the drain task referenced
+
+    async def drain_then_hand_over():
+        await drain.drain(timeout)
+        hand_over()
+
+    def start_drain():
+        task = asyncio.create_task(drain_then_hand_over())
+        draining.add(task)
+        task.add_done_callback(draining.discard)
+
+    def handle_sigterm(sig, frame):
+        if drain.draining:
+            loop.call_soon_threadsafe(hand_over)
+            return
+        drain.draining = True  # readiness fails from this moment
+        loop.call_soon_threadsafe(start_drain)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
 
 @asynccontextmanager
@@ -14,12 +100,21 @@ async def lifespan(app: FastAPI):
     """Application lifespan handler."""
     # Startup
     settings = get_settings()
+    configure_logging(settings.log_level)
     print(f"SMELT starting up...")
     print(f"  Max file size: {settings.max_file_size_mb}MB")
     print(f"  CORS origins: {settings.cors_origins}")
+
+    # Warm the LLM connection pool in the background; /ready reports once
+    # every task has a reachable backend
+    client = get_llm_client()
+    warm_up = asyncio.create_task(warm_all_backends(client))
+    install_drain_handler(get_drain(), settings.drain_timeout_seconds)
     yield
     # Shutdown
     print("SMELT shutting down...")
+    warm_up.cancel()
+    await client.aclose()
 
 
 app = FastAPI(
@@ -30,20 +125,57 @@ app = FastAPI(
 )
 
 # CORS
-settings = get_settings()
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.cors_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(SettingsCORSMiddleware)
 
 # Routers
 app.include_router(process.router)
+app.include_router(jobs.router)
+app.include_router(export.router)
+
+
+@app.exception_handler(SmeltError)
+async def smelt_error_handler(request: Request, exc: SmeltError):
+    """Render SmeltErrors raised by HTTP endpoints with their status code."""
+    headers = None
+    if retry_after := getattr(exc, "retry_after", None):
+        headers = {"Retry-After": str(retry_after)}
+    return JSONResponse(
+        status_code=exc.http_status,
+        headers=headers,
+        content={
+            "type": "error",
+            "message": exc.message,
+            "code": exc.code.value,
+            "details": exc.details,
+        },
+    )
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Liveness: the process is up and serving."""
     return {"status": "ok", "service": "smelt"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: every task has a healthy, reachable backend and the server is not draining."""
+    if get_drain().draining:
+        return JSONResponse(status_code=503, content={"status": "draining", "service": "smelt"})
+    if not get_llm_client().ready():
+        return JSONResponse(status_code=503, content={"status": "unavailable", "service": "smelt"})
+    return {"status": "ready", "service": "smelt"}
+
+
+@app.get("/stats")
+async def runtime_stats():
+    """Live counters for load tests and leak hunting. 404 unless STATS_ENABLED is set."""
+    if not get_settings().stats_enabled:
+        return JSONResponse(status_code=404, content={"detail": "Not Found"})
+    return {
+        "tasks": len(asyncio.all_tasks()),
+        "sessions": get_drain().in_flight,
+        "exports": export_count(),
+        "artifacts": get_artifact_store().stats(),
+        "timings": get_timing_model().stats(),
+    }
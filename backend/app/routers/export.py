@@ -0,0 +1,28 @@
+"""Streaming zip download of a finished session's results."""
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from ..errors import ErrorCode, SmeltError
+from ..services.export import get_export, stream_zip
+
+router = APIRouter(prefix="/v1/exports")
+
+
+@router.get("/{export_id}")
+async def download_export(export_id: str, transcripts: bool = False):
+    """Stream all results of a session as a zip, with a manifest and optional transcripts."""
+    bundle = get_export(export_id)
+    if bundle is None:
+        raise SmeltError(
+            code=ErrorCode.UNKNOWN,
+            message="NOTHING TO EXPORT. IT EXPIRED OR NEVER WAS.",
+            http_status=404,
+            details=f"Export: {export_id}",
+        )
+
+    return StreamingResponse(
+        stream_zip(bundle.entries, include_transcripts=transcripts),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="smelt_{export_id[:8]}.zip"'},
+    )
@@ -0,0 +1,406 @@
+"""HTTP batch API - multipart jobs with streamed NDJSON/SSE progress."""
+
+import asyncio
+import json
+import logging
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from ..config import get_settings
+from ..errors import (
+    ErrorCode,
+    FileTooLargeError,
+    ServerDrainingError,
+    SmeltError,
+    TooManyFilesError,
+)
+from ..services.deadline import Deadline
+from ..services.drain import DRAIN_RETRY_AFTER_SECONDS, get_drain
+from ..services.export import register_export
+from ..services.scheduler import SessionScheduler
+from .process import (
+    FileInput,
+    ProgressReporter,
+    estimate_file_seconds,
+    estimate_text_seconds,
+    process_file,
+    process_text,
+    run_scheduled,
+    upload_size,
+)
+
+logger = logging.getLogger("smelt.jobs")
+
+router = APIRouter(prefix="/v1/jobs")
+
+# Room for part headers and boundaries on top of the file payloads
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass(eq=False)
+class Job:
+    """A batch of files processed in the background, with a replayable event log."""
+
+    id: str
+    workdir: Path
+    events: list[dict] = field(default_factory=list)
+    results: dict[str, str] = field(default_factory=dict)
+    errors: dict[str, dict] = field(default_factory=dict)
+    done: bool = False
+    finished_at: Optional[float] = None
+    task: Optional[asyncio.Task] = None
+    _changed: asyncio.Condition = field(default_factory=asyncio.Condition, init=False, repr=False)
+
+    async def publish(self, message: dict):
+        """Record an event and wake up any streaming readers."""
+        if message["type"] == "complete":
+            self.results[message["file"]] = message["content"]
+        elif message["type"] == "error":
+            self.errors[message["file"]] = {
+                "message": message["message"],
+                "code": message["code"],
+            }
+        async with self._changed:
+            self.events.append(message)
+            self._changed.notify_all()
+
+    async def finish(self):
+        """Mark the job done and clean up its spooled uploads."""
+        await self.publish({"type": "done", "export": f"/v1/exports/{self.id}"})
+        self.done = True
+        self.finished_at = time.monotonic()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    async def iter_events(self) -> AsyncIterator[dict]:
+        """Yield every event from the start, then live ones until done."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.events) > index)
+                batch = self.events[index:]
+            index += len(batch)
+            for event in batch:
+                yield event
+                if event["type"] == "done":
+                    return
+
+
+_jobs: dict[str, Job] = {}
+
+
+def _prune_jobs():
+    """Forget finished jobs older than the configured TTL."""
+    ttl = get_settings().job_ttl_seconds
+    now = time.monotonic()
+    for job_id in [
+        job_id
+        for job_id, job in _jobs.items()
+        if job.finished_at is not None and now - job.finished_at > ttl
+    ]:
+        del _jobs[job_id]
+
+
+def _get_job(job_id: str) -> Job:
+    """Look up a job or raise a 404 SmeltError."""
+    job = _jobs.get(job_id)
+    if job is None:
+        raise SmeltError(
+            code=ErrorCode.UNKNOWN,
+            message="NO SUCH JOB. NEVER WAS.",
+            http_status=404,
+            details=f"Job: {job_id}",
+        )
+    return job
+
+
+class MultipartSpool:
+    """
+    Streaming multipart/form-data parser for job uploads.
+
+    File parts go straight to the job's workdir as the request body
+    arrives, so nothing is buffered or spooled twice, and the upload is
+    abandoned as soon as a part goes over the size limit or there is one
+    file too many. Text fields are kept in memory, up to the same limit.
+    Files sharing a name are renamed with a numeric suffix.
+    """
+
+    def __init__(self, workdir: Path, max_size_bytes: int, max_file_count: int):
+        self.workdir = workdir
+        self.max_size_bytes = max_size_bytes
+        self.max_file_count = max_file_count
+        self.files: list[FileInput] = []
+        self.fields: dict[str, str] = {}
+        self.error: Optional[SmeltError] = None
+        self._headers: dict[str, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part: Optional[FileInput] = None
+        self._out = None
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+        self._written = 0
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def close(self):
+        """Close the part being written, if any."""
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def _fail(self, error: SmeltError):
+        if self.error is None:
+            self.error = error
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._part = None
+        self._field_name = None
+        self._field_value = bytearray()
+        self._written = 0
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.decode("latin-1").lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get("content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            self._field_name = name
+            return
+        if len(self.files) >= self.max_file_count:
+            self._fail(
+                TooManyFilesError(max_count=self.max_file_count, actual_count=len(self.files) + 1)
+            )
+            return
+        filename = filename.decode("utf-8", "replace") or "unknown"
+        path = self.workdir / f"{uuid.uuid4().hex}{Path(filename).suffix}"
+        self._part = FileInput(
+            name=self._unique_name(filename),
+            data="",
+            mime=self._headers.get("content-type", b"").decode("latin-1"),
+            path=path,
+        )
+        self._out = open(path, "wb")
+
+    def _unique_name(self, filename: str) -> str:
+        """
+        filename, or filename with _2, _3... before the extension if an
+        earlier part used it, so events and results tell the files apart.
+        """
+        taken = {file.name for file in self.files}
+        path = Path(filename)
+        candidate = filename
+        counter = 2
+        while candidate in taken:
+            candidate = str(path.with_name(f"{path.stem}_{counter}{path.suffix}"))
+            counter += 1
+        return candidate
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self.error is not None:
+            return
+        self._written += end - start
+        if self._written > self.max_size_bytes:
+            self._fail(
+                FileTooLargeError(
+                    max_size_mb=get_settings().max_file_size_mb,
+                    actual_size_mb=self._written / (1024 * 1024),
+                )
+            )
+        elif self._out is not None:
+            self._out.write(data[start:end])
+        elif self._field_name is not None:
+            self._field_value += data[start:end]
+
+    def _on_part_end(self):
+        if self._part is not None:
+            self.close()
+            self.files.append(self._part)
+        elif self._field_name is not None:
+            self.fields[self._field_name] = self._field_value.decode("utf-8", "replace")
+
+
+async def _parse_upload(request: Request, spool: MultipartSpool):
+    """Feed the request body through the spool as it arrives, stopping at the first error."""
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise SmeltError(
+            code=ErrorCode.UNKNOWN,
+            message="SEND MULTIPART/FORM-DATA.",
+            http_status=400,
+            details=f"Content-Type: {content_type.decode('latin-1')}",
+        )
+
+    # A body that cannot fit max_file_count files of max size is refused unread
+    limit = spool.max_file_count * spool.max_size_bytes + MULTIPART_OVERHEAD_BYTES
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise FileTooLargeError(
+            max_size_mb=get_settings().max_file_size_mb,
+            actual_size_mb=int(declared) / (1024 * 1024),
+        )
+
+    parser = MultipartParser(boundary, spool.callbacks())
+    try:
+        async for chunk in request.stream():
+            await asyncio.to_thread(parser.write, chunk)
+            if spool.error is not None:
+                raise spool.error
+        parser.finalize()
+    finally:
+        spool.close()
+
+
+async def _run_job(job: Job, files: list[FileInput], text: Optional[str], max_size_bytes: int):
+    """Process every input of a job in parallel, as the scheduler allows, then mark it done."""
+    settings = get_settings()
+    deadline = Deadline.after(settings.session_timeout_seconds)
+    scheduler = SessionScheduler(
+        slots=settings.session_max_concurrency,
+        order=settings.session_order,
+        max_wait_seconds=settings.session_max_wait_seconds,
+    )
+    inputs: list[tuple[ProgressReporter, float, Callable[[], Awaitable[None]]]] = []
+    for file in files:
+        reporter = ProgressReporter(job.publish, file.name)
+        inputs.append(
+            (
+                reporter,
+                estimate_file_seconds(upload_size(file)),
+                lambda file=file, reporter=reporter: process_file(
+                    file, reporter, max_size_bytes, deadline
+                ),
+            )
+        )
+    if text:
+        reporter = ProgressReporter(job.publish, "pasted_text")
+        inputs.append(
+            (
+                reporter,
+                estimate_text_seconds(text),
+                lambda reporter=reporter: process_text(text, reporter, deadline),
+            )
+        )
+
+    # Every input is known up front, so none takes a slot a shorter one needs
+    for reporter, estimate, _ in inputs:
+        scheduler.expect(reporter, estimate)
+    reporters = [reporter for reporter, _, _ in inputs]
+    coros = [
+        run_scheduled(scheduler, reporter, estimate, start, key=reporter)
+        for reporter, estimate, start in inputs
+    ]
+    try:
+        await asyncio.gather(*coros)
+    finally:
+        register_export([reporter.export_entry() for reporter in reporters], export_id=job.id)
+        await job.finish()
+        get_drain().release(job)
+        logger.info(f"Job {job.id} finished: {len(job.results)} ok, {len(job.errors)} failed")
+
+
+@router.post("", status_code=202)
+async def create_job(request: Request):
+    """
+    Accept a multipart batch (`files` parts and an optional `text` field)
+    and start processing it in the background.
+    """
+    settings = get_settings()
+    max_size_bytes = settings.max_file_size_mb * 1024 * 1024
+
+    drain = get_drain()
+    if drain.draining:
+        raise ServerDrainingError(retry_after=DRAIN_RETRY_AFTER_SECONDS)
+
+    _prune_jobs()
+    job = Job(id=uuid.uuid4().hex, workdir=Path(tempfile.mkdtemp(prefix="smelt-job-")))
+    spool = MultipartSpool(job.workdir, max_size_bytes, settings.max_file_count)
+    try:
+        await _parse_upload(request, spool)
+        text = spool.fields.get("text")
+        if not spool.files and not (text and text.strip()):
+            raise SmeltError(
+                code=ErrorCode.UNKNOWN,
+                message="NOTHING TO PROCESS. TYPE SOMETHING.",
+                http_status=400,
+            )
+    except Exception:
+        shutil.rmtree(job.workdir, ignore_errors=True)
+        raise
+    inputs = spool.files
+
+    _jobs[job.id] = job
+    drain.hold(job)
+    job.task = asyncio.create_task(_run_job(job, inputs, text, max_size_bytes))
+    logger.info(f"Created job {job.id} with {len(inputs)} files")
+
+    return {
+        "id": job.id,
+        "events": f"/v1/jobs/{job.id}/events",
+        "result": f"/v1/jobs/{job.id}/result",
+    }
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request, format: Optional[str] = None):
+    """Stream job events as NDJSON, or SSE if asked for via Accept or ?format=sse."""
+    job = _get_job(job_id)
+    use_sse = format == "sse" or "text/event-stream" in request.headers.get("accept", "")
+
+    async def body() -> AsyncIterator[str]:
+        async for event in job.iter_events():
+            line = json.dumps(event)
+            yield f"event: {event['type']}\ndata: {line}\n\n" if use_sse else f"{line}\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    """Return the job's results, or 202 while it is still running."""
+    job = _get_job(job_id)
+    body = {
+        "id": job.id,
+        "status": "done" if job.done else "running",
+        "export": f"/v1/exports/{job.id}" if job.done else None,
+        "results": [{"file": name, "content": content} for name, content in job.results.items()],
+        "errors": [{"file": name, **error} for name, error in job.errors.items()],
+    }
+    return JSONResponse(body, status_code=200 if job.done else 202)
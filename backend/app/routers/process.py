@@ -4,135 +4,704 @@ import asyncio
 import base64
 import json
 import logging
-import sys
+import re
+import time
 from dataclasses import dataclass
-from typing import Optional
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Optional, TypeVar
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
 from ..config import get_settings
-from ..errors import ErrorCode, FileTooLargeError, SmeltError, UnsupportedFormatError
-from ..services.audio import is_audio_file, transcribe_audio
-from ..services.synthesis import synthesize_text
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    stream=sys.stdout,
+from ..errors import (
+    ErrorCode,
+    FileTooLargeError,
+    InvalidMessageError,
+    LLMTimeoutError,
+    ProcessingCancelledError,
+    ServerDrainingError,
+    SmeltError,
+    TooManyFilesError,
+    TranscriptNotFoundError,
+    UnsupportedFormatError,
 )
+from ..services.artifacts import Artifact, get_artifact_store
+from ..services.audio import (
+    is_audio_file,
+    probe_audio,
+    transcribe_audio,
+    transcribe_audio_sections,
+)
+from ..services.deadline import Deadline
+from ..services.drain import DRAIN_RETRY_AFTER_SECONDS, get_drain
+from ..services.export import ExportEntry, register_export
+from ..services.llm import get_llm_client
+from ..services.scheduler import SessionScheduler
+from ..services.synthesis import synthesize_sections, synthesize_text
+from ..services.timings import get_timing_model
+from ..services.transcripts import (
+    TranscriptRecord,
+    get_transcript_store,
+    hash_audio,
+)
+
 logger = logging.getLogger("smelt.process")
-logger.setLevel(logging.DEBUG)
+
+T = TypeVar("T")
 
 router = APIRouter()
 
+# Room for the JSON envelope around a base64 payload
+FRAME_OVERHEAD_BYTES = 64 * 1024
+
+# Non-progress messages buffered for a client before it counts as not reading
+MAX_PENDING_MESSAGES = 1000
+
+# Priors for stages the timing model has not seen enough of yet
+LOCAL_SECONDS_PER_BYTE = 5e-9
+PROBE_SECONDS = 0.2
+LOOKUP_SECONDS = 0.05
+SYNTHESIS_SECONDS_PER_CHAR = 0.002
+
+# Assumed when the probe can't tell: ~128 kbps audio, ~15 transcript characters per second
+FALLBACK_BYTES_PER_SECOND = 16000
+SPEECH_CHARS_PER_SECOND = 15
+
+# Share of a stage's estimate after which its remaining time starts tailing off
+OVERRUN_FRACTION = 0.8
+
+# Timing model key for stages that run here rather than upstream
+LOCAL_MODEL = "local"
+
+
+def max_frame_bytes(max_size_bytes: int) -> int:
+    """Largest inbound frame a max-size file can legitimately produce."""
+    return max_size_bytes * 4 // 3 + FRAME_OVERHEAD_BYTES
+
+
+def base64_size(data: str) -> int:
+    """Decoded size of base64 text without decoding it: 3 bytes per 4 chars, less padding."""
+    return len(data) * 3 // 4 - data[-2:].count("=")
+
+
+def check_file_meta(name: str, size: int, max_size_bytes: int) -> None:
+    """
+    Validate a file from its declared name and size, before any payload.
+
+    Raises:
+        UnsupportedFormatError: If the extension is not a supported audio format
+        FileTooLargeError: If the size exceeds the limit
+    """
+    if not is_audio_file(name):
+        raise UnsupportedFormatError(extension=name.split(".")[-1] if "." in name else "unknown")
+    if size > max_size_bytes:
+        raise FileTooLargeError(
+            max_size_mb=get_settings().max_file_size_mb,
+            actual_size_mb=size / (1024 * 1024),
+        )
+
+
+def _is_count(value: object) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def parse_start(data: dict, max_file_count: int) -> tuple[int, Optional[list[tuple[str, int]]]]:
+    """
+    Validate a start message.
+
+    Returns:
+        The announced file count, and the declared (name, size) pairs if
+        the message lists files
+
+    Raises:
+        InvalidMessageError: If a count, name or size is malformed, or a name repeats
+        TooManyFilesError: If more files are announced than a session takes
+    """
+    count = data.get("count", 0)
+    if not _is_count(count):
+        raise InvalidMessageError(details="count must be an integer >= 0")
+
+    declared = data.get("files")
+    if declared is None:
+        files = None
+    elif not isinstance(declared, list):
+        raise InvalidMessageError(details="files must be a list")
+    else:
+        files = []
+        seen = set()
+        for meta in declared:
+            name = meta.get("name", "unknown") if isinstance(meta, dict) else None
+            size = meta.get("size", 0) if isinstance(meta, dict) else None
+            if not isinstance(name, str) or not _is_count(size):
+                raise InvalidMessageError(details="Each file needs a string name and a size >= 0")
+            if name in seen:
+                raise InvalidMessageError(details=f"Duplicate file: {name}")
+            seen.add(name)
+            files.append((name, size))
+
+    actual = max(count, len(files or []))
+    if actual > max_file_count:
+        raise TooManyFilesError(max_count=max_file_count, actual_count=actual)
+    return count, files
+
+
+def check_process_message(files: object, text: object) -> None:
+    """
+    Validate the payload of a process message.
+
+    Raises:
+        InvalidMessageError: If files is not a list of {name, data, mime}
+            objects with string values, or text is not a string
+    """
+    if not isinstance(files, list):
+        raise InvalidMessageError(details="files must be a list")
+    for entry in files:
+        if not isinstance(entry, dict) or not all(
+            isinstance(entry.get(key, ""), str) for key in ("name", "data", "mime")
+        ):
+            raise InvalidMessageError(details="Each file needs a string name, data and mime")
+    if text is not None and not isinstance(text, str):
+        raise InvalidMessageError(details="text must be a string")
+
+
+def parse_resynthesize(data: dict) -> tuple[str, str, Optional[str]]:
+    """
+    Validate a resynthesize message.
+
+    Returns:
+        The transcript ID, the name to report under and the style, if any
+
+    Raises:
+        InvalidMessageError: If the ID is missing or a field is not a string
+    """
+    transcript_id = data.get("transcript_id")
+    name = data.get("file")
+    style = data.get("style")
+    if not isinstance(transcript_id, str) or not transcript_id:
+        raise InvalidMessageError(details="transcript_id must be a non-empty string")
+    if not isinstance(name, (str, type(None))) or not isinstance(style, (str, type(None))):
+        raise InvalidMessageError(details="file and style must be strings")
+    return transcript_id, name or f"transcript_{transcript_id[:8]}", style
+
+
+# "name" members of an unparsed frame; base64 payloads never contain a quote
+_FRAME_NAME = re.compile(r'"name"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def frame_file_names(raw: str) -> list[str]:
+    """File names in a frame too large to parse, so the files it carried can be refused."""
+    names = []
+    for match in _FRAME_NAME.finditer(raw):
+        try:
+            names.append(json.loads(match.group(1)))
+        except json.JSONDecodeError:
+            continue
+    return names
+
+
+# Base64 characters decoded per step; a multiple of 4 so chunks decode independently
+DECODE_CHUNK_CHARS = 4 * 64 * 1024
+
+_STRIP_WHITESPACE = str.maketrans("", "", " \t\r\n\v\f")
+
+
+def decode_to_artifact(data: str, suffix: str) -> Artifact:
+    """
+    Decode base64 into an artifact a chunk at a time, so no full-size copy is held.
+
+    Whitespace (MIME-style line breaks) is stripped from each chunk and
+    any characters past the last 4-character boundary are carried into
+    the next, so every decode starts aligned with the base64 itself.
+    """
+    artifact = get_artifact_store().create(suffix=suffix)
+    try:
+        carry = ""
+        for start in range(0, len(data), DECODE_CHUNK_CHARS):
+            chunk = carry + data[start : start + DECODE_CHUNK_CHARS].translate(_STRIP_WHITESPACE)
+            aligned = len(chunk) - len(chunk) % 4
+            artifact.write(base64.b64decode(chunk[:aligned]))
+            carry = chunk[aligned:]
+        if carry:
+            artifact.write(base64.b64decode(carry))  # raises: not a whole base64 quantum
+    except Exception:
+        artifact.release()
+        raise
+    return artifact
+
 
 @dataclass
 class FileInput:
-    """File data from WebSocket message."""
+    """File data from WebSocket message or HTTP upload."""
 
     name: str
     data: str  # base64 encoded
     mime: str
+    path: Optional[Path] = None  # spooled upload on disk, adopted instead of data
+    audio: Optional[Artifact] = None  # decoded while it waits for a slot, used instead of data
 
 
 class ProgressReporter:
-    """Helper to send progress updates over WebSocket."""
+    """Helper to send progress updates to a client."""
 
-    def __init__(self, websocket: WebSocket, filename: str):
-        self.websocket = websocket
+    def __init__(self, send: Callable[[dict], Awaitable[None]], filename: str):
+        self.send = send
         self.filename = filename
-        self._lock = asyncio.Lock()
+        self.result: Optional[str] = None
+        self.transcript: Optional[str] = None
+        self.transcript_id: Optional[str] = None  # stored transcript, for re-synthesis
+        self.failure: Optional[SmeltError] = None
+        self.cancelled = False  # set when the session cancels this input on purpose
 
-    async def report(self, percent: int, status: str):
-        """Send progress update."""
-        async with self._lock:
-            try:
-                await self.websocket.send_json(
-                    {
-                        "type": "progress",
-                        "file": self.filename,
-                        "percent": percent,
-                        "status": status,
-                    }
-                )
-            except Exception as e:
-                logger.error(f"Failed to send progress: {e}")
+    async def _send(self, message: dict):
+        """Send one message, logging rather than raising on failure."""
+        try:
+            await self.send(message)
+        except Exception as e:
+            logger.error(f"Failed to send {message['type']}: {e}")
+
+    async def report(self, percent: int, status: str, eta_seconds: Optional[float] = None):
+        """Send progress update, with the estimated seconds left if known."""
+        message = {
+            "type": "progress",
+            "file": self.filename,
+            "percent": percent,
+            "status": status,
+        }
+        if eta_seconds is not None:
+            message["eta_seconds"] = eta_seconds
+        await self._send(message)
 
     async def complete(self, content: str):
-        """Send completion message."""
-        async with self._lock:
-            try:
-                await self.websocket.send_json(
-                    {
-                        "type": "complete",
-                        "file": self.filename,
-                        "content": content,
-                    }
-                )
-            except Exception as e:
-                logger.error(f"Failed to send complete: {e}")
+        """Send completion message, with the stored transcript's ID if there is one."""
+        self.result = content
+        message = {
+            "type": "complete",
+            "file": self.filename,
+            "content": content,
+        }
+        if self.transcript_id:
+            message["transcript_id"] = self.transcript_id
+        await self._send(message)
 
     async def error(self, error: SmeltError):
-        """Send error message."""
-        async with self._lock:
-            try:
-                await self.websocket.send_json(
-                    {
-                        "type": "error",
-                        "file": self.filename,
-                        "message": error.message,
-                        "code": error.code.value,
-                    }
-                )
-            except Exception as e:
-                logger.error(f"Failed to send error: {e}")
+        """Send error message, with a retry hint if the error carries one."""
+        self.failure = error
+        message = {
+            "type": "error",
+            "file": self.filename,
+            "message": error.message,
+            "code": error.code.value,
+        }
+        if retry_after := getattr(error, "retry_after", None):
+            message["retry_after"] = retry_after
+        await self._send(message)
+
+    def export_entry(self) -> ExportEntry:
+        """Snapshot of this file's outcome for the zip export."""
+        return ExportEntry(
+            source=self.filename,
+            content=self.result,
+            transcript=self.transcript,
+            error=self.failure.message if self.failure else None,
+        )
+
+
+class SessionWriter:
+    """
+    Single writer task per WebSocket, fed by a pending-message buffer.
+
+    The buffer holds at most one progress update per file: a newer one
+    replaces the pending one in place, so a slow client never makes
+    progress frames pile up. Updates that arrive within the coalescing
+    window go out together, as one "batch" frame instead of many small
+    ones. Other messages are capped at MAX_PENDING_MESSAGES; past that
+    the client is not reading, and further ones are dropped.
+    """
+
+    def __init__(self, websocket: WebSocket, coalesce_window: float):
+        self.websocket = websocket
+        self.coalesce_window = coalesce_window
+        self._pending: list[dict] = []
+        self._progress_at: dict[str, int] = {}  # file -> index of its pending progress update
+        self._wake = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+
+    def start(self):
+        """Start the writer task."""
+        self._task = asyncio.create_task(self._run())
+
+    async def send(self, message: dict):
+        """Queue a message for the writer task."""
+        if message["type"] == "progress":
+            index = self._progress_at.get(message["file"])
+            if index is not None:
+                self._pending[index] = message
+                return
+            self._progress_at[message["file"]] = len(self._pending)
+        elif len(self._pending) >= MAX_PENDING_MESSAGES:
+            logger.warning(f"Client not reading, dropped {message['type']} message")
+            return
+        self._pending.append(message)
+        self._wake.set()
+
+    async def close(self, flush: bool = True):
+        """Stop the writer, sending whatever is queued first if flush is set."""
+        if self._task is None:
+            return
+        if flush:
+            self._closing = True
+            self._wake.set()
+            await self._task
+        else:
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        """Send pending messages until closed, coalescing bursts into batch frames."""
+        while True:
+            await self._wake.wait()
+            if not self._closing and self._pending and self._pending[0]["type"] == "progress":
+                await asyncio.sleep(self.coalesce_window)
+
+            messages, self._pending = self._pending, []
+            self._progress_at.clear()
+            self._wake.clear()
+
+            if messages:
+                frame = messages[0] if len(messages) == 1 else {"type": "batch", "messages": messages}
+                try:
+                    await self.websocket.send_json(frame)
+                    self.frames_sent += 1
+                except Exception as e:
+                    logger.error(f"Failed to send {len(messages)} message(s): {e}")
+
+            if self._closing and not self._pending:
+                return
+
+
+def stage_model(task: str) -> str:
+    """Model a task's requests go to first, the key its stage timings are learned under."""
+    return get_llm_client().rank_backends(task)[0].model
+
+
+def stage_seconds_left(estimate: float, elapsed: float) -> float:
+    """
+    Expected seconds left in a stage.
+
+    Counts down linearly to OVERRUN_FRACTION of the estimate, then
+    shrinks in proportion to 1 / elapsed, so an overrunning stage keeps
+    creeping toward done instead of stalling.
+    """
+    knee = estimate * OVERRUN_FRACTION
+    if elapsed <= knee:
+        return estimate - elapsed
+    return (estimate - knee) * knee / elapsed
+
+
+@dataclass
+class StagePlan:
+    """Expected cost of one processing stage."""
+
+    status: str
+    model: str
+    size: float  # bytes, audio seconds or characters, depending on the stage
+    seconds: float
+    finished: bool = False
+
+
+class ProgressTracker:
+    """
+    Progress and ETA for one input, from per-stage time estimates.
+
+    Stages are planned with estimates from the timing model, or a prior
+    while it has too little data. Percent is the estimated work done over
+    the estimated total, reported every progress_interval_seconds while a
+    stage runs. It never goes backwards and holds below 100 until the
+    input is done, and a stage running over its estimate slows down
+    rather than stalls. Each finished stage's duration is recorded back
+    into the timing model. Without a reporter a tracker only plans, to
+    estimate an input's run time.
+    """
+
+    def __init__(self, reporter: Optional[ProgressReporter] = None):
+        self.reporter = reporter
+        self.stages: dict[str, StagePlan] = {}
+        self._percent = 0
+
+    def plan(self, stage: str, status: str, model: str, size: float, prior: float):
+        """Plan a stage, or re-plan it once its input size is better known."""
+        learned = get_timing_model().estimate(stage, model, size)
+        self.stages[stage] = StagePlan(
+            status=status,
+            model=model,
+            size=size,
+            seconds=learned if learned is not None else prior,
+        )
+
+    def skip(self, stage: str):
+        """Drop a planned stage that turned out not to be needed."""
+        self.stages.pop(stage, None)
+
+    def remaining_seconds(self) -> float:
+        """Estimated seconds of the stages not yet finished."""
+        return sum(plan.seconds for plan in self.stages.values() if not plan.finished)
+
+    async def _report(self, current: str, elapsed: float):
+        total = sum(plan.seconds for plan in self.stages.values())
+        done = eta = 0.0
+        for name, plan in self.stages.items():
+            if plan.finished:
+                done += plan.seconds
+            elif name == current:
+                left = stage_seconds_left(plan.seconds, elapsed)
+                if elapsed > 0:
+                    done += plan.seconds * elapsed / (elapsed + left)
+                eta += left
+            else:
+                eta += plan.seconds
+        if total > 0:
+            self._percent = max(self._percent, min(int(100 * done / total), 99))
+        if self.reporter is None:
+            return
+        await self.reporter.report(
+            self._percent, self.stages[current].status, eta_seconds=round(eta, 1)
+        )
+
+    async def run(self, stage: str, coro: Awaitable[T]) -> T:
+        """Await a planned stage, reporting progress until it finishes."""
+        plan = self.stages[stage]
+        interval = get_settings().progress_interval_seconds
+        started = time.monotonic()
+        await self._report(stage, 0.0)
+
+        async def tick():
+            while True:
+                await asyncio.sleep(interval)
+                await self._report(stage, time.monotonic() - started)
+
+        ticker = asyncio.create_task(tick())
+        try:
+            result = await coro
+        finally:
+            ticker.cancel()
+        get_timing_model().record(stage, plan.model, plan.size, time.monotonic() - started)
+        plan.finished = True
+        return result
+
+
+def plan_audio(
+    tracker: ProgressTracker,
+    size_bytes: int,
+    duration_seconds: Optional[float],
+    pipelined: bool,
+):
+    """Plan the upstream stages of an audio file, guessing the duration from the size if needed."""
+    settings = get_settings()
+    seconds = duration_seconds or size_bytes / FALLBACK_BYTES_PER_SECOND
+    if pipelined:
+        tracker.skip("transcription")
+        tracker.skip("synthesis")
+        tracker.plan(
+            "pipeline",
+            "TRANSCRIBING + SYNTHESIZING...",
+            stage_model("transcription"),
+            seconds,
+            prior=seconds * settings.transcription_realtime_factor,
+        )
+    else:
+        tracker.skip("pipeline")
+        tracker.plan(
+            "transcription",
+            "TRANSCRIBING...",
+            stage_model("transcription"),
+            seconds,
+            prior=seconds * settings.transcription_realtime_factor,
+        )
+        tracker.plan(
+            "synthesis",
+            "SYNTHESIZING...",
+            stage_model("synthesis"),
+            seconds * SPEECH_CHARS_PER_SECOND,
+            prior=seconds * settings.synthesis_realtime_factor,
+        )
+
+
+def upload_size(file: FileInput) -> int:
+    """Size of a file's audio, from the spooled upload or decoded artifact, or its base64."""
+    if file.audio is not None:
+        return file.audio.size
+    return file.path.stat().st_size if file.path is not None else base64_size(file.data)
+
+
+def plan_file(tracker: ProgressTracker, size_bytes: int):
+    """Plan every stage of an audio file up front from its size; the probe refines it."""
+    local_prior = size_bytes * LOCAL_SECONDS_PER_BYTE
+    tracker.plan("decoding", "DECODING...", LOCAL_MODEL, size_bytes, local_prior)
+    tracker.plan("probing", "PROBING...", LOCAL_MODEL, 1, PROBE_SECONDS)
+    tracker.plan("hashing", "HASHING...", LOCAL_MODEL, size_bytes, local_prior)
+    plan_audio(tracker, size_bytes, None, get_settings().pipeline_synthesis)
+
+
+def plan_synthesis(tracker: ProgressTracker, text: str, prior: Optional[float] = None):
+    """Plan synthesis of a known text, replacing any guess made from the audio."""
+    tracker.plan(
+        "synthesis",
+        "SYNTHESIZING...",
+        stage_model("synthesis"),
+        len(text),
+        prior=prior if prior is not None else len(text) * SYNTHESIS_SECONDS_PER_CHAR,
+    )
+
+
+def estimate_file_seconds(size_bytes: int) -> float:
+    """Expected run time of an audio file from its size, for scheduling."""
+    tracker = ProgressTracker()
+    plan_file(tracker, size_bytes)
+    return tracker.remaining_seconds()
+
+
+def estimate_text_seconds(text: str) -> float:
+    """Expected run time of synthesizing a text, for scheduling."""
+    tracker = ProgressTracker()
+    plan_synthesis(tracker, text)
+    return tracker.remaining_seconds()
+
+
+async def run_scheduled(
+    scheduler: SessionScheduler,
+    reporter: ProgressReporter,
+    estimate: float,
+    start: Callable[[], Awaitable[None]],
+    key: Optional[Hashable] = None,
+):
+    """Run an input once the scheduler gives it a slot, reporting it as queued until then."""
+
+    async def queued():
+        await reporter.report(0, "QUEUED...")
+
+    async with scheduler.slot(estimate, key, on_queued=queued):
+        await start()
+
+
+async def _find_transcript(audio_hash: str) -> Optional[TranscriptRecord]:
+    """Stored transcript of the same audio, if any. Store failures count as a miss."""
+    try:
+        return await get_transcript_store().find_by_hash(audio_hash)
+    except Exception as e:
+        logger.warning(f"Transcript lookup failed: {e}")
+        return None
+
+
+async def _remember_transcript(reporter: ProgressReporter, audio_hash: str, filename: str):
+    """Store a fresh transcript for later re-synthesis. A failure only costs the reuse."""
+    try:
+        record = await get_transcript_store().save(audio_hash, filename, reporter.transcript)
+    except Exception as e:
+        logger.warning(f"Could not store transcript of {filename}: {e}")
+        return
+    reporter.transcript_id = record.id
 
 
 async def process_file(
     file: FileInput,
     reporter: ProgressReporter,
     max_size_bytes: int,
+    deadline: Optional[Deadline] = None,
 ) -> None:
-    """Process a single audio file with progress reporting."""
+    """Process a single audio file with progress reporting, within the deadline if given."""
+    settings = get_settings()
+    audio: Optional[Artifact] = None
     try:
-        # 10% - Validate format
-        await reporter.report(10, "VALIDATING...")
-
         if not is_audio_file(file.name):
             raise UnsupportedFormatError(
                 extension=file.name.split(".")[-1] if "." in file.name else "unknown"
             )
 
-        # 20% - Decode base64
-        await reporter.report(20, "DECODING...")
-        try:
-            file_bytes = base64.b64decode(file.data)
-        except Exception as e:
-            raise SmeltError(
-                code=ErrorCode.UNKNOWN,
-                message="CORRUPTED DATA. TRY AGAIN.",
-                details=str(e),
-            )
+        tracker = ProgressTracker(reporter)
+        plan_file(tracker, upload_size(file))
+
+        # Decode base64 (or adopt the spooled upload)
+        async def decode() -> Artifact:
+            try:
+                if file.path is not None:
+                    return get_artifact_store().adopt(file.path)
+                artifact = decode_to_artifact(file.data, Path(file.name).suffix)
+                file.data = ""
+                return artifact
+            except Exception as e:
+                raise SmeltError(
+                    code=ErrorCode.UNKNOWN,
+                    message="CORRUPTED DATA. TRY AGAIN.",
+                    details=str(e),
+                )
+
+        if file.audio is not None:
+            tracker.skip("decoding")  # done when the file was queued
+            audio, file.audio = file.audio, None
+        else:
+            audio = await tracker.run("decoding", decode())
 
         # Check file size
-        actual_size = len(file_bytes)
+        actual_size = audio.size
         if actual_size > max_size_bytes:
-            settings = get_settings()
             raise FileTooLargeError(
                 max_size_mb=settings.max_file_size_mb,
                 actual_size_mb=actual_size / (1024 * 1024),
             )
 
+        # Probe container headers to plan the work
+        info = await tracker.run("probing", probe_audio(audio, file.name))
+        duration = info.duration_seconds if info is not None else None
+        pipelined = settings.pipeline_synthesis and (
+            duration is None or duration >= settings.pipeline_min_duration_seconds
+        )
+        plan_audio(tracker, actual_size, duration, pipelined)
+        audio_seconds = duration or actual_size / FALLBACK_BYTES_PER_SECOND
+
+        # A recording transcribed before skips straight to synthesis
+        audio_hash = await tracker.run("hashing", asyncio.to_thread(hash_audio, audio))
+        cached = await _find_transcript(audio_hash)
+
         # Process audio file
-        await reporter.report(30, "TRANSCRIBING...")
-        transcript = await transcribe_audio(file_bytes, file.name)
+        if cached is not None:
+            logger.info(f"Reusing transcript {cached.id} for {file.name}")
+            audio.release()
+            reporter.transcript = cached.text
+            reporter.transcript_id = cached.id
+
+            tracker.skip("transcription")
+            tracker.skip("pipeline")
+            plan_synthesis(tracker, cached.text)
+            result = await tracker.run("synthesis", synthesize_text(cached.text, deadline))
+        elif pipelined:
+            # Synthesize finished transcript sections while the rest streams in
+            sections: list[str] = []
+
+            async def collect() -> AsyncIterator[str]:
+                async for section in transcribe_audio_sections(
+                    audio, file.name, settings.pipeline_section_chars, deadline
+                ):
+                    sections.append(section)
+                    yield section
 
-        await reporter.report(70, "SYNTHESIZING...")
-        result = await synthesize_text(transcript)
+            result = await tracker.run("pipeline", synthesize_sections(collect(), deadline))
+            reporter.transcript = "".join(sections)
+            await _remember_transcript(reporter, audio_hash, file.name)
+        else:
+            transcript = await tracker.run(
+                "transcription", transcribe_audio(audio, file.name, deadline)
+            )
+            reporter.transcript = transcript
+            await _remember_transcript(reporter, audio_hash, file.name)
+
+            plan_synthesis(
+                tracker, transcript, prior=audio_seconds * settings.synthesis_realtime_factor
+            )
+            result = await tracker.run("synthesis", synthesize_text(transcript, deadline))
 
-        # 100% - Complete
-        await reporter.report(100, "DONE")
+        await reporter.report(100, "DONE", eta_seconds=0)
         await reporter.complete(result)
 
     except SmeltError as e:
@@ -147,25 +716,30 @@ async def process_file(
                 details=str(e),
             )
         )
+    finally:
+        if audio is not None:
+            audio.release()
+            logger.debug(f"Artifacts after {file.name}: {get_artifact_store().stats()}")
 
 
-async def process_text(text: str, websocket: WebSocket) -> None:
-    """Process pasted text with progress reporting."""
-    reporter = ProgressReporter(websocket, "pasted_text")
-
+async def process_text(
+    text: str,
+    reporter: ProgressReporter,
+    deadline: Optional[Deadline] = None,
+) -> None:
+    """Process pasted text with progress reporting, within the deadline if given."""
     try:
-        await reporter.report(20, "READING...")
-
         if not text.strip():
             raise SmeltError(
                 code=ErrorCode.UNKNOWN,
                 message="NOTHING TO PROCESS. TYPE SOMETHING.",
             )
 
-        await reporter.report(50, "SYNTHESIZING...")
-        result = await synthesize_text(text)
+        tracker = ProgressTracker(reporter)
+        plan_synthesis(tracker, text)
+        result = await tracker.run("synthesis", synthesize_text(text, deadline))
 
-        await reporter.report(100, "DONE")
+        await reporter.report(100, "DONE", eta_seconds=0)
         await reporter.complete(result)
 
     except SmeltError as e:
@@ -182,61 +756,316 @@ async def process_text(text: str, websocket: WebSocket) -> None:
         )
 
 
+async def process_resynthesis(
+    transcript_id: str,
+    style: Optional[str],
+    reporter: ProgressReporter,
+    deadline: Optional[Deadline] = None,
+) -> None:
+    """Synthesize a stored transcript again, optionally in another style, skipping transcription."""
+    try:
+        tracker = ProgressTracker(reporter)
+        tracker.plan("lookup", "LOADING TRANSCRIPT...", LOCAL_MODEL, 1, LOOKUP_SECONDS)
+        record = await tracker.run("lookup", get_transcript_store().get(transcript_id))
+        if record is None:
+            raise TranscriptNotFoundError(transcript_id)
+        reporter.transcript = record.text
+        reporter.transcript_id = record.id
+
+        plan_synthesis(tracker, record.text)
+        result = await tracker.run(
+            "synthesis", synthesize_text(record.text, deadline, style=style)
+        )
+
+        await reporter.report(100, "DONE", eta_seconds=0)
+        await reporter.complete(result)
+
+    except SmeltError as e:
+        logger.error(f"Error re-synthesizing {transcript_id}: {e}")
+        await reporter.error(e)
+    except Exception as e:
+        logger.exception(f"Unexpected error re-synthesizing {transcript_id}")
+        await reporter.error(
+            SmeltError(
+                code=ErrorCode.UNKNOWN,
+                message="SOMETHING BROKE. NOT YOUR FAULT. MAYBE.",
+                details=str(e),
+            )
+        )
+
+
 class ProcessingSession:
     """Manages parallel file processing for a WebSocket session."""
 
-    def __init__(self, websocket: WebSocket, max_size_bytes: int):
-        self.websocket = websocket
+    def __init__(self, writer: SessionWriter, max_size_bytes: int, max_file_count: int):
+        self.writer = writer
         self.max_size_bytes = max_size_bytes
-        self.tasks: list[asyncio.Task] = []
+        self.max_file_count = max_file_count
+        settings = get_settings()
+        self.deadline = Deadline.after(settings.session_timeout_seconds)
+        self.scheduler = SessionScheduler(
+            slots=settings.session_max_concurrency,
+            order=settings.session_order,
+            max_wait_seconds=settings.session_max_wait_seconds,
+        )
+        self.accepted: Optional[set[str]] = None  # names cleared by the metadata pre-check
+        self.file_count: int = 0
+        self.tasks: set[asyncio.Task] = set()  # running only; finished tasks remove themselves
+        self.reporters: list[ProgressReporter] = []
         self.expected_count: int = 0
         self.completed_count: int = 0
+        # Every task started under each name; names can repeat (pasted text, re-syntheses)
+        self._running: dict[str, list[tuple[asyncio.Task, ProgressReporter]]] = {}
+        self._finished: set[object] = set()  # keys already counted by _mark_completed
         self._lock = asyncio.Lock()
         self._done_event = asyncio.Event()
 
+    async def declare_files(self, files: list[tuple[str, int]]) -> list[str]:
+        """
+        Pre-check declared (name, size) pairs and return the accepted names.
+
+        Rejected files get their error right away, before the client has
+        spent anything on uploading them.
+        """
+        self.accepted = set()
+        for name, size in files:
+            try:
+                check_file_meta(name, size, self.max_size_bytes)
+            except SmeltError as e:
+                logger.info(f"Rejected {name} from metadata: {e}")
+                await ProgressReporter(self.writer.send, name).error(e)
+                continue
+            self.accepted.add(name)
+            self.scheduler.expect(name, estimate_file_seconds(size))
+        self.expected_count = len(self.accepted)
+        return sorted(self.accepted)
+
+    def admit(self, file: FileInput) -> Optional[SmeltError]:
+        """Cheap checks run on a received file before it is decoded."""
+        if self.accepted is not None and file.name not in self.accepted:
+            return SmeltError(
+                code=ErrorCode.UNKNOWN,
+                message="FILE NOT CLEARED. DECLARE IT IN START.",
+                http_status=400,
+                details=f"File: {file.name}",
+            )
+        if self.file_count >= self.max_file_count:
+            return TooManyFilesError(
+                max_count=self.max_file_count, actual_count=self.file_count + 1
+            )
+        # The decoded size is known from the base64 length, before decoding
+        estimated_size = base64_size(file.data)
+        if estimated_size > self.max_size_bytes:
+            return FileTooLargeError(
+                max_size_mb=get_settings().max_file_size_mb,
+                actual_size_mb=estimated_size / (1024 * 1024),
+            )
+        return None
+
+    async def reject(self, file: FileInput, error: SmeltError):
+        """Report a file refused by admit() and count it as finished if it was expected."""
+        logger.info(f"Rejected {file.name}: {error}")
+        reporter = ProgressReporter(self.writer.send, file.name)
+        await reporter.error(error)
+        if self.accepted is None:
+            await self._mark_completed(reporter)
+        elif file.name in self.accepted:
+            self.scheduler.forget(file.name)
+            await self._mark_completed(file.name)
+
     async def add_file(self, file: FileInput):
-        """Add a file to be processed in parallel."""
-        reporter = ProgressReporter(self.websocket, file.name)
-        task = asyncio.create_task(self._process_and_track(file, reporter))
-        self.tasks.append(task)
-        logger.info(f"Started task for {file.name}, total tasks: {len(self.tasks)}")
+        """
+        Add a file to be processed in parallel, once the scheduler gives it a slot.
+
+        With a concurrency limit the file may wait a while, so its base64 is
+        decoded into an artifact first; a queued file then holds its bytes,
+        spilled to disk if large, rather than a third more as text.
+        """
+        if self.scheduler.slots > 0 and file.data and is_audio_file(file.name):
+            try:
+                file.audio = decode_to_artifact(file.data, Path(file.name).suffix)
+            except Exception as e:
+                await self.reject(
+                    file,
+                    SmeltError(
+                        code=ErrorCode.UNKNOWN,
+                        message="CORRUPTED DATA. TRY AGAIN.",
+                        details=str(e),
+                    ),
+                )
+                return
+            file.data = ""
+        reporter = ProgressReporter(self.writer.send, file.name)
+        self.file_count += 1
+        self._start(reporter, self._process_and_track(file, reporter))
+        logger.info(f"Started task for {file.name}, running tasks: {len(self.tasks)}")
 
     async def add_text(self, text: str):
         """Add text to be processed."""
-        task = asyncio.create_task(self._process_text_and_track(text))
-        self.tasks.append(task)
+        reporter = ProgressReporter(self.writer.send, "pasted_text")
+        self._start(reporter, self._process_text_and_track(text, reporter))
+
+    def admit_resynthesis(self) -> Optional[SmeltError]:
+        """Checks run on a re-synthesis before it is started; it counts as a file."""
+        if self.file_count >= self.max_file_count:
+            return TooManyFilesError(
+                max_count=self.max_file_count, actual_count=self.file_count + 1
+            )
+        return None
+
+    async def add_resynthesis(self, name: str, transcript_id: str, style: Optional[str]):
+        """
+        Add a re-synthesis of a stored transcript, reported under name.
+
+        It is an input on top of those announced in start, so the session
+        waits for one more before it is done.
+        """
+        reporter = ProgressReporter(self.writer.send, name)
+        self.file_count += 1
+        async with self._lock:
+            self.expected_count += 1
+            if self.completed_count < self.expected_count:
+                self._done_event.clear()
+        self._start(reporter, self._resynthesize_and_track(transcript_id, style, reporter))
+
+    def _start(self, reporter: ProgressReporter, work: Awaitable[None]):
+        """Run work as a task of the session, cancellable under the reporter's name."""
+        self.reporters.append(reporter)
+        task = asyncio.create_task(work)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        self._running.setdefault(reporter.filename, []).append((task, reporter))
 
     async def _process_and_track(self, file: FileInput, reporter: ProgressReporter):
         """Process file and track completion."""
         try:
-            await process_file(file, reporter, self.max_size_bytes)
+            await run_scheduled(
+                self.scheduler,
+                reporter,
+                estimate_file_seconds(upload_size(file)),
+                lambda: process_file(file, reporter, self.max_size_bytes, self.deadline),
+                key=file.name,
+            )
+        except asyncio.CancelledError:
+            if not reporter.cancelled:
+                raise
         finally:
-            async with self._lock:
-                self.completed_count += 1
-                logger.info(f"Completed {file.name}: {self.completed_count}/{self.expected_count}")
-                if self.completed_count >= self.expected_count:
-                    self._done_event.set()
+            if file.audio is not None:
+                file.audio.release()  # cancelled while still queued
+            await self._mark_completed(reporter)
+            logger.info(f"Completed {file.name}: {self.completed_count}/{self.expected_count}")
 
-    async def _process_text_and_track(self, text: str):
+    async def _process_text_and_track(self, text: str, reporter: ProgressReporter):
         """Process text and track completion."""
         try:
-            await process_text(text, self.websocket)
+            await run_scheduled(
+                self.scheduler,
+                reporter,
+                estimate_text_seconds(text),
+                lambda: process_text(text, reporter, self.deadline),
+            )
+        except asyncio.CancelledError:
+            if not reporter.cancelled:
+                raise
         finally:
-            async with self._lock:
-                self.completed_count += 1
-                if self.completed_count >= self.expected_count:
-                    self._done_event.set()
+            await self._mark_completed(reporter)
 
-    async def wait_for_all(self, timeout: float = 600):
-        """Wait for all tasks to complete."""
+    async def _resynthesize_and_track(
+        self, transcript_id: str, style: Optional[str], reporter: ProgressReporter
+    ):
+        """Re-synthesize and track completion."""
         try:
-            await asyncio.wait_for(self._done_event.wait(), timeout=timeout)
-        except asyncio.TimeoutError:
-            logger.error("Processing timed out")
-            # Cancel remaining tasks
-            for task in self.tasks:
-                if not task.done():
+            # The transcript is only loaded once running; rank it as a short job
+            await run_scheduled(
+                self.scheduler,
+                reporter,
+                0.0,
+                lambda: process_resynthesis(transcript_id, style, reporter, self.deadline),
+            )
+        except asyncio.CancelledError:
+            if not reporter.cancelled:
+                raise
+        finally:
+            await self._mark_completed(reporter)
+
+    async def _mark_completed(self, key: object):
+        """Count one input as finished, once per key, and wake wait_for_all when all are."""
+        async with self._lock:
+            if key in self._finished:
+                return
+            self._finished.add(key)
+            self.completed_count += 1
+            if self.completed_count >= self.expected_count:
+                self._done_event.set()
+
+    async def cancel(self, name: Optional[str] = None, error: Optional[SmeltError] = None) -> list[str]:
+        """
+        Cancel the inputs under a name, or every unfinished one if name is None.
+
+        Running tasks are cancelled, which aborts their upstream requests
+        at once. Declared files that have not arrived yet are struck off,
+        so they are refused if they do. Each cancelled input is reported
+        with error (a cancellation by default) and counts as finished.
+
+        Returns:
+            Names of the inputs that were cancelled
+        """
+        error = error or ProcessingCancelledError()
+        if name is not None:
+            names = [name]
+        else:
+            names = list(self._running) + sorted((self.accepted or set()) - self._running.keys())
+
+        cancelled = []
+        for input_name in names:
+            if input_name in self._running:
+                hit = False
+                for task, reporter in self._running[input_name]:
+                    if task.done() or reporter.result is not None or reporter.failure is not None:
+                        continue
+                    reporter.cancelled = True
                     task.cancel()
+                    await reporter.error(error)
+                    await self._mark_completed(reporter)
+                    hit = True
+                if not hit:
+                    continue
+            elif self.accepted is not None and input_name in self.accepted:
+                if input_name in self._finished:
+                    continue
+                self.accepted.discard(input_name)
+                self.scheduler.forget(input_name)
+                await ProgressReporter(self.writer.send, input_name).error(error)
+                await self._mark_completed(input_name)
+            else:
+                continue
+            cancelled.append(input_name)
+        return cancelled
+
+    async def fail(self, error: SmeltError):
+        """
+        Give up on the session: cancel every input with error and stop
+        waiting for ones not yet received, so "end" answers at once.
+        """
+        await self.cancel(error=error)
+        async with self._lock:
+            self.accepted = set()  # anything that still arrives is refused
+            self.expected_count = self.completed_count
+            self._done_event.set()
+
+    async def wait_for_all(self):
+        """Wait for all tasks to complete, cancelling what is left at the session deadline."""
+        if self.completed_count >= self.expected_count:
+            return
+        try:
+            await asyncio.wait_for(self._done_event.wait(), timeout=self.deadline.remaining())
+        except asyncio.TimeoutError:
+            logger.error("Session deadline passed")
+            await self.cancel(error=LLMTimeoutError(details="Session deadline exceeded"))
+
+    def export_entries(self) -> list[ExportEntry]:
+        """Outcomes of every file in the session, in arrival order."""
+        return [reporter.export_entry() for reporter in self.reporters]
 
     def is_done(self) -> bool:
         """Check if all expected files have been processed."""
@@ -249,11 +1078,44 @@ async def websocket_process(websocket: WebSocket):
     await websocket.accept()
     settings = get_settings()
     max_size_bytes = settings.max_file_size_mb * 1024 * 1024
+    max_message_bytes = max_frame_bytes(max_size_bytes)
+    writer = SessionWriter(websocket, settings.ws_coalesce_window_ms / 1000)
+    writer.start()
 
     logger.info("WebSocket connection established")
 
     session: Optional[ProcessingSession] = None
 
+    # In-flight sessions hold the shutdown drain open; once it is over the
+    # client is told to reconnect, which lands it on another instance
+    drain = get_drain()
+
+    async def reconnect_elsewhere():
+        await writer.send(
+            {
+                "type": "reconnect",
+                "message": "SERVER RESTARTING. RECONNECT.",
+                "retry_after": DRAIN_RETRY_AFTER_SECONDS,
+            }
+        )
+        await writer.close()
+        await websocket.close(code=1012)  # Service Restart
+
+    stop_watching_drain = drain.on_drained(reconnect_elsewhere)
+
+    # Sessions that got "end" finish in the background, so the loop can
+    # still read "cancel" messages for them and start the next session
+    finishing: dict[ProcessingSession, asyncio.Task] = {}
+
+    async def finish(ended: ProcessingSession):
+        try:
+            await ended.wait_for_all()
+            export_id = register_export(ended.export_entries())
+            logger.info("All tasks complete, sending done")
+            await writer.send({"type": "done", "export": f"/v1/exports/{export_id}"})
+        finally:
+            drain.release(ended)
+
     try:
         while True:
             logger.debug("Waiting for message...")
@@ -264,11 +1126,36 @@ async def websocket_process(websocket: WebSocket):
                 logger.error(f"Error receiving: {type(e).__name__}: {e}")
                 raise
 
+            # Refuse oversized frames before paying for JSON parsing and decoding
+            if len(raw_data) > max_message_bytes:
+                logger.warning(f"Dropping oversized frame: {len(raw_data)} bytes")
+                too_large = FileTooLargeError(
+                    max_size_mb=settings.max_file_size_mb,
+                    actual_size_mb=len(raw_data) * 3 / 4 / (1024 * 1024),
+                )
+                names = frame_file_names(raw_data)
+                raw_data = None
+                if names:
+                    # Refuse the files it carried, which counts them as finished
+                    for name in names:
+                        if session is not None:
+                            await session.reject(FileInput(name=name, data="", mime=""), too_large)
+                        else:
+                            await ProgressReporter(writer.send, name).error(too_large)
+                else:
+                    # No telling which input this was, so the session cannot finish cleanly
+                    await ProgressReporter(writer.send, "unknown").error(too_large)
+                    if session is not None:
+                        await session.fail(too_large)
+                continue
+
             try:
                 data = json.loads(raw_data)
+                if not isinstance(data, dict):
+                    raise json.JSONDecodeError("Expected an object", raw_data, 0)
             except json.JSONDecodeError as e:
                 logger.error(f"JSON error: {e}")
-                await websocket.send_json(
+                await writer.send(
                     {
                         "type": "error",
                         "file": "unknown",
@@ -278,31 +1165,72 @@ async def websocket_process(websocket: WebSocket):
                 )
                 continue
 
+            # The parsed message is all we need; drop the raw frame
+            raw_data = None
             msg_type = data.get("type")
 
+            if msg_type in ("start", "process", "resynthesize") and drain.draining and (
+                msg_type == "start" or session is None
+            ):
+                # New sessions are refused; files for an accepted one still go through
+                await ProgressReporter(writer.send, "unknown").error(
+                    ServerDrainingError(retry_after=DRAIN_RETRY_AFTER_SECONDS)
+                )
+                continue
+
             if msg_type == "start":
-                # Client signals how many files to expect
-                expected = data.get("count", 0)
-                session = ProcessingSession(websocket, max_size_bytes)
+                # Client signals how many files to expect, optionally with
+                # per-file metadata ({name, size, mime}) for a pre-check
+                if session is not None:
+                    drain.release(session)
+                try:
+                    expected, declared = parse_start(data, settings.max_file_count)
+                except SmeltError as e:
+                    await ProgressReporter(writer.send, "unknown").error(e)
+                    session = None
+                    continue
+
+                session = ProcessingSession(writer, max_size_bytes, settings.max_file_count)
+                drain.hold(session)
                 session.expected_count = expected
-                logger.info(f"Started session expecting {expected} files")
+                if declared is not None:
+                    accepted = await session.declare_files(declared)
+                    await writer.send({"type": "ready", "accepted": accepted})
+                logger.info(f"Started session expecting {session.expected_count} files")
                 continue
 
             if msg_type == "process":
                 # Create session if not exists (single file mode or text)
                 if session is None:
-                    session = ProcessingSession(websocket, max_size_bytes)
+                    session = ProcessingSession(writer, max_size_bytes, settings.max_file_count)
+                    drain.hold(session)
 
-                files = data.get("files", [])
+                files = data.get("files") or []
                 text = data.get("text")
+                try:
+                    check_process_message(files, text)
+                except SmeltError as e:
+                    await ProgressReporter(writer.send, "unknown").error(e)
+                    continue
+
+                # Check if this was a single-batch request (no "start" message)
+                # or if we've received all expected files
+                if session.expected_count == 0 and session.accepted is None:
+                    # Single batch mode - wait for this batch
+                    session.expected_count = len(files) if files else 1
 
                 if files:
                     for file_data in files:
                         file = FileInput(
                             name=file_data.get("name", "unknown"),
-                            data=file_data.get("data", ""),
+                            # Pop so the FileInput holds the only reference to the payload
+                            data=file_data.pop("data", ""),
                             mime=file_data.get("mime", ""),
                         )
+                        rejection = session.admit(file)
+                        if rejection is not None:
+                            await session.reject(file, rejection)
+                            continue
                         logger.info(f"Queuing file: {file.name}")
                         await session.add_file(file)
 
@@ -310,21 +1238,51 @@ async def websocket_process(websocket: WebSocket):
                     logger.info(f"Processing text: {len(text)} chars")
                     await session.add_text(text)
 
-                # Check if this was a single-batch request (no "start" message)
-                # or if we've received all expected files
-                if session.expected_count == 0:
-                    # Single batch mode - wait for this batch
-                    session.expected_count = len(files) if files else 1
+                continue
 
+            if msg_type == "resynthesize":
+                # Synthesize an earlier transcript again: {transcript_id, style?, file?}
+                try:
+                    transcript_id, name, style = parse_resynthesize(data)
+                except SmeltError as e:
+                    await ProgressReporter(writer.send, "unknown").error(e)
+                    continue
+                if session is None:
+                    session = ProcessingSession(writer, max_size_bytes, settings.max_file_count)
+                    drain.hold(session)
+
+                rejection = session.admit_resynthesis()
+                if rejection is not None:
+                    logger.info(f"Rejected re-synthesis of {transcript_id}: {rejection}")
+                    await ProgressReporter(writer.send, name).error(rejection)
+                    continue
+                logger.info(f"Re-synthesizing transcript {transcript_id} as {name}")
+                await session.add_resynthesis(name, transcript_id, style)
+                continue
+
+            if msg_type == "cancel":
+                # Cancel a file by name in any session on the connection, or
+                # without one the open session (every finishing one if none is open)
+                name = data.get("file")
+                if name is not None and not isinstance(name, str):
+                    name = str(name)
+                if name is None and session is not None:
+                    targets = [session]
+                else:
+                    targets = [s for s in (session, *finishing) if s is not None]
+                cancelled = [n for target in targets for n in await target.cancel(name)]
+                logger.info(f"Cancelled: {', '.join(cancelled) or 'nothing left to cancel'}")
                 continue
 
             if msg_type == "end":
-                # Client signals all files sent, wait for completion
+                # Client signals all files sent; done follows once every task finishes
                 if session:
                     logger.info("Received end signal, waiting for tasks...")
-                    await session.wait_for_all()
-                    logger.info("All tasks complete, sending done")
-                    await websocket.send_json({"type": "done"})
+                    finish_task = asyncio.create_task(finish(session))
+                    finishing[session] = finish_task
+                    finish_task.add_done_callback(
+                        lambda _, ended=session: finishing.pop(ended, None)
+                    )
                     session = None
                 continue
 
@@ -332,19 +1290,26 @@ async def websocket_process(websocket: WebSocket):
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
-        if session:
-            for task in session.tasks:
-                task.cancel()
+        for finish_task in finishing.values():
+            finish_task.cancel()
+        for open_session in (session, *finishing):
+            if open_session:
+                for task in list(open_session.tasks):
+                    task.cancel()
+        await writer.close(flush=False)
     except Exception as e:
         logger.exception(f"WebSocket error: {e}")
-        try:
-            await websocket.send_json(
-                {
-                    "type": "error",
-                    "file": "unknown",
-                    "message": "CONNECTION DIED. TRY AGAIN.",
-                    "code": ErrorCode.UNKNOWN.value,
-                }
-            )
-        except Exception:
-            pass
+        await writer.send(
+            {
+                "type": "error",
+                "file": "unknown",
+                "message": "CONNECTION DIED. TRY AGAIN.",
+                "code": ErrorCode.UNKNOWN.value,
+            }
+        )
+        await writer.close()
+    finally:
+        stop_watching_drain()
+        for open_session in (session, *finishing):
+            if open_session:
+                drain.release(open_session)
@@ -0,0 +1,167 @@
+"""Artifact store - payload bytes that spill to memory-mapped temp files."""
+
+import logging
+import mmap
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+from ..config import get_settings
+
+logger = logging.getLogger("smelt.artifacts")
+
+# What view() hands out: indexable, sliceable, find()-able and a buffer
+Buffer = Union[bytearray, mmap.mmap]
+
+
+class Artifact:
+    """
+    Bytes for one stage of a file's processing.
+
+    Small payloads stay in memory. Once a payload grows past the store's
+    spill threshold it moves to a temp file, and readers get a read-only
+    mmap of it, so the bytes live in the page cache rather than the heap.
+    Call release() as soon as the stage that needed it is done.
+    """
+
+    def __init__(self, store: "ArtifactStore", suffix: str = ""):
+        self._store = store
+        self._suffix = suffix
+        self._memory: Optional[bytearray] = bytearray()
+        self._path: Optional[Path] = None
+        self._file: Optional[BinaryIO] = None
+        self._mmap: Optional[mmap.mmap] = None
+        self.size = 0
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the bytes live in a temp file."""
+        return self._path is not None
+
+    def write(self, chunk: bytes):
+        """Append bytes, spilling to disk once past the threshold."""
+        if self._mmap is not None:
+            raise RuntimeError("Artifact is sealed")
+        self.size += len(chunk)
+        if self._memory is not None:
+            self._memory += chunk
+            if self.size > self._store.spill_threshold:
+                self._spill()
+        else:
+            self._file.write(chunk)
+
+    def _spill(self):
+        """Move in-memory bytes to a temp file."""
+        fd, name = tempfile.mkstemp(suffix=self._suffix, prefix="smelt-", dir=self._store.directory)
+        self._path = Path(name)
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._memory)
+        self._memory = None
+        logger.debug(f"Artifact spilled to {self._path} at {self.size} bytes")
+
+    def ensure_file(self) -> Path:
+        """Path to the bytes on disk, spilling first if they are still in memory."""
+        if self._path is None:
+            self._spill()
+        if self._file is not None:
+            self._file.flush()
+        return self._path
+
+    def view(self) -> Buffer:
+        """Read access to the bytes without copying them."""
+        if self._memory is not None:
+            return self._memory
+        if self._mmap is None:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.size == 0:
+                return bytearray()
+            with open(self._path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def chunks(self, chunk_size: int) -> Iterator[bytes]:
+        """Yield the bytes in slices of chunk_size."""
+        view = self.view()
+        for start in range(0, self.size, chunk_size):
+            yield view[start : start + chunk_size]
+
+    def release(self):
+        """Drop the bytes and delete any temp file. Safe to call twice."""
+        self._memory = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+            self._path = None
+        self._store._released(self)
+
+    def __enter__(self) -> "Artifact":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ArtifactStore:
+    """Creates artifacts and keeps count of what is live, in memory and on disk."""
+
+    def __init__(self, spill_threshold: int, directory: Optional[str] = None):
+        self.spill_threshold = spill_threshold
+        self.directory = directory
+        self._live: set[Artifact] = set()
+
+    def create(self, suffix: str = "") -> Artifact:
+        """Start an empty artifact. suffix is used for its temp file, if any."""
+        artifact = Artifact(self, suffix)
+        self._live.add(artifact)
+        return artifact
+
+    def adopt(self, path: Path) -> Artifact:
+        """Wrap an existing file as an artifact. The file is deleted on release."""
+        artifact = Artifact(self, path.suffix)
+        artifact._memory = None
+        artifact._path = path
+        artifact.size = path.stat().st_size
+        self._live.add(artifact)
+        return artifact
+
+    def temp_path(self, suffix: str = "") -> Path:
+        """A fresh path in the store's directory, for tools that write their own output."""
+        fd, name = tempfile.mkstemp(suffix=suffix, prefix="smelt-", dir=self.directory)
+        os.close(fd)
+        return Path(name)
+
+    def _released(self, artifact: Artifact):
+        self._live.discard(artifact)
+
+    def stats(self) -> dict[str, int]:
+        """Live artifact count and bytes, split by where they are held."""
+        in_memory = sum(a.size for a in self._live if not a.spilled)
+        on_disk = sum(a.size for a in self._live if a.spilled)
+        return {"artifacts": len(self._live), "memory_bytes": in_memory, "disk_bytes": on_disk}
+
+
+# Singleton instance
+_store: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Get or create the artifact store."""
+    global _store
+    if _store is None:
+        settings = get_settings()
+        _store = ArtifactStore(
+            spill_threshold=settings.artifact_spill_bytes,
+            directory=settings.artifact_dir,
+        )
+    return _store
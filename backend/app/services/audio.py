@@ -1,13 +1,16 @@
 """Audio transcription service using Gemini via OpenRouter."""
 
 import asyncio
-import base64
+import json
 import logging
-import tempfile
+import struct
+from dataclasses import dataclass
 from pathlib import Path
+from typing import AsyncIterator, Optional
 
-from ..config import get_settings
 from ..errors import TranscriptionFailedError
+from .artifacts import Artifact, Buffer, get_artifact_store
+from .deadline import Deadline
 from .llm import get_llm_client
 
 logger = logging.getLogger("smelt.audio")
@@ -61,84 +64,348 @@ def needs_conversion(filename: str) -> bool:
     return extension in NEEDS_CONVERSION
 
 
-async def convert_to_mp3(audio_data: bytes, filename: str) -> bytes:
-    """
-    Convert audio to MP3 using ffmpeg.
+@dataclass
+class AudioInfo:
+    """Container-level facts about an audio file, read before transcription."""
 
-    Args:
-        audio_data: Raw audio bytes
-        filename: Original filename (for format detection)
+    duration_seconds: float
+    channels: Optional[int] = None
+    sample_rate: Optional[int] = None
+    codec: Optional[str] = None
 
-    Returns:
-        MP3 audio bytes
 
-    Raises:
-        TranscriptionFailedError: If conversion fails
+# MPEG audio Layer III tables, indexed by header fields
+_MP3_BITRATES_KBPS = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+
+def _probe_wav(data: bytes) -> Optional[AudioInfo]:
+    """RIFF/WAVE: fmt chunk for format, data chunk size for duration."""
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            fmt = struct.unpack_from("<HHII", data, body)
+        elif chunk_id == b"data" and fmt is not None:
+            audio_format, channels, sample_rate, byte_rate = fmt
+            data_size = min(chunk_size, len(data) - body)
+            return AudioInfo(
+                duration_seconds=data_size / byte_rate if byte_rate else 0.0,
+                channels=channels,
+                sample_rate=sample_rate,
+                codec="pcm" if audio_format in (1, 0xFFFE) else f"wav_0x{audio_format:04x}",
+            )
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _probe_mp3(data: bytes) -> Optional[AudioInfo]:
+    """MPEG Layer III: first frame header, Xing/VBRI frame count or CBR estimate."""
+    offset = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    # Find the first frame sync within a small window past the tag
+    limit = min(len(data) - 4, offset + 64 * 1024)
+    while offset < limit and not (data[offset] == 0xFF and data[offset + 1] & 0xE0 == 0xE0):
+        offset += 1
+    if offset >= limit:
+        return None
+
+    header = data[offset : offset + 4]
+    version = {0: 2.5, 2: 2, 3: 1}.get((header[1] >> 3) & 0x03)
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    if version is None or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = _MP3_BITRATES_KBPS[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    channels = 1 if header[3] >> 6 == 3 else 2
+    samples_per_frame = 1152 if version == 1 else 576
+
+    # VBR files carry a frame count in a Xing/Info or VBRI header in frame one
+    side_info = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+    xing = offset + 4 + side_info
+    if data[xing : xing + 4] in (b"Xing", b"Info"):
+        (flags,) = struct.unpack_from(">I", data, xing + 4)
+        if flags & 0x01:
+            (frames,) = struct.unpack_from(">I", data, xing + 8)
+            return AudioInfo(frames * samples_per_frame / sample_rate, channels, sample_rate, "mp3")
+    vbri = offset + 4 + 32
+    if data[vbri : vbri + 4] == b"VBRI":
+        (frames,) = struct.unpack_from(">I", data, vbri + 14)
+        return AudioInfo(frames * samples_per_frame / sample_rate, channels, sample_rate, "mp3")
+
+    return AudioInfo((len(data) - offset) * 8 / bitrate, channels, sample_rate, "mp3")
+
+
+def _probe_flac(data: bytes) -> Optional[AudioInfo]:
+    """FLAC: STREAMINFO block holds rate, channels and total samples."""
+    if data[:4] != b"fLaC" or len(data) < 8 + 18 or data[4] & 0x7F != 0:
+        return None
+    packed = int.from_bytes(data[8 + 10 : 8 + 18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if not sample_rate:
+        return None
+    return AudioInfo(total_samples / sample_rate, channels, sample_rate, "flac")
+
+
+def _probe_ogg(data: bytes) -> Optional[AudioInfo]:
+    """Ogg Vorbis/Opus: identification header, granule position of the last page."""
+    if data[:4] != b"OggS" or len(data) < 28:
+        return None
+    packet = data[27 + data[26] :]
+    if packet[:7] == b"\x01vorbis":
+        channels = packet[11]
+        (sample_rate,) = struct.unpack_from("<I", packet, 12)
+        codec, clock, pre_skip = "vorbis", sample_rate, 0
+    elif packet[:8] == b"OpusHead":
+        channels = packet[9]
+        (pre_skip, sample_rate) = struct.unpack_from("<HI", packet, 10)
+        codec, clock = "opus", 48000  # Opus granules always count 48kHz samples
+    else:
+        return None
+
+    last_page = data.rfind(b"OggS")
+    (granule,) = struct.unpack_from("<q", data, last_page + 6)
+    return AudioInfo(max(granule - pre_skip, 0) / clock, channels, sample_rate, codec)
+
+
+def _extended_to_float(raw: bytes) -> float:
+    """Decode an 80-bit IEEE 754 extended float, as used by AIFF."""
+    exponent = ((raw[0] & 0x7F) << 8) | raw[1]
+    mantissa = int.from_bytes(raw[2:10], "big")
+    sign = -1 if raw[0] & 0x80 else 1
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def _probe_aiff(data: bytes) -> Optional[AudioInfo]:
+    """AIFF/AIFC: COMM chunk holds channels, frame count and sample rate."""
+    if data[:4] != b"FORM" or data[8:12] not in (b"AIFF", b"AIFC"):
+        return None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        (chunk_size,) = struct.unpack_from(">I", data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"COMM" and chunk_size >= 18:
+            channels, frames = struct.unpack_from(">HI", data, body)
+            sample_rate = _extended_to_float(data[body + 8 : body + 18])
+            if not sample_rate:
+                return None
+            return AudioInfo(frames / sample_rate, channels, int(sample_rate), "pcm")
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _mp4_boxes(data: bytes, start: int, end: int):
+    """Yield (type, body_start, box_end) for the ISO-BMFF boxes in a range."""
+    offset = start
+    while offset + 8 <= end:
+        (size,) = struct.unpack_from(">I", data, offset)
+        box_type = data[offset + 4 : offset + 8]
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, offset + 8)
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _probe_mp4(data: bytes) -> Optional[AudioInfo]:
+    """MP4/M4A: duration from moov/mvhd, channels and rate from the mp4a entry."""
+    if data[4:8] != b"ftyp":
+        return None
+    for box_type, body, box_end in _mp4_boxes(data, 0, len(data)):
+        if box_type != b"moov":
+            continue
+        for child_type, child_body, _ in _mp4_boxes(data, body, box_end):
+            if child_type != b"mvhd":
+                continue
+            if data[child_body] == 1:
+                timescale, duration = struct.unpack_from(">IQ", data, child_body + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", data, child_body + 12)
+            if not timescale:
+                return None
+            info = AudioInfo(duration / timescale, codec="aac")
+            entry = data.find(b"mp4a", body, box_end)
+            if entry != -1 and entry + 32 <= box_end:
+                (info.channels,) = struct.unpack_from(">H", data, entry + 20)
+                info.sample_rate = struct.unpack_from(">I", data, entry + 28)[0] >> 16
+            return info
+    return None
+
+
+_HEADER_PROBES = {
+    ".wav": _probe_wav,
+    ".mp3": _probe_mp3,
+    ".flac": _probe_flac,
+    ".ogg": _probe_ogg,
+    ".aiff": _probe_aiff,
+    ".m4a": _probe_mp4,
+}
+
+
+def parse_audio_header(audio_data: Buffer, filename: str) -> Optional[AudioInfo]:
     """
-    extension = Path(filename).suffix.lower()
+    Read duration and stream format from container headers, in pure Python.
 
-    with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as input_file:
-        input_path = input_file.name
-        input_file.write(audio_data)
+    Returns None if the format has no parser here (e.g. raw ADTS .aac) or
+    the header is not what the extension promised.
+    """
+    probe = _HEADER_PROBES.get(Path(filename).suffix.lower())
+    if probe is None:
+        return None
+    try:
+        return probe(audio_data)
+    except (struct.error, IndexError, ZeroDivisionError) as e:
+        logger.debug(f"Header parse failed for {filename}: {e}")
+        return None
 
-    output_path = input_path.rsplit(".", 1)[0] + ".mp3"
 
+async def _ffprobe(path: Path) -> Optional[AudioInfo]:
+    """Ask ffprobe for duration and stream format."""
     try:
-        # Run ffmpeg to convert to MP3
         process = await asyncio.create_subprocess_exec(
-            "ffmpeg",
-            "-i", input_path,
-            "-vn",  # No video
-            "-acodec", "libmp3lame",
-            "-q:a", "2",  # High quality
-            "-y",  # Overwrite output
-            output_path,
+            "ffprobe",
+            "-v", "error",
+            "-show_entries", "format=duration:stream=codec_name,channels,sample_rate",
+            "-select_streams", "a:0",
+            "-of", "json",
+            "-i", str(path),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
-        stdout, stderr = await process.communicate()
-
-        if process.returncode != 0:
-            logger.error(f"ffmpeg conversion failed: {stderr.decode()}")
-            raise TranscriptionFailedError(details=f"Audio conversion failed: {stderr.decode()[:200]}")
-
-        # Read converted file
-        with open(output_path, "rb") as f:
-            mp3_data = f.read()
+    except FileNotFoundError:
+        logger.warning("ffprobe not installed, can't probe audio")
+        return None
 
-        logger.info(f"Converted {filename} ({len(audio_data)} bytes) to MP3 ({len(mp3_data)} bytes)")
-        return mp3_data
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        logger.warning(f"ffprobe failed: {stderr.decode()[:200]}")
+        return None
+
+    result = json.loads(stdout or b"{}")
+    duration = result.get("format", {}).get("duration")
+    if duration is None:
+        return None
+    stream = (result.get("streams") or [{}])[0]
+    return AudioInfo(
+        duration_seconds=float(duration),
+        channels=stream.get("channels"),
+        sample_rate=int(stream["sample_rate"]) if stream.get("sample_rate") else None,
+        codec=stream.get("codec_name"),
+    )
+
+
+async def probe_audio(audio: Artifact, filename: str) -> Optional[AudioInfo]:
+    """
+    Probe an audio file's duration, channels, sample rate and codec.
 
-    finally:
-        # Cleanup temp files
-        import os
-        try:
-            os.unlink(input_path)
-        except OSError:
-            pass
-        try:
-            os.unlink(output_path)
-        except OSError:
-            pass
+    Tries the pure-Python header parsers first and falls back to ffprobe.
+    Returns None if neither can tell.
+    """
+    info = parse_audio_header(audio.view(), filename)
+    if info is None:
+        info = await _ffprobe(audio.ensure_file())
+    if info is not None:
+        logger.info(
+            f"Probed {filename}: {info.duration_seconds:.1f}s, {info.channels}ch, "
+            f"{info.sample_rate}Hz, {info.codec}"
+        )
+    return info
 
 
-async def transcribe_audio(audio_data: bytes, filename: str) -> str:
+async def convert_to_mp3(audio: Artifact, filename: str) -> Artifact:
     """
-    Transcribe audio using Gemini via OpenRouter.
+    Convert audio to MP3 using ffmpeg, file to file.
 
     Args:
-        audio_data: Raw audio bytes
-        filename: Original filename (for format detection)
+        audio: Raw audio artifact
+        filename: Original filename (for logging)
 
     Returns:
-        Transcribed text as markdown
+        MP3 audio artifact
 
     Raises:
-        TranscriptionFailedError: If transcription fails
+        TranscriptionFailedError: If conversion fails
     """
-    settings = get_settings()
-    client = get_llm_client()
+    store = get_artifact_store()
+    input_path = audio.ensure_file()
+    output_path = store.temp_path(suffix=".mp3")
+
+    # The output path is ours until adopted; unlink it however we get out before that
+    try:
+        # Run ffmpeg to convert to MP3
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-i", str(input_path),
+            "-vn",  # No video
+            "-acodec", "libmp3lame",
+            "-q:a", "2",  # High quality
+            "-y",  # Overwrite output
+            str(output_path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        converted = store.adopt(output_path)
+    except BaseException:
+        output_path.unlink(missing_ok=True)
+        raise
+
+    if process.returncode != 0:
+        converted.release()
+        logger.error(f"ffmpeg conversion failed: {stderr.decode()}")
+        raise TranscriptionFailedError(details=f"Audio conversion failed: {stderr.decode()[:200]}")
+
+    logger.info(f"Converted {filename} ({audio.size} bytes) to MP3 ({converted.size} bytes)")
+    return converted
+
+
+async def _build_messages(audio: Artifact, filename: str) -> tuple[list[dict], Artifact]:
+    """
+    Convert if needed and wrap audio in a transcription request.
 
+    The audio goes into the message as an artifact; the LLM client
+    base64-encodes it as the request body is sent. Returns the messages
+    and the artifact they reference, which the caller releases once the
+    request is done. A converted source is released right away.
+    """
     audio_format = get_audio_format(filename)
     if not audio_format:
         raise TranscriptionFailedError(details=f"Unknown audio format: {filename}")
@@ -146,13 +413,12 @@ async def transcribe_audio(audio_data: bytes, filename: str) -> str:
     # Convert M4A/AAC to MP3 for better compatibility
     if needs_conversion(filename):
         logger.info(f"Converting {filename} to MP3...")
-        audio_data = await convert_to_mp3(audio_data, filename)
+        converted = await convert_to_mp3(audio, filename)
+        audio.release()
+        audio = converted
         audio_format = "mp3"
 
-    # Encode audio to base64
-    audio_base64 = base64.standard_b64encode(audio_data).decode("utf-8")
-
-    logger.info(f"Transcribing {filename} ({audio_format}, {len(audio_data)} bytes)")
+    logger.info(f"Transcribing {filename} ({audio_format}, {audio.size} bytes)")
 
     messages = [
         {
@@ -162,23 +428,100 @@ async def transcribe_audio(audio_data: bytes, filename: str) -> str:
                 {
                     "type": "input_audio",
                     "input_audio": {
-                        "data": audio_base64,
+                        "data": audio,  # streamed as base64
                         "format": audio_format,
                     },
                 },
             ],
         }
     ]
+    return messages, audio
+
+
+async def transcribe_audio(
+    audio: Artifact,
+    filename: str,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """
+    Transcribe audio using Gemini via OpenRouter.
+
+    Args:
+        audio: Raw audio artifact, released once the request is done
+        filename: Original filename (for format detection)
+        deadline: When the session's time runs out, passed to the LLM client
+
+    Returns:
+        Transcribed text as markdown
+
+    Raises:
+        TranscriptionFailedError: If transcription fails
+    """
+    client = get_llm_client()
+    messages, audio = await _build_messages(audio, filename)
 
     try:
         response = await client.complete(
             messages=messages,
-            model=settings.openrouter_model_transcription,
+            task="transcription",
             temperature=0.1,  # Low temperature for accurate transcription
             max_tokens=16384,  # Audio can produce long transcripts
+            deadline=deadline,
         )
         logger.info(f"Transcription complete: {response.tokens_used} tokens")
         return response.content
     except Exception as e:
         logger.error(f"Transcription failed: {e}")
         raise TranscriptionFailedError(details=str(e))
+    finally:
+        audio.release()
+
+
+async def transcribe_audio_sections(
+    audio: Artifact,
+    filename: str,
+    section_chars: int,
+    deadline: Optional[Deadline] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream a transcription and yield it in sections as they complete.
+
+    A section is cut at the last line break once at least section_chars
+    characters have accumulated, so speaker turns are never split. The
+    sections concatenate back to the full transcript.
+
+    Raises:
+        TranscriptionFailedError: If transcription fails
+    """
+    client = get_llm_client()
+    messages, audio = await _build_messages(audio, filename)
+
+    buffer = ""
+    sections = 0
+    try:
+        async for delta in client.stream(
+            messages=messages,
+            task="transcription",
+            temperature=0.1,
+            max_tokens=16384,
+            deadline=deadline,
+        ):
+            buffer += delta
+            if len(buffer) < section_chars:
+                continue
+            cut = buffer.rfind("\n", 0, len(buffer)) + 1
+            if cut <= 0:
+                continue
+            sections += 1
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    except Exception as e:
+        logger.error(f"Transcription failed: {e}")
+        raise TranscriptionFailedError(details=str(e))
+    finally:
+        audio.release()
+
+    if buffer.strip():
+        sections += 1
+        yield buffer
+    logger.info(f"Streamed transcription of {filename} in {sections} sections")
@@ -0,0 +1,32 @@
+"""Deadlines that follow a session's work down to each upstream request."""
+
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """A point in time (monotonic clock) by which work must be finished."""
+
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        """A deadline the given number of seconds from now."""
+        return cls(expires_at=time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def capped_timeout(timeout: float, deadline: Optional[Deadline]) -> float:
+    """A per-request timeout, shortened so it never runs past the deadline."""
+    if deadline is None:
+        return timeout
+    return min(timeout, deadline.remaining())
@@ -0,0 +1,83 @@
+"""Graceful drain - let in-flight work finish before the process exits."""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger("smelt.drain")
+
+# Retry hint given to refused clients; another replica should already be ready
+DRAIN_RETRY_AFTER_SECONDS = 5
+
+
+class Drain:
+    """
+    Tracks in-flight work and runs the shutdown drain.
+
+    Sessions and jobs hold the drain open from when they are accepted
+    until they are finished. Once draining, new work is refused, and
+    when everything held has finished (or the deadline passes) the
+    registered callbacks tell connected clients to reconnect elsewhere.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self._held: set[object] = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._callbacks: set[Callable[[], Awaitable[None]]] = set()
+
+    def hold(self, work: object):
+        """Keep the drain open until release(work)."""
+        self._held.add(work)
+        self._idle.clear()
+
+    def release(self, work: object):
+        """Mark held work as finished. Safe to call twice."""
+        self._held.discard(work)
+        if not self._held:
+            self._idle.set()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of sessions and jobs currently holding the drain open."""
+        return len(self._held)
+
+    def on_drained(self, callback: Callable[[], Awaitable[None]]) -> Callable[[], None]:
+        """Run callback once the drain is over. Returns a function that unregisters it."""
+        self._callbacks.add(callback)
+        return lambda: self._callbacks.discard(callback)
+
+    async def drain(self, timeout: float):
+        """
+        Refuse new work and wait up to timeout seconds for held work to finish.
+
+        Connected clients are told to reconnect elsewhere when it returns,
+        whether or not everything finished in time.
+        """
+        self.draining = True
+        logger.info(f"Draining {len(self._held)} in-flight session(s), up to {timeout}s")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+            logger.info("Drain complete")
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain deadline passed with {len(self._held)} session(s) in flight")
+
+        callbacks = list(self._callbacks)
+        self._callbacks.clear()
+        results = await asyncio.gather(*(callback() for callback in callbacks), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Drain callback failed: {result}")
+
+
+# Singleton instance
+_drain: Optional[Drain] = None
+
+
+def get_drain() -> Drain:
+    """Get or create the drain tracker."""
+    global _drain
+    if _drain is None:
+        _drain = Drain()
+    return _drain
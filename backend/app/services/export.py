@@ -0,0 +1,207 @@
+"""Zip export of processing results, streamed with constant memory."""
+
+import io
+import json
+import logging
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..config import get_settings
+
+logger = logging.getLogger("smelt.export")
+
+# Size of the slices fed to the compressor; also bounds each yielded chunk
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ExportEntry:
+    """Outcome of one processed input."""
+
+    source: str
+    content: Optional[str] = None
+    transcript: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ExportBundle:
+    """A finished session's results, kept around for download."""
+
+    id: str
+    entries: list[ExportEntry]
+    created_at: float = field(default_factory=time.monotonic)
+    size: int = 0  # characters of content, transcripts and errors held in memory
+
+
+def result_filename(source: str) -> str:
+    """Name of the markdown output for a source file, e.g. call.mp3 -> call_smelt.md."""
+    return f"{Path(source).stem}_smelt.md"
+
+
+def transcript_filename(source: str) -> str:
+    """Name of the raw transcript for a source file."""
+    return f"transcripts/{Path(source).stem}_transcript.md"
+
+
+def _unique(name: str, taken: set[str]) -> str:
+    """name, or name with _2, _3... before the extension if an earlier member took it."""
+    candidate = name
+    path = Path(name)
+    counter = 2
+    while candidate in taken:
+        candidate = str(path.with_name(f"{path.stem}_{counter}{path.suffix}"))
+        counter += 1
+    taken.add(candidate)
+    return candidate
+
+
+def _member_names(
+    entries: list[ExportEntry], include_transcripts: bool
+) -> list[tuple[Optional[str], Optional[str]]]:
+    """
+    Archive names of each entry's output and transcript, None where absent.
+
+    Sources sharing a stem (call.wav and call.mp3, or a file and its
+    re-synthesis) would otherwise map to the same member, and extracting
+    the archive would keep only one of them.
+    """
+    taken = {"manifest.json"}
+    names = []
+    for entry in entries:
+        output = transcript = None
+        if entry.content is not None:
+            output = _unique(result_filename(entry.source), taken)
+        if include_transcripts and entry.transcript is not None:
+            transcript = _unique(transcript_filename(entry.source), taken)
+        names.append((output, transcript))
+    return names
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only, unseekable sink that hands back bytes written since the last drain."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _manifest(
+    entries: list[ExportEntry], names: list[tuple[Optional[str], Optional[str]]]
+) -> dict:
+    """Describe what the archive contains and which inputs failed."""
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "files": [
+            {
+                "source": entry.source,
+                "output": output,
+                "transcript": transcript,
+                "error": entry.error,
+            }
+            for entry, (output, transcript) in zip(entries, names)
+        ],
+    }
+
+
+def stream_zip(entries: list[ExportEntry], include_transcripts: bool = False) -> Iterator[bytes]:
+    """
+    Yield a deflated zip archive of the entries piece by piece.
+
+    The archive is written to an unseekable sink, so zipfile emits data
+    descriptors instead of seeking back, and compressed output is drained
+    after every slice. Memory use is bounded by EXPORT_CHUNK_SIZE rather
+    than by the size of the batch.
+    """
+    sink = _DrainableSink()
+
+    names = _member_names(entries, include_transcripts)
+    members: list[tuple[str, str]] = []
+    for entry, (output, transcript) in zip(entries, names):
+        if output is not None:
+            members.append((output, entry.content))
+        if transcript is not None:
+            members.append((transcript, entry.transcript))
+    members.append(("manifest.json", json.dumps(_manifest(entries, names), indent=2)))
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, text in members:
+            with archive.open(name, mode="w", force_zip64=False) as member:
+                for start in range(0, len(text), EXPORT_CHUNK_SIZE):
+                    member.write(text[start : start + EXPORT_CHUNK_SIZE].encode("utf-8"))
+                    if chunk := sink.drain():
+                        yield chunk
+            if chunk := sink.drain():
+                yield chunk
+    yield sink.drain()
+
+
+_exports: dict[str, ExportBundle] = {}
+
+
+def _prune_exports():
+    """Forget exports older than the configured TTL, then the oldest beyond the size cap."""
+    settings = get_settings()
+    now = time.monotonic()
+    for export_id in [
+        export_id
+        for export_id, bundle in _exports.items()
+        if now - bundle.created_at > settings.job_ttl_seconds
+    ]:
+        del _exports[export_id]
+
+    # Dicts keep insertion order, so the first exports are the oldest; the newest always stays
+    max_size = settings.export_max_mb * 1024 * 1024
+    retained = sum(bundle.size for bundle in _exports.values())
+    while retained > max_size and len(_exports) > 1:
+        export_id = next(iter(_exports))
+        retained -= _exports.pop(export_id).size
+        logger.info(f"Dropped export {export_id} to stay under {settings.export_max_mb} MB")
+
+
+def _entry_size(entry: ExportEntry) -> int:
+    return sum(len(text) for text in (entry.content, entry.transcript, entry.error) if text)
+
+
+def register_export(entries: list[ExportEntry], export_id: Optional[str] = None) -> str:
+    """Keep a session's results for later download and return the export id."""
+    export_id = export_id or uuid.uuid4().hex
+    _exports[export_id] = ExportBundle(
+        id=export_id, entries=entries, size=sum(_entry_size(entry) for entry in entries)
+    )
+    _prune_exports()
+    logger.info(f"Registered export {export_id} with {len(entries)} entries")
+    return export_id
+
+
+def export_count() -> int:
+    """Number of exports currently retained."""
+    _prune_exports()
+    return len(_exports)
+
+
+def get_export(export_id: str) -> Optional[ExportBundle]:
+    """Look up a registered export that has not expired or been dropped."""
+    _prune_exports()
+    return _exports.get(export_id)
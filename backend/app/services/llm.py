@@ -1,21 +1,36 @@
-"""OpenRouter LLM client with retry decorator."""
+"""LLM client with latency-based backend routing and retry decorator."""
 
 import asyncio
+import base64
 import functools
+import json
 import logging
-from dataclasses import dataclass
-from typing import Callable, Optional, TypeVar
-
-import httpx
+import re
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Optional, TypeVar, Union
+from urllib.parse import urlsplit
 
 from ..config import get_settings
 from ..errors import LLMError, LLMTimeoutError, RateLimitedError
+from .artifacts import Artifact
+from .deadline import Deadline, capped_timeout
+
+if TYPE_CHECKING:
+    # httpx is imported lazily on first use to keep cold starts fast
+    import httpx
 
 logger = logging.getLogger("smelt.llm")
 
 T = TypeVar("T")
 
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Number of recent latencies kept per backend for the p95 hedge deadline
+LATENCY_WINDOW = 50
+
+# Raw bytes base64-encoded per body chunk; a multiple of 3 so chunks encode independently
+BODY_CHUNK_BYTES = 3 * 64 * 1024
 
 
 @dataclass
@@ -27,19 +42,91 @@ class LLMResponse:
     tokens_used: int
 
 
+@dataclass
+class LLMBackend:
+    """A chat completions endpoint with rolling health statistics."""
+
+    name: str
+    url: str
+    model: str
+    api_key: str = ""
+    latency_ewma: Optional[float] = None
+    error_rate: float = 0.0
+    error_at: float = 0.0  # monotonic time error_rate was last brought up to date
+    reachable: bool = False  # answered the warm-up or served a request
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def record_success(self, latency: Optional[float], alpha: float) -> None:
+        """
+        Fold a successful call into the latency and error EWMAs.
+
+        A latency of None counts toward health only. Streams pass it, since
+        their duration follows the length of the output and would skew the
+        routing EWMA and the hedge p95, which are for whole completions.
+        """
+        if latency is not None:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = alpha * latency + (1 - alpha) * self.latency_ewma
+            self.latencies.append(latency)
+        self.error_rate = (1 - alpha) * self.error_rate
+        self.error_at = time.monotonic()
+        self.reachable = True
+
+    def record_failure(self, alpha: float) -> None:
+        """Fold a failed call into the error EWMA."""
+        self.error_rate = alpha + (1 - alpha) * self.error_rate
+        self.error_at = time.monotonic()
+
+    def decay_errors(self, half_life: float) -> float:
+        """
+        Decay the error EWMA by the time since it last changed, and return it.
+
+        An unhealthy backend gets no traffic, so no success would ever
+        bring its error rate down; decaying it over time lets the backend
+        rank as healthy again and be retried.
+        """
+        now = time.monotonic()
+        if self.error_rate and half_life > 0:
+            self.error_rate *= 0.5 ** ((now - self.error_at) / half_life)
+        self.error_at = now
+        return self.error_rate
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        """95th percentile of recent latencies, or None without enough data."""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
 def with_retries(
     max_retries: int = 3,
-    retry_on: tuple[type[Exception], ...] = (httpx.TimeoutException,),
+    retry_on: Optional[tuple[type[Exception], ...]] = None,
     backoff_base: int = 2,
+    deadline: Optional[Deadline] = None,
 ):
-    """Decorator for async functions that retries on specified exceptions with exponential backoff."""
+    """
+    Decorator for async functions that retries on specified exceptions with exponential backoff.
+
+    retry_on defaults to httpx timeouts. With a deadline, no attempt is
+    started, and no backoff slept, that would run past it.
+    """
 
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
         @functools.wraps(func)
         async def wrapper(*args, **kwargs) -> T:
+            nonlocal retry_on
+            if retry_on is None:
+                import httpx
+
+                retry_on = (httpx.TimeoutException,)
             last_exception: Exception | None = None
 
             for attempt in range(max_retries):
+                if deadline is not None and deadline.expired:
+                    break
                 try:
                     return await func(*args, **kwargs)
                 except retry_on as e:
@@ -48,9 +135,14 @@ def with_retries(
 
                     if attempt < max_retries - 1:
                         wait_time = backoff_base**attempt
+                        if deadline is not None and wait_time >= deadline.remaining():
+                            logger.info("No time left before the deadline to retry")
+                            break
                         logger.info(f"Retrying in {wait_time}s...")
                         await asyncio.sleep(wait_time)
 
+            if last_exception is None:
+                raise LLMTimeoutError(details="Deadline exceeded")
             raise last_exception
 
         return wrapper
@@ -58,30 +150,221 @@ def with_retries(
     return decorator
 
 
+def encode_body(payload: dict) -> tuple[int, Union[bytes, AsyncIterator[bytes]]]:
+    """
+    Serialize a request payload to JSON, streaming any artifacts in it.
+
+    An artifact anywhere in the payload stands for the base64 string of
+    its bytes. Those strings are encoded chunk by chunk while the body is
+    being sent, so neither the base64 text nor the full body is ever held
+    in memory. Each call returns a fresh body, so retries can resend it.
+
+    Returns:
+        The body length in bytes and the body, as bytes when there is
+        nothing to stream
+    """
+    artifacts: list[Artifact] = []
+    marker = uuid.uuid4().hex
+
+    def placeholder(obj):
+        if isinstance(obj, Artifact):
+            artifacts.append(obj)
+            return f"{marker}:{len(artifacts) - 1}"
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    text = json.dumps(payload, default=placeholder)
+    if not artifacts:
+        body = text.encode()
+        return len(body), body
+
+    # Alternating JSON text and artifact indexes; the text keeps the quotes
+    parts = re.split(f"{marker}:(\\d+)", text)
+    pieces = [part.encode() for part in parts[0::2]]
+    streamed = [artifacts[int(index)] for index in parts[1::2]]
+    length = sum(len(piece) for piece in pieces) + sum(
+        (artifact.size + 2) // 3 * 4 for artifact in streamed
+    )
+
+    async def body() -> AsyncIterator[bytes]:
+        yield pieces[0]
+        for artifact, piece in zip(streamed, pieces[1:]):
+            for chunk in artifact.chunks(BODY_CHUNK_BYTES):
+                yield base64.standard_b64encode(chunk)
+            yield piece
+
+    return length, body()
+
+
+def _build_backends() -> dict[str, list[LLMBackend]]:
+    """Build the per-task backend pools from settings."""
+    settings = get_settings()
+    backends: dict[str, list[LLMBackend]] = {
+        "transcription": [
+            LLMBackend(
+                name="openrouter",
+                url=settings.openrouter_api_url,
+                model=settings.openrouter_model_transcription,
+                api_key=settings.openrouter_api_key,
+            )
+        ],
+        "synthesis": [
+            LLMBackend(
+                name="openrouter",
+                url=settings.openrouter_api_url,
+                model=settings.openrouter_model_synthesis,
+                api_key=settings.openrouter_api_key,
+            )
+        ],
+    }
+
+    for config in settings.llm_backends:
+        for task in config.tasks:
+            if task not in backends:
+                logger.warning(f"Backend {config.name} lists unknown task: {task}")
+                continue
+            backends[task].append(
+                LLMBackend(
+                    name=config.name,
+                    url=config.url,
+                    model=config.model,
+                    api_key=config.api_key,
+                )
+            )
+
+    return backends
+
+
 class OpenRouterClient:
-    """Async client for OpenRouter API."""
+    """Async client for OpenRouter and other OpenAI-compatible backends."""
 
     def __init__(self):
         settings = get_settings()
         self.api_key = settings.openrouter_api_key
         self.timeout = settings.request_timeout
         self.max_retries = settings.max_retries
+        self.ewma_alpha = settings.llm_ewma_alpha
+        self.unhealthy_error_rate = settings.llm_unhealthy_error_rate
+        self.error_half_life = settings.llm_error_half_life_seconds
+        self.hedge_requests = settings.llm_hedge_requests
+        self.hedge_min_samples = settings.llm_hedge_min_samples
+        self.backends = _build_backends()
+        self._http: Optional["httpx.AsyncClient"] = None
+
+    def http(self) -> "httpx.AsyncClient":
+        """Shared HTTP client, so connections are pooled across requests."""
+        if self._http is None:
+            import httpx
+
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        return self._http
+
+    async def warm_up(self) -> bool:
+        """
+        Open a pooled connection to every backend host not yet reached.
+
+        Any HTTP response counts as reachable; the point is to have DNS,
+        TCP and TLS done before a user is waiting. Returns whether every
+        host has now answered.
+        """
+        pending: dict[str, list[LLMBackend]] = {}
+        for pool in self.backends.values():
+            for backend in pool:
+                if not backend.reachable:
+                    origin = "{0.scheme}://{0.netloc}/".format(urlsplit(backend.url))
+                    pending.setdefault(origin, []).append(backend)
+        if not pending:
+            return True
+
+        client = self.http()
+        results = await asyncio.gather(
+            *(client.head(origin, timeout=10) for origin in pending),
+            return_exceptions=True,
+        )
+        failed = 0
+        for (origin, backends), result in zip(pending.items(), results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warm-up could not reach {origin}")
+                failed += 1
+                continue
+            for backend in backends:
+                backend.reachable = True
+        logger.info(f"LLM connection pool warm-up: {len(pending) - failed}/{len(pending)} hosts")
+        return not failed
+
+    def ready(self) -> bool:
+        """
+        Whether every task has a backend that can take a request right now.
+
+        A backend counts once it has been reached and while its decayed
+        error rate is below LLM_UNHEALTHY_ERROR_RATE, so one working
+        backend per task is enough and readiness follows backend health.
+        """
+        return all(
+            any(
+                backend.reachable
+                and backend.decay_errors(self.error_half_life) < self.unhealthy_error_rate
+                for backend in pool
+            )
+            for pool in self.backends.values()
+        )
+
+    async def aclose(self):
+        """Close pooled connections."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        for pool in self.backends.values():
+            for backend in pool:
+                backend.reachable = False
+
+    def rank_backends(self, task: str) -> list[LLMBackend]:
+        """
+        Order a task's backends from most to least preferred.
+
+        Healthy backends come first, fastest EWMA latency first. Backends
+        with no latency data yet sort to the front so they get probed.
+        Error rates decay with LLM_ERROR_HALF_LIFE_SECONDS, so an
+        unhealthy backend is tried again once it has been left alone long
+        enough.
+        """
+        if task not in self.backends:
+            raise LLMError(details=f"No backends configured for task: {task}")
+
+        def sort_key(backend: LLMBackend) -> tuple[bool, float, float]:
+            unhealthy = backend.decay_errors(self.error_half_life) >= self.unhealthy_error_rate
+            latency = backend.latency_ewma if backend.latency_ewma is not None else 0.0
+            return (unhealthy, latency, backend.error_rate)
+
+        return sorted(self.backends[task], key=sort_key)
 
     async def complete(
         self,
         messages: list[dict],
-        model: str,
+        task: str,
         temperature: float = 0.3,
         max_tokens: int = 8192,
+        deadline: Optional[Deadline] = None,
     ) -> LLMResponse:
-        """Send completion request to OpenRouter."""
+        """
+        Send completion request to the best backend for the task.
+
+        With a deadline, each attempt's timeout is capped to the time left
+        and the whole call, retries included, is abandoned when it passes.
+        Cancelling the caller aborts the upstream request at once.
+        """
+        import httpx
+
         try:
-            return await self._complete_with_retries(
-                messages=messages,
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-            )
+            async with asyncio.timeout(deadline.remaining() if deadline else None):
+                return await self._complete_with_retries(
+                    messages=messages,
+                    task=task,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    deadline=deadline,
+                )
+        except TimeoutError:
+            raise LLMTimeoutError(details="Deadline exceeded")
         except httpx.TimeoutException as e:
             raise LLMTimeoutError(details=str(e))
         except httpx.HTTPStatusError as e:
@@ -93,76 +376,240 @@ class OpenRouterClient:
     async def _complete_with_retries(
         self,
         messages: list[dict],
-        model: str,
+        task: str,
         temperature: float,
         max_tokens: int,
+        deadline: Optional[Deadline],
     ) -> LLMResponse:
-        """Complete with retry logic."""
+        """Complete with retry logic. Each attempt re-ranks the backends."""
+        import httpx
 
         @with_retries(
             max_retries=self.max_retries,
             retry_on=(httpx.TimeoutException, httpx.HTTPStatusError),
+            deadline=deadline,
         )
         async def _request() -> LLMResponse:
-            return await self._make_request(
+            return await self._dispatch(
                 messages=messages,
-                model=model,
+                task=task,
                 temperature=temperature,
                 max_tokens=max_tokens,
+                timeout=capped_timeout(self.timeout, deadline),
             )
 
         return await _request()
 
+    async def _dispatch(
+        self,
+        messages: list[dict],
+        task: str,
+        temperature: float,
+        max_tokens: int,
+        timeout: float,
+    ) -> LLMResponse:
+        """
+        Send to the preferred backend, hedging onto the runner-up if enabled.
+
+        The hedge fires once the primary has been running longer than its
+        recent p95 latency. Whichever request finishes first wins and the
+        other is cancelled.
+        """
+        ranked = self.rank_backends(task)
+        primary = ranked[0]
+
+        def start(backend: LLMBackend) -> asyncio.Task:
+            return asyncio.create_task(
+                self._timed_request(backend, messages, temperature, max_tokens, timeout)
+            )
+
+        hedge_after = primary.p95(self.hedge_min_samples)
+        if not self.hedge_requests or len(ranked) < 2 or hedge_after is None:
+            return await self._timed_request(primary, messages, temperature, max_tokens, timeout)
+
+        # Whatever is still pending when we leave, cancellation included, is cancelled
+        pending = {start(primary)}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                logger.info(
+                    f"{primary.name} past p95 ({hedge_after:.1f}s), hedging to {ranked[1].name}"
+                )
+                pending.add(start(ranked[1]))
+
+            while True:
+                for task_done in done:
+                    if task_done.exception() is None or not pending:
+                        return task_done.result()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task_pending in pending:
+                task_pending.cancel()
+
+    async def _timed_request(
+        self,
+        backend: LLMBackend,
+        messages: list[dict],
+        temperature: float,
+        max_tokens: int,
+        timeout: float,
+    ) -> LLMResponse:
+        """Make a request and record its outcome on the backend."""
+        import httpx
+
+        started = time.monotonic()
+        try:
+            response = await self._make_request(backend, messages, temperature, max_tokens, timeout)
+        except asyncio.CancelledError:
+            raise
+        except httpx.TimeoutException:
+            # A timeout shortened to fit the session deadline is the deadline passing
+            if timeout >= self.timeout:
+                backend.record_failure(self.ewma_alpha)
+            raise
+        except Exception:
+            backend.record_failure(self.ewma_alpha)
+            logger.debug(f"{backend.name} error rate now {backend.error_rate:.2f}")
+            raise
+        backend.record_success(time.monotonic() - started, self.ewma_alpha)
+        return response
+
+    async def stream(
+        self,
+        messages: list[dict],
+        task: str,
+        temperature: float = 0.3,
+        max_tokens: int = 8192,
+        deadline: Optional[Deadline] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream completion text deltas from the best backend for the task.
+
+        There are no retries or hedging: once text has been handed to the
+        caller the request cannot be replayed transparently. With a
+        deadline, the stream is abandoned as soon as it passes.
+        """
+        import httpx
+
+        if deadline is not None and deadline.expired:
+            raise LLMTimeoutError(details="Deadline exceeded")
+        backend = self.rank_backends(task)[0]
+        payload = {
+            "model": backend.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+
+        length, body = encode_body(payload)
+        try:
+            async with self.http().stream(
+                "POST",
+                backend.url,
+                headers=self._headers(backend, length),
+                content=body,
+                timeout=capped_timeout(self.timeout, deadline),
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # SSE: skip blanks and keep-alive comments
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:") :].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        error_msg = chunk["error"].get("message", str(chunk["error"]))
+                        logger.error(f"API error mid-stream: {error_msg}")
+                        raise LLMError(details=error_msg)
+                    choices = chunk.get("choices") or [{}]
+                    if delta := choices[0].get("delta", {}).get("content"):
+                        yield delta
+                    if deadline is not None and deadline.expired:
+                        raise LLMTimeoutError(details="Deadline exceeded mid-stream")
+        except httpx.TimeoutException as e:
+            # A read timeout capped by the session deadline is not the backend's fault
+            if deadline is None or not deadline.expired:
+                backend.record_failure(self.ewma_alpha)
+            raise LLMTimeoutError(details=str(e))
+        except httpx.HTTPStatusError as e:
+            backend.record_failure(self.ewma_alpha)
+            if e.response.status_code == 429:
+                retry_after = int(e.response.headers.get("Retry-After", 60))
+                raise RateLimitedError(retry_after=retry_after)
+            raise LLMError(details=f"HTTP {e.response.status_code}: {e.response.text}")
+        except LLMTimeoutError:
+            # Raised above when the deadline passes mid-stream
+            raise
+        except LLMError:
+            backend.record_failure(self.ewma_alpha)
+            raise
+        backend.record_success(None, self.ewma_alpha)
+
+    def _headers(self, backend: LLMBackend, content_length: int) -> dict[str, str]:
+        """Request headers for a backend."""
+        headers = {
+            "Content-Type": "application/json",
+            # Known up front, so streamed bodies go out without chunked encoding
+            "Content-Length": str(content_length),
+            "HTTP-Referer": "https://smelt.app",
+            "X-Title": "SMELT",
+        }
+        if backend.api_key:
+            headers["Authorization"] = f"Bearer {backend.api_key}"
+        return headers
+
     async def _make_request(
         self,
+        backend: LLMBackend,
         messages: list[dict],
-        model: str,
         temperature: float,
         max_tokens: int,
+        timeout: float,
     ) -> LLMResponse:
         """Make single API request."""
         payload = {
-            "model": model,
+            "model": backend.model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            response = await client.post(
-                OPENROUTER_API_URL,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://smelt.app",
-                    "X-Title": "SMELT",
-                },
-                json=payload,
-            )
-            response.raise_for_status()
-            data = response.json()
+        length, body = encode_body(payload)
+        response = await self.http().post(
+            backend.url,
+            headers=self._headers(backend, length),
+            content=body,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
 
-            logger.debug(f"API response: {data}")
+        logger.debug(f"API response from {backend.name}: {data}")
 
-            # Check for API error in response body
-            if "error" in data:
-                error_msg = data["error"].get("message", str(data["error"]))
-                logger.error(f"API error: {error_msg}")
-                raise LLMError(details=error_msg)
+        # Check for API error in response body
+        if "error" in data:
+            error_msg = data["error"].get("message", str(data["error"]))
+            logger.error(f"API error: {error_msg}")
+            raise LLMError(details=error_msg)
 
-            if "choices" not in data or not data["choices"]:
-                logger.error(f"Unexpected response structure: {data}")
-                raise LLMError(details="Missing 'choices' in response")
+        if "choices" not in data or not data["choices"]:
+            logger.error(f"Unexpected response structure: {data}")
+            raise LLMError(details="Missing 'choices' in response")
 
-            content = data["choices"][0]["message"]["content"] or ""
-            tokens = data.get("usage", {}).get("total_tokens", 0)
-            actual_model = data.get("model", model)
+        content = data["choices"][0]["message"]["content"] or ""
+        tokens = data.get("usage", {}).get("total_tokens", 0)
+        actual_model = data.get("model", backend.model)
 
-            return LLMResponse(
-                content=content,
-                model=actual_model,
-                tokens_used=tokens,
-            )
+        return LLMResponse(
+            content=content,
+            model=actual_model,
+            tokens_used=tokens,
+        )
 
 
 # Singleton instance
@@ -0,0 +1,153 @@
+"""Session scheduler - bounded concurrency, shortest job first."""
+
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Optional
+
+
+@dataclass(eq=False)
+class _Waiter:
+    estimate: float
+    queued_at: float
+    seq: int
+    future: asyncio.Future = field(repr=False)
+
+
+class SessionScheduler:
+    """
+    Hands out a session's processing slots.
+
+    At most `slots` inputs run at once (no limit if slots <= 0). Under
+    the "sjf" order the queued input with the smallest estimated run
+    time goes next, and while at least one slot is busy, inputs
+    announced with expect() but not yet arrived hold back longer ones,
+    so a large file uploaded first does not take the slot a smaller one
+    is about to need. A queued input never waits with every slot idle.
+    Under "fifo" inputs start in arrival order.
+
+    An input queued for max_wait_seconds or longer goes ahead of every
+    input that has not waited that long, oldest first, and no longer
+    waits for expected ones, so a stream of small inputs (or a client
+    that never sends what it announced) cannot starve it.
+    """
+
+    def __init__(self, slots: int, order: str = "sjf", max_wait_seconds: float = 60):
+        self.slots = slots
+        self.order = order
+        self.max_wait_seconds = max_wait_seconds
+        self._active = 0
+        self._waiting: list[_Waiter] = []
+        self._expected: dict[Hashable, float] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        """Number of inputs waiting for a slot."""
+        return len(self._waiting)
+
+    def expect(self, key: Hashable, estimate: float):
+        """Announce an input that will arrive later, expected to take estimate seconds."""
+        if self.order == "sjf":
+            self._expected[key] = estimate
+
+    def forget(self, key: Hashable):
+        """Drop an announced input that arrived, was refused or was cancelled."""
+        if self._expected.pop(key, None) is not None:
+            self._dispatch()
+
+    async def acquire(
+        self,
+        estimate: float,
+        key: Optional[Hashable] = None,
+        on_queued: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        """
+        Wait for a slot for an input expected to take estimate seconds.
+
+        Args:
+            estimate: Expected run time, the SJF priority
+            key: The key the input was announced under, if it was
+            on_queued: Awaited if the input has to wait for a slot
+        """
+        self._expected.pop(key, None)
+        waiter = _Waiter(
+            estimate=estimate,
+            queued_at=time.monotonic(),
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._waiting.append(waiter)
+        self._dispatch()
+        try:
+            if not waiter.future.done() and on_queued is not None:
+                await on_queued()
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+                waiter.future.cancel()
+                self._dispatch()
+            elif not waiter.future.cancelled():
+                # Granted a slot, then cancelled before it could use it
+                self.release()
+            raise
+
+    def release(self):
+        """Give a slot back and start the next queued input, if any."""
+        self._active -= 1
+        self._dispatch()
+
+    def _overdue(self, waiter: _Waiter, now: float) -> bool:
+        return now - waiter.queued_at >= self.max_wait_seconds
+
+    def _next(self, now: float) -> _Waiter:
+        overdue = [w for w in self._waiting if self._overdue(w, now)]
+        if overdue:
+            return min(overdue, key=lambda w: w.seq)
+        if self.order == "sjf":
+            return min(self._waiting, key=lambda w: (w.estimate, w.seq))
+        return min(self._waiting, key=lambda w: w.seq)
+
+    def _dispatch(self):
+        """Start queued inputs while there are free slots."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._waiting and (self.slots <= 0 or self._active < self.slots):
+            waiter = self._next(now)
+            if waiter.future.done():
+                # Cancelled, and its task has not yet run to leave the queue
+                self._waiting.remove(waiter)
+                continue
+            if self._active and self._expected and not self._overdue(waiter, now):
+                # Keep a slot for each shorter input still on its way, as long
+                # as something is running; idle slots are never held
+                shorter = sum(1 for estimate in self._expected.values() if estimate < waiter.estimate)
+                if self.slots > 0 and shorter >= self.slots - self._active:
+                    # Look again once the oldest waiter is due, in case they never come
+                    oldest = min(w.queued_at for w in self._waiting)
+                    delay = max(oldest + self.max_wait_seconds - now, 0.0)
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                    return
+            self._waiting.remove(waiter)
+            self._active += 1
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        estimate: float,
+        key: Optional[Hashable] = None,
+        on_queued: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block. Arguments as for acquire()."""
+        await self.acquire(estimate, key, on_queued)
+        try:
+            yield
+        finally:
+            self.release()
@@ -1,10 +1,13 @@
 """Text synthesis service - cleans and structures messy notes."""
 
+import asyncio
 import logging
+import re
 from pathlib import Path
+from typing import AsyncIterator, Optional
 
-from ..config import get_settings
 from ..errors import SynthesisFailedError
+from .deadline import Deadline
 from .llm import get_llm_client
 
 logger = logging.getLogger("smelt.synthesis")
@@ -25,12 +28,29 @@ Fix grammar, organize with headers, use bullet points for lists.
 Output only the cleaned markdown."""
 
 
-async def synthesize_text(raw_text: str) -> str:
+# Appended to the prompt for every section of a transcript after the first
+CONTINUATION_PROMPT = """
+THIS TEXT CONTINUES A TRANSCRIPT WHOSE EARLIER PART IS CLEANED SEPARATELY.
+Your output is appended directly after that part. Do not add a title,
+heading or introduction; start with the first sentence of the text."""
+
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+async def synthesize_text(
+    raw_text: str,
+    deadline: Optional[Deadline] = None,
+    style: Optional[str] = None,
+    continuation: bool = False,
+) -> str:
     """
     Clean and structure messy text using LLM.
 
     Args:
         raw_text: Raw, messy text content
+        deadline: When the session's time runs out, passed to the LLM client
+        style: Extra style instructions from the user, applied on top of the prompt
+        continuation: The text continues an earlier section, so no title or intro
 
     Returns:
         Clean, structured markdown
@@ -38,10 +58,13 @@ async def synthesize_text(raw_text: str) -> str:
     Raises:
         SynthesisFailedError: If synthesis fails
     """
-    settings = get_settings()
     client = get_llm_client()
 
     system_prompt = _load_prompt()
+    if continuation:
+        system_prompt += "\n" + CONTINUATION_PROMPT
+    if style:
+        system_prompt += f"\n\nSTYLE REQUESTED BY THE USER (apply on top of the rules above):\n{style}"
 
     logger.info(f"Synthesizing {len(raw_text)} characters")
 
@@ -53,12 +76,75 @@ async def synthesize_text(raw_text: str) -> str:
     try:
         response = await client.complete(
             messages=messages,
-            model=settings.openrouter_model_synthesis,
+            task="synthesis",
             temperature=0.3,
             max_tokens=8192,
+            deadline=deadline,
         )
         logger.info(f"Synthesis complete: {response.tokens_used} tokens")
         return response.content
     except Exception as e:
         logger.error(f"Synthesis failed: {e}")
         raise SynthesisFailedError(details=str(e))
+
+
+async def synthesize_sections(
+    sections: AsyncIterator[str],
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """
+    Synthesize transcript sections as they arrive and merge the results.
+
+    Each section is sent off as soon as it is yielded, so synthesis of the
+    early parts overlaps with transcription of the later ones. Sections
+    after the first are prompted as continuations, and merge_sections()
+    joins the results in section order.
+
+    Raises:
+        SynthesisFailedError: If any section fails to synthesize
+    """
+    tasks: list[asyncio.Task] = []
+    try:
+        async for section in sections:
+            tasks.append(
+                asyncio.create_task(synthesize_text(section, deadline, continuation=bool(tasks)))
+            )
+        parts = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    logger.info(f"Merged {len(parts)} synthesized sections")
+    return merge_sections(parts)
+
+
+def merge_sections(parts: list[str]) -> str:
+    """
+    Join separately synthesized sections into one document.
+
+    A heading in a later section that repeats one already in the document
+    (the model restating the title, say) is dropped, along with the blank
+    lines right after it, so the merged text reads as a single piece.
+    """
+    seen: set[str] = set()
+    merged: list[str] = []
+    for part in parts:
+        lines: list[str] = []
+        skipping_blank = False
+        for line in part.strip().splitlines():
+            heading = _HEADING.match(line)
+            if heading:
+                key = " ".join(heading.group(2).lower().split())
+                if key in seen:
+                    skipping_blank = True
+                    continue
+                seen.add(key)
+            elif skipping_blank and not line.strip():
+                continue
+            skipping_blank = False
+            lines.append(line)
+        text = "\n".join(lines).strip()
+        if text:
+            merged.append(text)
+    return "\n\n".join(merged)
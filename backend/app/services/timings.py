@@ -0,0 +1,107 @@
+"""Timing model - rolling histograms of stage durations for ETAs and scheduling."""
+
+import math
+from typing import Optional
+
+# Log-spaced bins of seconds per unit of input (byte, audio second, character)
+RATE_BINS = 96
+RATE_MIN = 1e-10
+RATE_GROWTH = 1.4
+
+# Every new sample scales older ones by this, so the histogram follows drift;
+# the effective window is about 1 / (1 - DECAY) samples
+DECAY = 0.97
+
+# Weight a histogram needs before its estimate is trusted over a prior
+MIN_WEIGHT = 3.0
+
+
+def size_bucket(size: float) -> int:
+    """Power-of-two size class, so fixed overheads on small inputs are learned separately."""
+    return int(math.log2(max(size, 1.0)))
+
+
+class RateHistogram:
+    """Decaying histogram of seconds-per-unit rates in log-spaced bins."""
+
+    __slots__ = ("counts", "weight")
+
+    def __init__(self):
+        self.counts = [0.0] * RATE_BINS
+        self.weight = 0.0
+
+    def add(self, rate: float):
+        """Fold in one observed rate."""
+        if rate > 0:
+            index = int(math.log(rate / RATE_MIN) / math.log(RATE_GROWTH))
+        else:
+            index = 0
+        index = min(max(index, 0), RATE_BINS - 1)
+        self.counts = [count * DECAY for count in self.counts]
+        self.counts[index] += 1.0
+        self.weight = self.weight * DECAY + 1.0
+
+    def median(self) -> float:
+        """Median rate, at the geometric centre of its bin."""
+        half = self.weight / 2
+        seen = 0.0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= half:
+                return RATE_MIN * RATE_GROWTH ** (index + 0.5)
+        return RATE_MIN * RATE_GROWTH ** (RATE_BINS - 0.5)
+
+
+class TimingModel:
+    """
+    Per-stage duration model, bucketed by input size and model.
+
+    Stages record how long they took for an input of a given size, in
+    whatever unit suits the stage. Estimates scale the median rate of the
+    matching size class by the input size, falling back to the
+    neighbouring classes and then to None, in which case the caller's
+    prior applies.
+    """
+
+    def __init__(self):
+        self._histograms: dict[tuple[str, str, int], RateHistogram] = {}
+
+    def record(self, stage: str, model: str, size: float, seconds: float):
+        """Record one completed stage."""
+        if size <= 0 or seconds <= 0:
+            return
+        key = (stage, model, size_bucket(size))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = RateHistogram()
+        histogram.add(seconds / size)
+
+    def estimate(self, stage: str, model: str, size: float) -> Optional[float]:
+        """Expected seconds for a stage on an input of this size, or None without data."""
+        if size <= 0:
+            return None
+        bucket = size_bucket(size)
+        for candidate in (bucket, bucket - 1, bucket + 1):
+            histogram = self._histograms.get((stage, model, candidate))
+            if histogram is not None and histogram.weight >= MIN_WEIGHT:
+                return histogram.median() * size
+        return None
+
+    def stats(self) -> dict[str, int]:
+        """Number of histograms per stage."""
+        counts: dict[str, int] = {}
+        for stage, _, _ in self._histograms:
+            counts[stage] = counts.get(stage, 0) + 1
+        return counts
+
+
+# Singleton instance
+_model: Optional[TimingModel] = None
+
+
+def get_timing_model() -> TimingModel:
+    """Get or create the timing model."""
+    global _model
+    if _model is None:
+        _model = TimingModel()
+    return _model
@@ -0,0 +1,199 @@
+"""Transcript store - speaker-segmented transcripts in SQLite, keyed by audio hash."""
+
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from ..config import get_settings
+from .artifacts import Artifact
+
+logger = logging.getLogger("smelt.transcripts")
+
+# Bytes hashed per step when fingerprinting audio
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# "**Speaker 1:** text", the label format the transcription prompt asks for
+SPEAKER_LINE = re.compile(r"^\*\*(?P<speaker>[^*]+?):\*\*\s?(?P<text>.*)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id TEXT PRIMARY KEY,
+    audio_hash TEXT NOT NULL UNIQUE,
+    filename TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_created_at ON transcripts (created_at);
+CREATE TABLE IF NOT EXISTS segments (
+    transcript_id TEXT NOT NULL REFERENCES transcripts (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    speaker TEXT,
+    text TEXT NOT NULL,
+    PRIMARY KEY (transcript_id, position)
+);
+"""
+
+
+@dataclass
+class Segment:
+    """One speaker turn. speaker is None for text before the first label."""
+
+    speaker: Optional[str]
+    text: str
+
+
+@dataclass
+class TranscriptRecord:
+    """A stored transcript."""
+
+    id: str
+    audio_hash: str
+    filename: str
+    created_at: float
+    segments: list[Segment]
+
+    @property
+    def text(self) -> str:
+        """The transcript as markdown, in the transcription prompt's format."""
+        return "\n".join(
+            f"**{segment.speaker}:** {segment.text}" if segment.speaker else segment.text
+            for segment in self.segments
+        )
+
+
+def segment_transcript(text: str) -> list[Segment]:
+    """Split a transcript into speaker turns. Unlabelled lines continue the current turn."""
+    segments: list[Segment] = []
+    for line in text.strip().splitlines():
+        match = SPEAKER_LINE.match(line.strip())
+        if match:
+            segments.append(Segment(speaker=match["speaker"].strip(), text=match["text"]))
+        elif segments:
+            segments[-1].text += "\n" + line
+        else:
+            segments.append(Segment(speaker=None, text=line))
+    return segments
+
+
+def hash_audio(audio: Artifact) -> str:
+    """SHA-256 of the audio bytes. Blocking; run it in a thread for large files."""
+    digest = hashlib.sha256()
+    for chunk in audio.chunks(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptStore:
+    """
+    SQLite-backed transcript store.
+
+    Queries are small but blocking, so the async methods run them in a
+    thread, serialized on one connection.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.executescript(SCHEMA)
+        logger.info(f"Transcript store at {path}")
+
+    def _load(self, row: Optional[tuple]) -> Optional[TranscriptRecord]:
+        if row is None:
+            return None
+        transcript_id, audio_hash, filename, created_at = row
+        segments = [
+            Segment(speaker=speaker, text=text)
+            for speaker, text in self._db.execute(
+                "SELECT speaker, text FROM segments WHERE transcript_id = ? ORDER BY position",
+                (transcript_id,),
+            )
+        ]
+        return TranscriptRecord(transcript_id, audio_hash, filename, created_at, segments)
+
+    def _oldest(self) -> float:
+        # Expired rows linger until the next save; lookups must not return them
+        return time.time() - self.ttl_seconds
+
+    def _get(self, transcript_id: str) -> Optional[TranscriptRecord]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, audio_hash, filename, created_at FROM transcripts"
+                " WHERE id = ? AND created_at >= ?",
+                (transcript_id, self._oldest()),
+            ).fetchone()
+            return self._load(row)
+
+    def _find_by_hash(self, audio_hash: str) -> Optional[TranscriptRecord]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, audio_hash, filename, created_at FROM transcripts"
+                " WHERE audio_hash = ? AND created_at >= ?",
+                (audio_hash, self._oldest()),
+            ).fetchone()
+            return self._load(row)
+
+    def _save(self, audio_hash: str, filename: str, text: str) -> TranscriptRecord:
+        record = TranscriptRecord(
+            id=uuid.uuid4().hex,
+            audio_hash=audio_hash,
+            filename=filename,
+            created_at=time.time(),
+            segments=segment_transcript(text),
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM transcripts WHERE audio_hash = ? OR created_at < ?",
+                (audio_hash, record.created_at - self.ttl_seconds),
+            )
+            self._db.execute(
+                "INSERT INTO transcripts (id, audio_hash, filename, created_at) VALUES (?, ?, ?, ?)",
+                (record.id, record.audio_hash, record.filename, record.created_at),
+            )
+            self._db.executemany(
+                "INSERT INTO segments (transcript_id, position, speaker, text) VALUES (?, ?, ?, ?)",
+                [
+                    (record.id, position, segment.speaker, segment.text)
+                    for position, segment in enumerate(record.segments)
+                ],
+            )
+        return record
+
+    async def get(self, transcript_id: str) -> Optional[TranscriptRecord]:
+        """Look up an unexpired transcript by its ID."""
+        return await asyncio.to_thread(self._get, transcript_id)
+
+    async def find_by_hash(self, audio_hash: str) -> Optional[TranscriptRecord]:
+        """Look up the unexpired transcript of a recording by its audio hash."""
+        return await asyncio.to_thread(self._find_by_hash, audio_hash)
+
+    async def save(self, audio_hash: str, filename: str, text: str) -> TranscriptRecord:
+        """Store a transcript, replacing any earlier one of the same audio and expired ones."""
+        record = await asyncio.to_thread(self._save, audio_hash, filename, text)
+        logger.info(f"Stored transcript {record.id} of {filename} ({len(record.segments)} segments)")
+        return record
+
+
+# Singleton instance
+_store: Optional[TranscriptStore] = None
+
+
+def get_transcript_store() -> TranscriptStore:
+    """Get or create the transcript store."""
+    global _store
+    if _store is None:
+        settings = get_settings()
+        path = settings.transcript_db_path or str(Path(tempfile.gettempdir()) / "smelt-transcripts.db")
+        _store = TranscriptStore(Path(path), settings.transcript_ttl_seconds)
+    return _store
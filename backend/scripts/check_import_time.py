@@ -0,0 +1,73 @@
+"""Measure how long `import app.main` takes and fail if it blows the budget.
+
+Usage (from backend/):
+    uv run python scripts/check_import_time.py [--budget-ms 800] [--top 15]
+
+Runs the import in a fresh interpreter under `-X importtime`, prints the
+slowest modules, and exits non-zero if the total exceeds the budget or if
+a module that must stay lazy (see LAZY_MODULES) was imported eagerly.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Modules that should only load on first use, not at startup
+LAZY_MODULES = {"httpx"}
+
+DEFAULT_BUDGET_MS = 800
+
+
+def measure() -> list[tuple[str, int, int]]:
+    """Return (module, self_us, cumulative_us) for every module imported by app.main."""
+    env = {**os.environ, "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY", "import-check")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.exit(f"import app.main failed:\n{proc.stderr}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=int, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = measure()
+    total_ms = sum(self_us for _, self_us, _ in rows) / 1000
+
+    print(f"{'self ms':>9} {'cum ms':>9}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]:
+        print(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
+    print(f"\nTotal import time: {total_ms:.0f}ms (budget {args.budget_ms}ms)")
+
+    failed = False
+    eager = sorted(LAZY_MODULES & {name for name, _, _ in rows})
+    if eager:
+        print(f"FAIL: imported eagerly but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
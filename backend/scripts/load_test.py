@@ -0,0 +1,483 @@
+"""Load-test and soak the /ws/process endpoint against a mocked upstream.
+
+Usage (from backend/):
+    uv run python scripts/load_test.py --rates 5,10,20,40 --step-seconds 30
+    uv run python scripts/load_test.py --soak --rates 10 --step-seconds 1800
+    uv run python scripts/load_test.py --url ws://staging:8000 --rates 20
+    uv run python scripts/load_test.py --files 6 --file-kb 2048,64,64 --upstream-seconds-per-mb 2
+
+Unless --url is given, starts a mock OpenAI-compatible upstream with
+--upstream-latency seconds (+/- --upstream-jitter) per call, and a uvicorn
+worker pointed at it through OPENROUTER_API_URL, with /stats enabled. A
+server given with --url needs STATS_ENABLED=true for the /stats samples.
+Clients arrive open-loop (Poisson, at each rate in --rates for
+--step-seconds) and follow the real protocol: start with metadata, wait for
+ready, one process message per file, end, wait for done.
+
+Prints, per rate step, throughput and session latency percentiles (the
+saturation curve), the mean time for a file in a session to complete,
+connection failures and peak open sockets. --file-kb takes a comma-separated
+list of sizes that a session's files cycle through, and with
+--upstream-seconds-per-mb the mock's latency grows with the request size, so
+mixed batches show the effect of SESSION_ORDER. While it runs it samples the
+worker's RSS and /stats; with --soak it fits a line to those samples and
+fails if memory keeps growing or sessions are still held once every client
+has finished. Finished sessions keep their export for JOB_TTL_SECONDS, so
+pass --env JOB_TTL_SECONDS=60 to soak past that plateau.
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import wave
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import websockets
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MOCK_PORT = 8901
+SERVER_PORT = 8902
+
+# Soak fails if RSS grows faster than this after warm-up
+DEFAULT_LEAK_MB_PER_HOUR = 50
+
+
+# --- Mock upstream -----------------------------------------------------------
+
+STREAM_FLAG = b'"stream": true'
+
+# Speaker turns streamed one per event, long enough to make several
+# PIPELINE_SECTION_CHARS sections
+MOCK_STREAM_LINES = [
+    f"**Speaker {turn % 2 + 1}:** " + "mocked words of a streamed transcript " * 30 + "\n"
+    for turn in range(12)
+]
+
+
+def run_mock_upstream(port: int, latency: float, jitter: float, seconds_per_mb: float):
+    """
+    Serve an OpenAI-compatible chat completions endpoint with size-dependent latency.
+
+    Requests with "stream": true get a text/event-stream response whose
+    deltas are spread over the latency, like a real streaming transcription.
+    """
+    import uvicorn
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        # Drain the request body; audio arrives as a large JSON string. The
+        # stream flag follows the messages, so only a short tail is searched
+        received = 0
+        streaming = False
+        tail = b""
+        more = True
+        while more:
+            message = await receive()
+            chunk = message.get("body", b"")
+            received += len(chunk)
+            streaming = streaming or STREAM_FLAG in tail + chunk
+            tail = chunk[-len(STREAM_FLAG) :]
+            more = message.get("more_body", False)
+        delay = 0.0
+        if scope["method"] == "POST":
+            delay = max(0.0, random.uniform(latency - jitter, latency + jitter))
+            delay += received / 1e6 * seconds_per_mb
+
+        if streaming:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")],
+                }
+            )
+            for line in MOCK_STREAM_LINES:
+                await asyncio.sleep(delay / len(MOCK_STREAM_LINES))
+                event = {"model": "mock", "choices": [{"delta": {"content": line}}]}
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": f"data: {json.dumps(event)}\n\n".encode(),
+                        "more_body": True,
+                    }
+                )
+            await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+            return
+
+        await asyncio.sleep(delay)
+        body = json.dumps(
+            {
+                "model": "mock",
+                "choices": [{"message": {"content": "## Notes\n\n- mocked output\n"}}],
+                "usage": {"total_tokens": 42},
+            }
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def start_server(port: int, upstream_port: int, extra_env: list[str]) -> subprocess.Popen:
+    """Start a uvicorn worker for app.main pointed at the mock upstream."""
+    env = {
+        **os.environ,
+        "OPENROUTER_API_KEY": "load-test",
+        "OPENROUTER_API_URL": f"http://127.0.0.1:{upstream_port}/v1/chat/completions",
+        "LOG_LEVEL": "WARNING",
+        "STATS_ENABLED": "true",
+    }
+    for pair in extra_env:
+        key, _, value = pair.partition("=")
+        env[key] = value
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--ws", "websockets",
+            "--backlog", "4096",
+            "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a local process, from /proc."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# --- Simulated clients ---------------------------------------------------------
+
+
+def make_wav(size_kb: int, tag: bytes = b"") -> str:
+    """
+    Base64 of a mono WAV of roughly size_kb, so header probing works.
+
+    The audio is silence led by tag; distinct tags keep the server's
+    transcript store from recognising a recording it has seen before.
+    """
+    frames = tag + b"\0" * (size_kb * 1024 - len(tag))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(16000)
+        out.writeframes(frames[: len(frames) // 2 * 2])
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+@dataclass
+class StepResult:
+    """Outcome of every session started during one rate step."""
+
+    rate: float
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    connect_failed: int = 0
+    latencies: list[float] = field(default_factory=list)
+    file_latencies: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def count_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+class Clients:
+    """Runs simulated sessions and tracks how many sockets are open."""
+
+    def __init__(self, url: str, files: int, sizes_kb: list[int], timeout: float):
+        self.url = url.rstrip("/") + "/ws/process"
+        self.files = files
+        self.sizes_kb = sizes_kb
+        self.timeout = timeout
+        self.sessions = itertools.count()
+        self.run_id = os.urandom(4).hex()  # the store outlives the worker, so tags differ per run
+        self.open = 0
+        self.peak_open = 0
+
+    async def session(self, result: StepResult):
+        """One client following the real start/process/end protocol."""
+        result.started += 1
+        started = time.monotonic()
+        try:
+            ws = await asyncio.wait_for(
+                websockets.connect(self.url, max_size=None, open_timeout=None),
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            result.connect_failed += 1
+            result.count_error(f"connect: {type(e).__name__}")
+            return
+
+        self.open += 1
+        self.peak_open = max(self.peak_open, self.open)
+        # File i gets the i-th size of --file-kb, cycling, and audio no other file has
+        session_id = next(self.sessions)
+        payloads = {
+            f"load_{i}.wav": make_wav(
+                self.sizes_kb[i % len(self.sizes_kb)], f"{self.run_id}:{session_id}:{i}".encode()
+            )
+            for i in range(self.files)
+        }
+        try:
+            async with asyncio.timeout(self.timeout):
+                await ws.send(
+                    json.dumps(
+                        {
+                            "type": "start",
+                            "count": len(payloads),
+                            "files": [
+                                {"name": name, "size": len(data) * 3 // 4, "mime": "audio/wav"}
+                                for name, data in payloads.items()
+                            ],
+                        }
+                    )
+                )
+                failures = 0
+                async for frame in ws:
+                    message = json.loads(frame)
+                    batch = message["messages"] if message["type"] == "batch" else [message]
+                    for item in batch:
+                        if item["type"] == "ready":
+                            for name in item["accepted"]:
+                                await ws.send(
+                                    json.dumps(
+                                        {
+                                            "type": "process",
+                                            "files": [{"name": name, "data": payloads[name], "mime": "audio/wav"}],
+                                        }
+                                    )
+                                )
+                            await ws.send(json.dumps({"type": "end"}))
+                        elif item["type"] == "complete":
+                            result.file_latencies.append(time.monotonic() - started)
+                        elif item["type"] == "error":
+                            failures += 1
+                            result.count_error(item.get("code", "UNKNOWN"))
+                        elif item["type"] == "done":
+                            break
+                    else:
+                        continue
+                    break
+            if failures:
+                result.failed += 1
+            else:
+                result.completed += 1
+                result.latencies.append(time.monotonic() - started)
+        except Exception as e:
+            result.failed += 1
+            result.count_error(type(e).__name__)
+        finally:
+            self.open -= 1
+            await ws.close()
+
+    async def run_step(self, rate: float, seconds: float) -> StepResult:
+        """Start sessions open-loop at rate per second for seconds, then wait for them."""
+        result = StepResult(rate=rate)
+        sessions: set[asyncio.Task] = set()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            task = asyncio.create_task(self.session(result))
+            sessions.add(task)
+            task.add_done_callback(sessions.discard)
+            # Exponential gaps: arrivals do not wait for the server to keep up
+            await asyncio.sleep(random.expovariate(rate))
+        if sessions:
+            await asyncio.wait(sessions)
+        return result
+
+
+# --- Sampling and reporting ----------------------------------------------------
+
+
+async def sample(http_url: str, pid: Optional[int], interval: float, samples: list[dict], clients: Clients):
+    """Record worker RSS, /stats and open client sockets every interval seconds."""
+    started = time.monotonic()
+    async with httpx.AsyncClient(timeout=5) as client:
+        while True:
+            point = {"t": time.monotonic() - started, "open": clients.open}
+            if pid is not None:
+                point["rss_mb"] = rss_mb(pid)
+            try:
+                stats = (await client.get(f"{http_url}/stats")).json()
+                point.update(tasks=stats["tasks"], sessions=stats["sessions"], exports=stats["exports"])
+            except Exception:
+                pass
+            samples.append(point)
+            await asyncio.sleep(interval)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def slope_per_hour(samples: list[dict], key: str) -> Optional[float]:
+    """Least-squares growth of a sampled value, per hour, ignoring the first 10%."""
+    points = [(s["t"], s[key]) for s in samples if s.get(key) is not None]
+    points = points[len(points) // 10 :]
+    if len(points) < 3:
+        return None
+    slope = statistics.linear_regression([t for t, _ in points], [v for _, v in points]).slope
+    return slope * 3600
+
+
+def print_report(results: list[StepResult], step_seconds: float, clients: Clients):
+    print(f"\n{'rate/s':>7} {'started':>8} {'done':>6} {'failed':>7} {'connfail':>9} "
+          f"{'thru/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'file s':>7}")
+    for r in results:
+        mean_file = statistics.fmean(r.file_latencies) if r.file_latencies else float("nan")
+        print(
+            f"{r.rate:7.1f} {r.started:8d} {r.completed:6d} {r.failed:7d} {r.connect_failed:9d} "
+            f"{r.completed / step_seconds:7.2f} {percentile(r.latencies, 0.5):7.2f} "
+            f"{percentile(r.latencies, 0.95):7.2f} {percentile(r.latencies, 0.99):7.2f} "
+            f"{mean_file:7.2f}"
+        )
+        for kind, count in sorted(r.errors.items()):
+            print(f"{'':>7}   {kind}: {count}")
+    print(f"\nPeak open client sockets: {clients.peak_open}")
+
+
+def raise_fd_limit():
+    """Thousands of clients need thousands of file descriptors."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+async def run(args) -> int:
+    mock = server = None
+    ws_url = args.url
+    if ws_url is None:
+        mock = multiprocessing.Process(
+            target=run_mock_upstream,
+            args=(MOCK_PORT, args.upstream_latency, args.upstream_jitter, args.upstream_seconds_per_mb),
+            daemon=True,
+        )
+        mock.start()
+        server = start_server(SERVER_PORT, MOCK_PORT, args.env)
+        ws_url = f"ws://127.0.0.1:{SERVER_PORT}"
+    http_url = ws_url.replace("ws", "http", 1)
+
+    try:
+        # Wait for the worker to come up
+        async with httpx.AsyncClient() as client:
+            for _ in range(100):
+                try:
+                    if (await client.get(f"{http_url}/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                print("Server did not come up")
+                return 1
+
+        clients = Clients(ws_url, args.files, args.file_kb, args.session_timeout)
+        samples: list[dict] = []
+        sampler = asyncio.create_task(
+            sample(http_url, server.pid if server else None, args.sample_seconds, samples, clients)
+        )
+
+        results = []
+        for rate in args.rates:
+            print(f"Offering {rate}/s for {args.step_seconds}s...")
+            results.append(await clients.run_step(rate, args.step_seconds))
+        # One more sample with everything idle, for leak checks
+        await asyncio.sleep(args.sample_seconds)
+        sampler.cancel()
+
+        print_report(results, args.step_seconds, clients)
+        if samples:
+            last = samples[-1]
+            print(f"Idle after run: tasks={last.get('tasks')} sessions={last.get('sessions')} "
+                  f"exports={last.get('exports')} rss={last.get('rss_mb')}MB")
+        if args.json:
+            Path(args.json).write_text(
+                json.dumps({"steps": [r.__dict__ for r in results], "samples": samples}, indent=2)
+            )
+
+        failed = False
+        if args.soak:
+            rss_growth = slope_per_hour(samples, "rss_mb")
+            task_growth = slope_per_hour(samples, "tasks")
+            print(f"RSS growth: {rss_growth:.1f} MB/h" if rss_growth is not None else "RSS growth: n/a")
+            print(f"Task growth: {task_growth:.1f}/h" if task_growth is not None else "Task growth: n/a")
+            if rss_growth is not None and rss_growth > args.leak_mb_per_hour:
+                print("FAIL: memory keeps growing")
+                failed = True
+            if samples and samples[-1].get("sessions"):
+                print("FAIL: sessions still held after every client finished")
+                failed = True
+        return 1 if failed else 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if mock is not None:
+            mock.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="ws:// base of a running server; default starts one locally")
+    parser.add_argument("--rates", type=lambda v: [float(r) for r in v.split(",")], default=[5.0],
+                        help="comma-separated session arrival rates per second, one step each")
+    parser.add_argument("--step-seconds", type=float, default=30)
+    parser.add_argument("--files", type=int, default=2, help="files per session")
+    parser.add_argument("--file-kb", type=lambda v: [int(s) for s in v.split(",")], default=[256],
+                        help="comma-separated file sizes, cycled through a session's files")
+    parser.add_argument("--upstream-latency", type=float, default=2.0)
+    parser.add_argument("--upstream-jitter", type=float, default=0.5)
+    parser.add_argument("--upstream-seconds-per-mb", type=float, default=0.0,
+                        help="extra mock latency per MB of request body")
+    parser.add_argument("--session-timeout", type=float, default=300)
+    parser.add_argument("--sample-seconds", type=float, default=5)
+    parser.add_argument("--soak", action="store_true", help="fail on memory growth or leaked sessions")
+    parser.add_argument("--leak-mb-per-hour", type=float, default=DEFAULT_LEAK_MB_PER_HOUR)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the local server, e.g. PIPELINE_SYNTHESIS=true")
+    parser.add_argument("--json", help="write per-step results and samples to this file")
+    args = parser.parse_args()
+
+    print(f"File descriptor limit: {raise_fd_limit()}")
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
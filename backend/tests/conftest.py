@@ -0,0 +1,15 @@
+"""Shared fixtures. Settings need an API key, so tests get a dummy one."""
+
+import os
+
+import pytest
+
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+
+from app.services.artifacts import ArtifactStore  # noqa: E402
+
+
+@pytest.fixture
+def artifact_store(tmp_path) -> ArtifactStore:
+    """A store that spills anything over 1KB into tmp_path."""
+    return ArtifactStore(spill_threshold=1024, directory=str(tmp_path))
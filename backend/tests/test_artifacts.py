@@ -0,0 +1,48 @@
+import mmap
+
+
+def test_small_payloads_stay_in_memory(artifact_store, tmp_path):
+    with artifact_store.create(suffix=".wav") as artifact:
+        artifact.write(b"x" * 1000)
+        assert not artifact.spilled
+        assert bytes(artifact.view()) == b"x" * 1000
+        assert artifact_store.stats() == {"artifacts": 1, "memory_bytes": 1000, "disk_bytes": 0}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_payloads_past_the_threshold_spill_to_a_mapped_file(artifact_store, tmp_path):
+    artifact = artifact_store.create(suffix=".wav")
+    for _ in range(3):
+        artifact.write(b"y" * 500)
+    assert artifact.spilled
+    [path] = tmp_path.iterdir()
+    assert path.suffix == ".wav"
+
+    view = artifact.view()
+    assert isinstance(view, mmap.mmap)
+    assert view[:] == b"y" * 1500
+    assert b"".join(artifact.chunks(400)) == b"y" * 1500
+    assert artifact_store.stats() == {"artifacts": 1, "memory_bytes": 0, "disk_bytes": 1500}
+
+    artifact.release()
+    artifact.release()
+    assert list(tmp_path.iterdir()) == []
+    assert artifact_store.stats()["artifacts"] == 0
+
+
+def test_ensure_file_spills_on_demand(artifact_store):
+    with artifact_store.create(suffix=".mp3") as artifact:
+        artifact.write(b"abc")
+        path = artifact.ensure_file()
+        assert path.read_bytes() == b"abc"
+        assert artifact.spilled
+    assert not path.exists()
+
+
+def test_adopted_files_are_deleted_on_release(artifact_store, tmp_path):
+    path = tmp_path / "upload.wav"
+    path.write_bytes(b"z" * 2000)
+    with artifact_store.adopt(path) as artifact:
+        assert artifact.size == 2000
+        assert artifact.view()[:10] == b"z" * 10
+    assert not path.exists()
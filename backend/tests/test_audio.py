@@ -0,0 +1,133 @@
+import asyncio
+import io
+import struct
+import sys
+import wave
+
+import pytest
+
+from app.services import audio
+from app.services.audio import parse_audio_header
+
+
+def _box(box_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(body)) + box_type + body
+
+
+def _ogg_page(granule: int, packet: bytes) -> bytes:
+    header = b"OggS" + bytes([0, 0]) + struct.pack("<q", granule) + bytes(12)
+    return header + bytes([1, len(packet)]) + packet
+
+
+def make_wav(seconds: float, rate: int = 8000, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(bytes(int(seconds * rate) * channels * 2))
+    return buffer.getvalue()
+
+
+def make_mp3(seconds: float, id3: bool = False) -> bytes:
+    # MPEG-1 Layer III, 128 kbps, 44.1kHz, joint stereo: 16000 bytes per second
+    frame = b"\xff\xfb\x90\x44"
+    tag = b"ID3\x03\x00\x00\x00\x00\x00\x00" if id3 else b""
+    return tag + frame + bytes(int(seconds * 16000) - len(frame))
+
+
+def make_flac(seconds: float, rate: int = 44100, channels: int = 2) -> bytes:
+    packed = (rate << 44) | ((channels - 1) << 41) | (15 << 36) | int(seconds * rate)
+    streaminfo = bytes(10) + packed.to_bytes(8, "big") + bytes(16)
+    return b"fLaC" + bytes([0, 0, 0, len(streaminfo)]) + streaminfo
+
+
+def make_ogg_vorbis(seconds: float, rate: int = 48000, channels: int = 2) -> bytes:
+    ident = b"\x01vorbis" + struct.pack("<IBI", 0, channels, rate) + bytes(13)
+    return _ogg_page(0, ident) + _ogg_page(int(seconds * rate), b"audio")
+
+
+def make_ogg_opus(seconds: float, pre_skip: int = 312) -> bytes:
+    head = b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 16000, 0, 0)
+    return _ogg_page(0, head) + _ogg_page(int(seconds * 48000) + pre_skip, b"audio")
+
+
+def make_aiff(seconds: float, rate: int = 44100, channels: int = 1) -> bytes:
+    exponent = rate.bit_length() - 1
+    extended = struct.pack(">HQ", 16383 + exponent, rate << (63 - exponent))
+    comm = struct.pack(">HIH", channels, int(seconds * rate), 16) + extended
+    chunk = b"COMM" + struct.pack(">I", len(comm)) + comm
+    return b"FORM" + struct.pack(">I", 4 + len(chunk)) + b"AIFF" + chunk
+
+
+def make_m4a(seconds: float, timescale: int = 1000, rate: int = 44100, channels: int = 2) -> bytes:
+    mvhd = bytes(4) + bytes(8) + struct.pack(">II", timescale, int(seconds * timescale)) + bytes(80)
+    mp4a = b"mp4a" + bytes(16) + struct.pack(">H", channels) + bytes(6) + struct.pack(">I", rate << 16)
+    moov = _box(b"moov", _box(b"mvhd", mvhd) + _box(b"trak", mp4a))
+    return _box(b"ftyp", b"M4A " + bytes(4)) + moov
+
+
+@pytest.mark.parametrize(
+    "filename, data, channels, sample_rate, codec",
+    [
+        ("a.wav", make_wav(2.0), 1, 8000, "pcm"),
+        ("a.mp3", make_mp3(2.0), 2, 44100, "mp3"),
+        ("a.mp3", make_mp3(2.0, id3=True), 2, 44100, "mp3"),
+        ("a.flac", make_flac(2.0), 2, 44100, "flac"),
+        ("a.ogg", make_ogg_vorbis(2.0), 2, 48000, "vorbis"),
+        ("a.ogg", make_ogg_opus(2.0), 1, 16000, "opus"),
+        ("a.aiff", make_aiff(2.0), 1, 44100, "pcm"),
+        ("a.m4a", make_m4a(2.0), 2, 44100, "aac"),
+    ],
+)
+def test_header_probes_read_format_and_duration(filename, data, channels, sample_rate, codec):
+    info = parse_audio_header(data, filename)
+    assert info is not None
+    assert info.duration_seconds == pytest.approx(2.0, abs=0.01)
+    assert (info.channels, info.sample_rate, info.codec) == (channels, sample_rate, codec)
+
+
+def test_extension_decides_the_probe():
+    assert parse_audio_header(make_wav(1.0), "a.mp3") is None
+    assert parse_audio_header(make_mp3(1.0), "a.wav") is None
+    assert parse_audio_header(make_wav(1.0), "a.aac") is None
+
+
+@pytest.mark.parametrize(
+    "filename, data",
+    [
+        ("a.wav", make_wav(1.0)[:30]),
+        ("a.flac", make_flac(1.0)[:20]),
+        ("a.ogg", make_ogg_vorbis(1.0)[:30]),
+        ("a.m4a", make_m4a(1.0)[:40]),
+        ("a.mp3", bytes(100)),
+    ],
+)
+def test_truncated_or_garbled_headers_give_none(filename, data):
+    assert parse_audio_header(data, filename) is None
+
+
+def test_cancelled_probe_kills_ffprobe(monkeypatch, tmp_path):
+    spawned = []
+
+    async def create_subprocess_exec(*args, **kwargs):
+        # A stand-in for an ffprobe that hangs on a bad file
+        process = await real_exec(sys.executable, "-c", "import time; time.sleep(30)", **kwargs)
+        spawned.append(process)
+        return process
+
+    real_exec = asyncio.create_subprocess_exec
+    monkeypatch.setattr(audio.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    path = tmp_path / "a.wav"
+    path.write_bytes(b"not audio")
+
+    async def main():
+        probe = asyncio.create_task(audio._ffprobe(path))
+        await asyncio.sleep(0.2)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        [process] = spawned
+        assert process.returncode is not None
+
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.services.drain import Drain
+
+
+def test_drain_waits_for_held_work_then_runs_callbacks():
+    async def main():
+        drain = Drain()
+        events: list[str] = []
+        session, job = object(), object()
+        drain.hold(session)
+        drain.hold(job)
+
+        async def reconnect():
+            events.append("reconnect")
+
+        drain.on_drained(reconnect)
+        draining = asyncio.create_task(drain.drain(timeout=5))
+        await asyncio.sleep(0)
+        assert drain.draining
+        assert drain.in_flight == 2
+
+        drain.release(session)
+        drain.release(session)  # releasing twice is harmless
+        await asyncio.sleep(0)
+        assert not draining.done()
+
+        drain.release(job)
+        await asyncio.wait_for(draining, timeout=0.1)
+        assert events == ["reconnect"]
+
+    asyncio.run(main())
+
+
+def test_drain_gives_up_at_the_timeout():
+    async def main():
+        drain = Drain()
+        drain.hold(object())
+        events: list[str] = []
+
+        async def failing():
+            raise RuntimeError("socket gone")
+
+        async def reconnect():
+            events.append("reconnect")
+
+        drain.on_drained(failing)
+        drain.on_drained(reconnect)
+        await asyncio.wait_for(drain.drain(timeout=0.05), timeout=1)
+        assert drain.in_flight == 1
+        assert events == ["reconnect"]
+
+    asyncio.run(main())
+
+
+def test_unregistered_callbacks_are_not_run():
+    async def main():
+        drain = Drain()
+        events: list[str] = []
+
+        async def reconnect():
+            events.append("reconnect")
+
+        stop = drain.on_drained(reconnect)
+        stop()
+        await drain.drain(timeout=1)
+        assert events == []
+
+    asyncio.run(main())
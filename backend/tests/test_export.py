@@ -0,0 +1,102 @@
+import io
+import json
+import time
+import zipfile
+
+from app.config import get_settings
+from app.services import export
+from app.services.export import (
+    EXPORT_CHUNK_SIZE,
+    ExportEntry,
+    get_export,
+    register_export,
+    stream_zip,
+)
+
+
+def _open(entries, include_transcripts=False) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(entries, include_transcripts))))
+
+
+def test_archive_holds_results_and_manifest():
+    entries = [
+        ExportEntry(source="call.mp3", content="# Call", transcript="**A:** hi"),
+        ExportEntry(source="broken.wav", error="THE ROBOTS COULDN'T HEAR THAT."),
+    ]
+    with _open(entries, include_transcripts=True) as archive:
+        assert sorted(archive.namelist()) == [
+            "call_smelt.md",
+            "manifest.json",
+            "transcripts/call_transcript.md",
+        ]
+        assert archive.read("call_smelt.md").decode() == "# Call"
+        manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["files"] == [
+        {
+            "source": "call.mp3",
+            "output": "call_smelt.md",
+            "transcript": "transcripts/call_transcript.md",
+            "error": None,
+        },
+        {
+            "source": "broken.wav",
+            "output": None,
+            "transcript": None,
+            "error": "THE ROBOTS COULDN'T HEAR THAT.",
+        },
+    ]
+
+
+def test_sources_sharing_a_stem_get_unique_names():
+    entries = [
+        ExportEntry(source="call.wav", content="one"),
+        ExportEntry(source="call.mp3", content="two"),
+        ExportEntry(source="call.wav", content="three"),
+    ]
+    with _open(entries) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        outputs = [item["output"] for item in manifest["files"]]
+        assert outputs == ["call_smelt.md", "call_smelt_2.md", "call_smelt_3.md"]
+        assert [archive.read(name).decode() for name in outputs] == ["one", "two", "three"]
+
+
+def test_large_content_streams_in_pieces():
+    text = "".join(f"line {i}\n" for i in range(200_000))
+    chunks = list(stream_zip([ExportEntry(source="long.txt", content=text)]))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 2 * EXPORT_CHUNK_SIZE for chunk in chunks)
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.read("long_smelt.md").decode() == text
+
+
+def _mb(count: float) -> list[ExportEntry]:
+    return [ExportEntry(source="call.mp3", content="x" * int(count * 1024 * 1024))]
+
+
+def test_oldest_exports_go_first_past_the_size_cap(monkeypatch):
+    monkeypatch.setattr(export, "_exports", {})
+    monkeypatch.setattr(get_settings(), "export_max_mb", 2)
+    first = register_export(_mb(1))
+    second = register_export(_mb(0.5))
+    third = register_export(_mb(1))
+    assert get_export(first) is None
+    assert get_export(second) is not None
+    assert get_export(third) is not None
+    assert len(export._exports) == 2
+
+
+def test_newest_export_is_kept_even_over_the_cap(monkeypatch):
+    monkeypatch.setattr(export, "_exports", {})
+    monkeypatch.setattr(get_settings(), "export_max_mb", 1)
+    register_export(_mb(0.5))
+    newest = register_export(_mb(3))
+    assert len(export._exports) == 1
+    assert get_export(newest).size == 3 * 1024 * 1024
+
+
+def test_exports_expire_after_the_ttl(monkeypatch):
+    monkeypatch.setattr(export, "_exports", {})
+    export_id = register_export(_mb(0.1))
+    later = time.monotonic() + get_settings().job_ttl_seconds + 1
+    monkeypatch.setattr(export.time, "monotonic", lambda: later)
+    assert get_export(export_id) is None
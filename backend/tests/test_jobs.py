@@ -0,0 +1,88 @@
+from app.errors import FileTooLargeError, TooManyFilesError
+from app.routers.jobs import MultipartParser, MultipartSpool
+
+BOUNDARY = "smelt-test-boundary"
+
+
+def _body(*parts: tuple[str, str, bytes]) -> bytes:
+    """multipart/form-data with (field, filename, payload) parts; no filename makes a text field."""
+    body = b""
+    for field_name, filename, payload in parts:
+        disposition = f'form-data; name="{field_name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if filename:
+            body += b"Content-Type: audio/wav\r\n"
+        body += b"\r\n" + payload + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _spool(tmp_path, body: bytes, max_size_bytes: int = 1024, max_file_count: int = 3):
+    """Feed body through a spool a few bytes at a time, as a request stream would."""
+    spool = MultipartSpool(tmp_path, max_size_bytes, max_file_count)
+    parser = MultipartParser(BOUNDARY.encode(), spool.callbacks())
+    try:
+        for start in range(0, len(body), 7):
+            parser.write(body[start : start + 7])
+            if spool.error is not None:
+                break
+        else:
+            parser.finalize()
+    finally:
+        spool.close()
+    return spool
+
+
+def test_files_go_to_disk_and_fields_stay_in_memory(tmp_path):
+    spool = _spool(
+        tmp_path,
+        _body(("files", "call.wav", b"RIFF" + bytes(200)), ("text", None, "notes ✓".encode())),
+    )
+    assert spool.error is None
+    assert spool.fields == {"text": "notes ✓"}
+    [file] = spool.files
+    assert (file.name, file.mime, file.data) == ("call.wav", "audio/wav", "")
+    assert file.path.parent == tmp_path
+    assert file.path.read_bytes() == b"RIFF" + bytes(200)
+
+
+def test_files_sharing_a_name_are_all_kept(tmp_path):
+    spool = _spool(
+        tmp_path,
+        _body(
+            ("files", "call.wav", b"one"),
+            ("files", "call.wav", b"two"),
+            ("files", "call.wav", b"three"),
+        ),
+    )
+    assert [file.name for file in spool.files] == ["call.wav", "call_2.wav", "call_3.wav"]
+    assert [file.path.read_bytes() for file in spool.files] == [b"one", b"two", b"three"]
+
+
+def test_upload_stops_at_the_first_oversized_part(tmp_path):
+    spool = _spool(
+        tmp_path,
+        _body(("files", "small.wav", bytes(100)), ("files", "big.wav", bytes(5000))),
+        max_size_bytes=1024,
+    )
+    assert isinstance(spool.error, FileTooLargeError)
+    # Writing stopped at the limit rather than taking the whole part
+    assert all(path.stat().st_size <= 1024 for path in tmp_path.iterdir())
+
+
+def test_oversized_text_field_is_refused(tmp_path):
+    spool = _spool(tmp_path, _body(("text", None, b"x" * 2000)), max_size_bytes=1024)
+    assert isinstance(spool.error, FileTooLargeError)
+    assert "text" not in spool.fields
+
+
+def test_upload_stops_at_one_file_too_many(tmp_path):
+    spool = _spool(
+        tmp_path,
+        _body(*(("files", f"{i}.wav", b"data") for i in range(4))),
+        max_file_count=3,
+    )
+    assert isinstance(spool.error, TooManyFilesError)
+    assert len(spool.files) == 3
+    assert len(list(tmp_path.iterdir())) == 3
@@ -0,0 +1,374 @@
+import asyncio
+import base64
+import functools
+import json
+import time
+
+import httpx
+import pytest
+
+from app.errors import LLMTimeoutError
+from app.services import llm
+from app.services.deadline import Deadline
+from app.services.llm import LLMBackend, LLMResponse, OpenRouterClient, encode_body, with_retries
+
+
+def _client(*backends: LLMBackend, hedge: bool = False) -> OpenRouterClient:
+    client = OpenRouterClient()
+    client.backends = {"synthesis": list(backends)}
+    client.hedge_requests = hedge
+    client.hedge_min_samples = 5
+    client.unhealthy_error_rate = 0.5
+    client.error_half_life = 60
+    return client
+
+
+def _backend(name: str, latency=None, error_rate=0.0) -> LLMBackend:
+    backend = LLMBackend(name=name, url=f"https://{name}.test/v1/chat", model=f"{name}-model")
+    backend.latency_ewma = latency
+    backend.error_rate = error_rate
+    backend.error_at = time.monotonic()
+    return backend
+
+
+def _names(backends: list[LLMBackend]) -> list[str]:
+    return [backend.name for backend in backends]
+
+
+def _fake_upstream(delays: dict[str, float], calls: list[str], cancelled: list[str]):
+    """A _make_request stand-in that answers from each backend after its delay."""
+
+    async def make_request(backend, *args):
+        calls.append(backend.name)
+        try:
+            await asyncio.sleep(delays[backend.name])
+        except asyncio.CancelledError:
+            cancelled.append(backend.name)
+            raise
+        return LLMResponse(content=backend.name, model=backend.model, tokens_used=1)
+
+    return make_request
+
+
+# --- Routing ------------------------------------------------------------------
+
+
+def test_ranking_prefers_healthy_then_fastest():
+    client = _client(
+        _backend("slow", latency=2.0),
+        _backend("failing", latency=0.1, error_rate=0.9),
+        _backend("fast", latency=0.5),
+    )
+    assert _names(client.rank_backends("synthesis")) == ["fast", "slow", "failing"]
+
+
+def test_backends_without_latency_data_are_probed_first():
+    client = _client(_backend("known", latency=0.5), _backend("new"))
+    assert _names(client.rank_backends("synthesis"))[0] == "new"
+
+
+def test_outcomes_update_the_ewmas():
+    backend = _backend("b")
+    backend.record_success(1.0, alpha=0.5)
+    backend.record_success(3.0, alpha=0.5)
+    assert backend.latency_ewma == pytest.approx(2.0)
+    backend.record_failure(alpha=0.5)
+    backend.record_failure(alpha=0.5)
+    assert backend.error_rate == pytest.approx(0.75)
+    backend.record_success(1.0, alpha=0.5)
+    assert backend.error_rate == pytest.approx(0.375)
+
+
+def test_error_rate_halves_every_half_life(monkeypatch):
+    backend = _backend("b", error_rate=0.8)
+    now = backend.error_at + 60
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now)
+    assert backend.decay_errors(half_life=60) == pytest.approx(0.4)
+    # Decay is measured from the last update, so asking again changes nothing
+    assert backend.decay_errors(half_life=60) == pytest.approx(0.4)
+
+
+def test_unhealthy_backend_is_retried_once_its_errors_decay(monkeypatch):
+    client = _client(_backend("flaky", latency=0.1, error_rate=0.9), _backend("steady", latency=1.0))
+    assert _names(client.rank_backends("synthesis"))[0] == "steady"
+    now = time.monotonic() + 2 * client.error_half_life
+    monkeypatch.setattr(llm.time, "monotonic", lambda: now)
+    assert _names(client.rank_backends("synthesis"))[0] == "flaky"
+
+
+def test_failed_request_counts_against_the_backend():
+    primary = _backend("primary", latency=0.1)
+    client = _client(primary, _backend("backup", latency=0.2))
+
+    async def make_request(backend, *args):
+        raise ValueError("boom")
+
+    client._make_request = make_request
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            asyncio.run(client.complete([], "synthesis"))
+    assert primary.error_rate > client.unhealthy_error_rate
+    assert _names(client.rank_backends("synthesis"))[0] == "backup"
+
+
+# --- Hedging ------------------------------------------------------------------
+
+
+def _hedged_client(primary_delay: float, backup_delay: float, calls, cancelled) -> OpenRouterClient:
+    primary = _backend("primary", latency=0.01)
+    primary.latencies.extend([0.05] * 5)  # p95 of 50ms: the hedge fires after that
+    client = _client(primary, _backend("backup", latency=0.02), hedge=True)
+    client._make_request = _fake_upstream(
+        {"primary": primary_delay, "backup": backup_delay}, calls, cancelled
+    )
+    return client
+
+
+def test_hedge_goes_to_runner_up_past_p95_and_first_answer_wins():
+    calls, cancelled = [], []
+    client = _hedged_client(primary_delay=5, backup_delay=0, calls=calls, cancelled=cancelled)
+    response = asyncio.run(client.complete([], "synthesis"))
+    assert response.content == "backup"
+    assert calls == ["primary", "backup"]
+    assert cancelled == ["primary"]
+
+
+def test_no_hedge_when_primary_answers_in_time():
+    calls, cancelled = [], []
+    client = _hedged_client(primary_delay=0, backup_delay=0, calls=calls, cancelled=cancelled)
+    response = asyncio.run(client.complete([], "synthesis"))
+    assert response.content == "primary"
+    assert calls == ["primary"]
+
+
+def test_no_hedge_without_enough_latency_samples():
+    calls, cancelled = [], []
+    client = _hedged_client(primary_delay=0.1, backup_delay=0, calls=calls, cancelled=cancelled)
+    client.backends["synthesis"][0].latencies.clear()
+    response = asyncio.run(client.complete([], "synthesis"))
+    assert response.content == "primary"
+    assert calls == ["primary"]
+
+
+def test_cancel_before_the_hedge_fires_cancels_the_primary():
+    calls, cancelled = [], []
+    client = _hedged_client(primary_delay=5, backup_delay=0, calls=calls, cancelled=cancelled)
+    client.backends["synthesis"][0].latencies.extend([1.0] * 5)  # hedge only after 1s
+
+    async def main():
+        call = asyncio.create_task(client.complete([], "synthesis"))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        # Checked before asyncio.run() cancels whatever is left over
+        await asyncio.sleep(0)
+        assert cancelled == ["primary"]
+
+    asyncio.run(main())
+    assert calls == ["primary"]
+
+
+# --- Streaming ----------------------------------------------------------------
+
+
+def _sse(*deltas: str) -> bytes:
+    events = [
+        f"data: {json.dumps({'model': 'm', 'choices': [{'delta': {'content': d}}]})}\n\n"
+        for d in deltas
+    ]
+    return ("".join(events) + "data: [DONE]\n\n").encode()
+
+
+def _mock_http(monkeypatch, handler):
+    """Route every httpx.AsyncClient through handler instead of the network."""
+    monkeypatch.setattr(
+        httpx,
+        "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)),
+    )
+
+
+async def _collect_stream(client: OpenRouterClient, **kwargs) -> str:
+    return "".join([delta async for delta in client.stream([], "synthesis", **kwargs)])
+
+
+def test_streams_count_toward_health_but_not_latency(monkeypatch):
+    _mock_http(monkeypatch, lambda request: httpx.Response(200, content=_sse("Hello ", "world")))
+    backend = _backend("b", error_rate=0.4)
+    client = _client(backend)
+
+    assert asyncio.run(_collect_stream(client)) == "Hello world"
+    assert backend.latency_ewma is None
+    assert not backend.latencies
+    assert backend.error_rate < 0.4
+
+
+# --- Readiness ----------------------------------------------------------------
+
+
+def test_ready_needs_a_reachable_healthy_backend_per_task():
+    transcription = _backend("t")
+    synthesis = _backend("s")
+    client = _client()
+    client.backends = {"transcription": [transcription], "synthesis": [synthesis]}
+    assert not client.ready()
+
+    transcription.reachable = True
+    assert not client.ready()
+    synthesis.reachable = True
+    assert client.ready()
+
+    synthesis.error_rate = 0.9
+    assert not client.ready()
+    client.backends["synthesis"].append(_backend("spare"))
+    client.backends["synthesis"][-1].reachable = True
+    assert client.ready()
+
+
+def test_warm_up_marks_answering_hosts_reachable(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "down.test":
+            raise httpx.ConnectError("refused")
+        return httpx.Response(404)  # any answer will do
+
+    _mock_http(monkeypatch, handler)
+    up, down = _backend("up"), _backend("down")
+    client = _client(up, down)
+
+    assert asyncio.run(client.warm_up()) is False
+    assert up.reachable and not down.reachable
+    client.backends["synthesis"] = [up]
+    assert asyncio.run(client.warm_up()) is True
+
+
+def test_a_served_request_makes_a_backend_reachable():
+    backend = _backend("b")
+    backend.record_success(None, alpha=0.3)
+    assert backend.reachable
+
+
+# --- Request bodies -----------------------------------------------------------
+
+
+async def _collect(body) -> bytes:
+    if isinstance(body, bytes):
+        return body
+    return b"".join([chunk async for chunk in body])
+
+
+def test_plain_payload_is_bytes():
+    payload = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    length, body = encode_body(payload)
+    assert isinstance(body, bytes)
+    assert length == len(body)
+    assert json.loads(body) == payload
+
+
+def test_artifacts_are_streamed_as_base64(artifact_store):
+    audio = artifact_store.create()
+    audio.write(bytes(range(256)) * 20)  # spills past the store's threshold
+    assert audio.spilled
+    payload = {
+        "model": "m",
+        "messages": [{"role": "user", "content": [{"input_audio": {"data": audio}}]}],
+        "stream": True,
+    }
+
+    length, body = encode_body(payload)
+    raw = asyncio.run(_collect(body))
+    assert length == len(raw)
+    decoded = json.loads(raw)
+    data = decoded["messages"][0]["content"][0]["input_audio"]["data"]
+    assert base64.b64decode(data) == bytes(range(256)) * 20
+    assert decoded["stream"] is True
+    audio.release()
+
+
+def test_each_call_returns_a_fresh_body(artifact_store):
+    audio = artifact_store.create()
+    audio.write(b"abc" * 1000)
+    first = asyncio.run(_collect(encode_body({"data": audio})[1]))
+    second = asyncio.run(_collect(encode_body({"data": audio})[1]))
+    assert first == second
+    audio.release()
+
+
+# --- Deadlines ----------------------------------------------------------------
+
+
+def test_no_attempt_starts_after_the_deadline():
+    calls = []
+
+    @with_retries(max_retries=3, retry_on=(ValueError,), deadline=Deadline.after(0))
+    async def attempt():
+        calls.append(1)
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(attempt())
+    assert not calls
+
+
+def test_no_retry_whose_backoff_would_pass_the_deadline():
+    calls = []
+
+    @with_retries(max_retries=3, retry_on=(ValueError,), deadline=Deadline.after(0.5))
+    async def attempt():
+        calls.append(1)
+        raise ValueError("boom")
+
+    started = time.monotonic()
+    with pytest.raises(ValueError):
+        asyncio.run(attempt())
+    assert calls == [1]  # the first backoff is a full second
+    assert time.monotonic() - started < 0.5
+
+
+def test_deadline_during_the_pre_hedge_wait_cancels_the_primary():
+    calls, cancelled = [], []
+    client = _hedged_client(primary_delay=5, backup_delay=0, calls=calls, cancelled=cancelled)
+    client.backends["synthesis"][0].latencies.extend([1.0] * 5)  # hedge only after 1s
+
+    async def main():
+        with pytest.raises(LLMTimeoutError):
+            await client.complete([], "synthesis", deadline=Deadline.after(0.05))
+        await asyncio.sleep(0)
+        assert cancelled == ["primary"]
+
+    asyncio.run(main())
+    assert calls == ["primary"]
+
+
+def test_timeout_cut_short_by_the_deadline_is_not_a_backend_failure():
+    backend = _backend("b")
+    client = _client(backend)
+
+    async def make_request(backend, *args):
+        raise httpx.ReadTimeout("timed out")
+
+    client._make_request = make_request
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client._timed_request(backend, [], 0.3, 100, client.timeout / 2))
+    assert backend.error_rate == 0
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client._timed_request(backend, [], 0.3, 100, client.timeout))
+    assert backend.error_rate > 0
+
+
+def test_stream_timeout_at_the_deadline_is_not_a_backend_failure(monkeypatch):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.1)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    _mock_http(monkeypatch, handler)
+    backend = _backend("b")
+    client = _client(backend)
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(_collect_stream(client, deadline=Deadline.after(0.05)))
+    assert backend.error_rate == 0
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(_collect_stream(client))
+    assert backend.error_rate > 0
@@ -0,0 +1,406 @@
+import asyncio
+import base64
+
+import pytest
+
+from app.config import get_settings
+from app.errors import ErrorCode, FileTooLargeError, InvalidMessageError, TooManyFilesError
+from app.routers import process
+from app.routers.process import (
+    FileInput,
+    ProcessingSession,
+    SessionWriter,
+    base64_size,
+    decode_to_artifact,
+    frame_file_names,
+    parse_start,
+)
+from app.services.drain import DRAIN_RETRY_AFTER_SECONDS, Drain
+
+
+class FakeWebSocket:
+    """Records the frames a SessionWriter sends; blocks them while paused."""
+
+    def __init__(self):
+        self.frames: list[dict] = []
+        self.unpaused = asyncio.Event()
+        self.unpaused.set()
+
+    async def send_json(self, frame: dict):
+        await self.unpaused.wait()
+        self.frames.append(frame)
+
+
+class Recorder:
+    """Stands in for a session's writer."""
+
+    def __init__(self):
+        self.messages: list[dict] = []
+
+    async def send(self, message: dict):
+        self.messages.append(message)
+
+    def errors(self) -> dict[str, str]:
+        return {m["file"]: m["code"] for m in self.messages if m["type"] == "error"}
+
+
+def _progress(name: str, percent: int) -> dict:
+    return {"type": "progress", "file": name, "percent": percent, "status": "WORKING..."}
+
+
+def _session(max_size_bytes: int = 1000, max_file_count: int = 3):
+    recorder = Recorder()
+    return ProcessingSession(recorder, max_size_bytes, max_file_count), recorder
+
+
+# --- SessionWriter ------------------------------------------------------------
+
+
+def test_progress_bursts_go_out_as_one_batch_with_the_latest_per_file():
+    async def main():
+        websocket = FakeWebSocket()
+        writer = SessionWriter(websocket, coalesce_window=0.05)
+        writer.start()
+        await writer.send(_progress("a.wav", 10))
+        await writer.send(_progress("b.wav", 5))
+        await writer.send(_progress("a.wav", 20))
+        await writer.send({"type": "complete", "file": "b.wav", "content": "# B"})
+        await writer.close()
+        return websocket.frames
+
+    frames = asyncio.run(main())
+    assert frames == [
+        {
+            "type": "batch",
+            "messages": [
+                _progress("a.wav", 20),
+                _progress("b.wav", 5),
+                {"type": "complete", "file": "b.wav", "content": "# B"},
+            ],
+        }
+    ]
+
+
+def test_single_message_is_sent_unwrapped():
+    async def main():
+        websocket = FakeWebSocket()
+        writer = SessionWriter(websocket, coalesce_window=0.05)
+        writer.start()
+        await writer.send({"type": "done"})
+        await writer.close()
+        return websocket.frames
+
+    assert asyncio.run(main()) == [{"type": "done"}]
+
+
+def test_client_not_reading_gets_a_capped_buffer(monkeypatch):
+    monkeypatch.setattr(process, "MAX_PENDING_MESSAGES", 5)
+
+    async def main():
+        websocket = FakeWebSocket()
+        websocket.unpaused.clear()
+        writer = SessionWriter(websocket, coalesce_window=0)
+        writer.start()
+        await writer.send({"type": "error", "file": "first"})
+        await asyncio.sleep(0.01)  # the writer is now stuck sending it
+
+        for i in range(20):
+            await writer.send({"type": "error", "file": str(i)})
+        # Progress still replaces in place rather than growing the buffer
+        for percent in range(50):
+            await writer.send(_progress("a.wav", percent))
+
+        websocket.unpaused.set()
+        await writer.close()
+        return websocket.frames
+
+    first, backlog = asyncio.run(main())
+    assert first["file"] == "first"
+    assert [m["file"] for m in backlog["messages"]] == ["0", "1", "2", "3", "4", "a.wav"]
+    assert backlog["messages"][-1]["percent"] == 49
+
+
+def test_close_without_flush_drops_what_is_queued():
+    async def main():
+        websocket = FakeWebSocket()
+        writer = SessionWriter(websocket, coalesce_window=10)
+        writer.start()
+        await writer.send(_progress("a.wav", 10))
+        await asyncio.sleep(0)
+        await writer.close(flush=False)
+        return websocket.frames
+
+    assert asyncio.run(main()) == []
+
+
+# --- Metadata pre-check and admission -----------------------------------------
+
+
+def test_parse_start_returns_count_and_declared_files():
+    data = {"count": 2, "files": [{"name": "a.wav", "size": 10}, {"name": "b.mp3", "size": 20}]}
+    assert parse_start(data, max_file_count=3) == (2, [("a.wav", 10), ("b.mp3", 20)])
+    assert parse_start({"count": 1}, max_file_count=3) == (1, None)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"count": "2"},
+        {"count": -1},
+        {"count": True},
+        {"files": {"name": "a.wav"}},
+        {"files": ["a.wav"]},
+        {"files": [{"name": "a.wav", "size": -5}]},
+        {"files": [{"name": 7, "size": 5}]},
+        {"files": [{"name": "a.wav", "size": 5}, {"name": "a.wav", "size": 6}]},
+    ],
+)
+def test_parse_start_refuses_malformed_messages(data):
+    with pytest.raises(InvalidMessageError):
+        parse_start(data, max_file_count=3)
+
+
+def test_parse_start_refuses_too_many_files():
+    with pytest.raises(TooManyFilesError):
+        parse_start({"count": 4}, max_file_count=3)
+    with pytest.raises(TooManyFilesError):
+        files = [{"name": f"{i}.wav", "size": 1} for i in range(4)]
+        parse_start({"files": files}, max_file_count=3)
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 998, 999, 1000])
+def test_base64_size_is_exact(size):
+    assert base64_size(base64.b64encode(bytes(size)).decode()) == size
+
+
+def test_admit_measures_size_without_the_padding():
+    session, _ = _session(max_size_bytes=1000)
+    # 1000 bytes encode to 1336 characters, two of them padding
+    exact = FileInput(name="a.wav", data=base64.b64encode(bytes(1000)).decode(), mime="")
+    assert session.admit(exact) is None
+    over = FileInput(name="a.wav", data=base64.b64encode(bytes(1001)).decode(), mime="")
+    assert isinstance(session.admit(over), FileTooLargeError)
+
+
+def test_admit_refuses_undeclared_files_and_one_too_many():
+    async def main():
+        session, recorder = _session(max_file_count=1)
+        accepted = await session.declare_files([("a.wav", 10), ("b.exe", 10), ("c.wav", 10**6)])
+        assert accepted == ["a.wav"]
+        assert recorder.errors() == {
+            "b.exe": ErrorCode.UNSUPPORTED_FORMAT.value,
+            "c.wav": ErrorCode.FILE_TOO_LARGE.value,
+        }
+
+        undeclared = session.admit(FileInput(name="z.wav", data="", mime=""))
+        assert undeclared.message == "FILE NOT CLEARED. DECLARE IT IN START."
+
+        session.file_count = 1
+        file = FileInput(name="a.wav", data="", mime="")
+        assert isinstance(session.admit(file), TooManyFilesError)
+
+    asyncio.run(main())
+
+
+def test_rejected_declared_file_counts_as_finished():
+    async def main():
+        session, recorder = _session()
+        session.expected_count = 1
+        await session.declare_files([("a.wav", 10)])
+        file = FileInput(name="a.wav", data=base64.b64encode(bytes(2000)).decode(), mime="")
+        await session.reject(file, session.admit(file))
+        assert recorder.errors() == {"a.wav": ErrorCode.FILE_TOO_LARGE.value}
+        assert session.is_done()
+
+    asyncio.run(main())
+
+
+def test_frame_file_names_finds_names_in_unparsed_frames():
+    raw = '{"files": [{"name": "a \\"b\\".wav", "data": "AAAA"}, {"name":"c.mp3"}]}'
+    assert frame_file_names(raw) == ['a "b".wav', "c.mp3"]
+    assert frame_file_names('{"type": "process", "text": "' + "x" * 100) == []
+
+
+def test_oversized_frame_refuses_the_files_it_carried(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    monkeypatch.setattr(process, "max_frame_bytes", lambda max_size_bytes: 1000)
+    with TestClient(app).websocket_connect("/ws/process") as websocket:
+        websocket.send_json({"type": "start", "count": 1, "files": [{"name": "a.wav", "size": 10}]})
+        assert websocket.receive_json() == {"type": "ready", "accepted": ["a.wav"]}
+        websocket.send_json(
+            {"type": "process", "files": [{"name": "a.wav", "data": "A" * 2000, "mime": "audio/wav"}]}
+        )
+        error = websocket.receive_json()
+        assert (error["type"], error["file"], error["code"]) == (
+            "error",
+            "a.wav",
+            ErrorCode.FILE_TOO_LARGE.value,
+        )
+        websocket.send_json({"type": "end"})
+        assert websocket.receive_json()["type"] == "done"
+
+
+def test_new_sessions_are_refused_while_draining(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    drain = Drain()
+    drain.draining = True
+    monkeypatch.setattr(process, "get_drain", lambda: drain)
+    with TestClient(app).websocket_connect("/ws/process") as websocket:
+        websocket.send_json({"type": "start", "count": 1})
+        error = websocket.receive_json()
+        assert error["code"] == ErrorCode.SERVER_DRAINING.value
+        assert error["retry_after"] == DRAIN_RETRY_AFTER_SECONDS
+
+
+# --- Decoding -----------------------------------------------------------------
+
+
+@pytest.mark.parametrize("size", [0, 1, 5, 6, 100, 1000])
+def test_decode_to_artifact_matches_b64decode_across_chunks(monkeypatch, artifact_store, size):
+    monkeypatch.setattr(process, "get_artifact_store", lambda: artifact_store)
+    monkeypatch.setattr(process, "DECODE_CHUNK_CHARS", 8)
+    payload = bytes(range(256)) * 4
+    encoded = base64.encodebytes(payload[:size]).decode()  # MIME line breaks every 76 chars
+    with decode_to_artifact(encoded, ".wav") as artifact:
+        assert bytes(artifact.view()) == payload[:size]
+        assert artifact.spilled == (size > artifact_store.spill_threshold)
+
+
+def test_corrupt_base64_leaves_no_artifact_behind(monkeypatch, artifact_store, tmp_path):
+    monkeypatch.setattr(process, "get_artifact_store", lambda: artifact_store)
+    with pytest.raises(ValueError):
+        decode_to_artifact("QUJD" * 500 + "QU", ".wav")
+    assert artifact_store.stats()["artifacts"] == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+# --- Cancellation -------------------------------------------------------------
+
+
+def _stall_processing(monkeypatch) -> list[str]:
+    """Make every file hang in processing until cancelled; returns the names cancelled."""
+    cancelled: list[str] = []
+
+    async def process_file(file, reporter, *args):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(file.name)
+            raise
+
+    monkeypatch.setattr(process, "process_file", process_file)
+    return cancelled
+
+
+def test_cancel_stops_a_running_file_and_counts_it_once(monkeypatch):
+    cancelled = _stall_processing(monkeypatch)
+
+    async def main():
+        session, recorder = _session()
+        session.expected_count = 2
+        await session.add_file(FileInput(name="a.wav", data="AAAA", mime=""))
+        await session.add_file(FileInput(name="b.wav", data="AAAA", mime=""))
+        await asyncio.sleep(0)
+
+        assert await session.cancel("a.wav") == ["a.wav"]
+        await asyncio.sleep(0)
+        assert cancelled == ["a.wav"]
+        assert recorder.errors() == {"a.wav": ErrorCode.CANCELLED.value}
+        assert session.completed_count == 1
+
+        # Already cancelled: nothing to do, and not counted again
+        assert await session.cancel("a.wav") == []
+        assert session.completed_count == 1
+
+        assert await session.cancel() == ["b.wav"]
+        assert session.is_done()
+        await asyncio.wait_for(session.wait_for_all(), timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_cancel_strikes_off_declared_files_not_yet_received(monkeypatch):
+    _stall_processing(monkeypatch)
+
+    async def main():
+        session, recorder = _session()
+        await session.declare_files([("a.wav", 10), ("b.wav", 10)])
+        assert await session.cancel("b.wav") == ["b.wav"]
+        assert recorder.errors() == {"b.wav": ErrorCode.CANCELLED.value}
+        assert session.admit(FileInput(name="b.wav", data="", mime="")) is not None
+        assert session.completed_count == 1
+        assert await session.cancel("b.wav") == []
+
+        assert await session.cancel("nothing.wav") == []
+        assert await session.cancel() == ["a.wav"]
+        assert session.is_done()
+
+    asyncio.run(main())
+
+
+def test_inputs_are_counted_once_however_they_finish():
+    async def main():
+        session, _ = _session()
+        session.expected_count = 2
+        await session._mark_completed("a.wav")
+        await session._mark_completed("a.wav")
+        assert session.completed_count == 1
+        assert not session.is_done()
+        await session._mark_completed("b.wav")
+        assert session.is_done()
+
+    asyncio.run(main())
+
+
+def test_session_deadline_cancels_what_is_left(monkeypatch):
+    _stall_processing(monkeypatch)
+    monkeypatch.setattr(get_settings(), "session_timeout_seconds", 0.05)
+
+    async def main():
+        session, recorder = _session()
+        session.expected_count = 1
+        await session.add_file(FileInput(name="a.wav", data="AAAA", mime=""))
+        await asyncio.wait_for(session.wait_for_all(), timeout=1)
+        assert recorder.errors() == {"a.wav": ErrorCode.LLM_TIMEOUT.value}
+        assert session.is_done()
+
+    asyncio.run(main())
+
+
+# --- Scheduling ---------------------------------------------------------------
+
+
+def test_queued_files_wait_decoded(monkeypatch, artifact_store):
+    _stall_processing(monkeypatch)
+    monkeypatch.setattr(process, "get_artifact_store", lambda: artifact_store)
+    monkeypatch.setattr(get_settings(), "session_max_concurrency", 1)
+
+    async def main():
+        session, recorder = _session(max_size_bytes=10_000)
+        session.expected_count = 3
+        running = FileInput(name="a.wav", data=base64.b64encode(bytes(2000)).decode(), mime="")
+        queued = FileInput(name="b.wav", data=base64.b64encode(bytes(2000)).decode(), mime="")
+        await session.add_file(running)
+        await session.add_file(queued)
+        await asyncio.sleep(0)
+        assert session.scheduler.queued == 1
+        assert queued.data == ""
+        assert queued.audio.size == 2000
+
+        corrupt = FileInput(name="c.wav", data="QUJD" * 500 + "QU", mime="")
+        await session.add_file(corrupt)
+        assert recorder.errors() == {"c.wav": ErrorCode.UNKNOWN.value}
+
+        # Cancelled while still queued, the decoded bytes are let go
+        await session.cancel()
+        await asyncio.sleep(0)
+        assert artifact_store.stats()["artifacts"] == 0
+        assert session.is_done()
+
+    asyncio.run(main())
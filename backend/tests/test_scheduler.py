@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import SessionScheduler
+
+
+def test_sjf_starts_shortest_first():
+    async def main():
+        scheduler = SessionScheduler(slots=1)
+        await scheduler.acquire(1.0)
+        started: list[str] = []
+
+        async def run(name: str, estimate: float):
+            await scheduler.acquire(estimate)
+            started.append(name)
+
+        tasks = [asyncio.create_task(run(name, estimate)) for name, estimate in
+                 (("long", 5.0), ("short", 1.0), ("medium", 3.0))]
+        await asyncio.sleep(0)
+        assert scheduler.queued == 3
+        for _ in tasks:
+            scheduler.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(main()) == ["short", "medium", "long"]
+
+
+def test_fifo_keeps_arrival_order():
+    async def main():
+        scheduler = SessionScheduler(slots=1, order="fifo")
+        await scheduler.acquire(1.0)
+        started: list[str] = []
+
+        async def run(name: str, estimate: float):
+            await scheduler.acquire(estimate)
+            started.append(name)
+
+        tasks = [asyncio.create_task(run(name, estimate)) for name, estimate in
+                 (("long", 5.0), ("short", 1.0))]
+        await asyncio.sleep(0)
+        for _ in tasks:
+            scheduler.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return started
+
+    assert asyncio.run(main()) == ["long", "short"]
+
+
+def test_overdue_input_goes_ahead_of_shorter_ones():
+    async def main():
+        scheduler = SessionScheduler(slots=1, max_wait_seconds=0.05)
+        await scheduler.acquire(1.0)
+        started: list[str] = []
+
+        async def run(name: str, estimate: float):
+            await scheduler.acquire(estimate)
+            started.append(name)
+
+        big = asyncio.create_task(run("big", 10.0))
+        await asyncio.sleep(0.06)
+        small = asyncio.create_task(run("small", 1.0))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(big, small)
+        return started
+
+    assert asyncio.run(main()) == ["big", "small"]
+
+
+def test_cancel_while_queued_leaves_the_queue():
+    async def main():
+        scheduler = SessionScheduler(slots=1)
+        await scheduler.acquire(1.0)
+        waiter = asyncio.create_task(scheduler.acquire(2.0))
+        await asyncio.sleep(0)
+        assert scheduler.queued == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.queued == 0
+
+        # The held slot is still the only one in use
+        scheduler.release()
+        await asyncio.wait_for(scheduler.acquire(1.0), timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_cancel_after_slot_granted_gives_it_back():
+    async def main():
+        scheduler = SessionScheduler(slots=1)
+        await scheduler.acquire(1.0)
+        waiter = asyncio.create_task(scheduler.acquire(2.0))
+        await asyncio.sleep(0)
+
+        # Hand the slot over, then cancel before the waiter gets to run
+        scheduler.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        await asyncio.wait_for(scheduler.acquire(1.0), timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_expected_shorter_input_holds_back_a_longer_one():
+    async def main():
+        scheduler = SessionScheduler(slots=2)
+        await scheduler.acquire(1.0)
+        scheduler.expect("small", 1.0)
+        big = asyncio.create_task(scheduler.acquire(10.0, key="big"))
+        await asyncio.sleep(0)
+        assert not big.done()
+
+        # Once the small one arrives it takes the free slot; the big one
+        # goes when the next slot frees up
+        await asyncio.wait_for(scheduler.acquire(1.0, key="small"), timeout=0.1)
+        assert not big.done()
+        scheduler.release()
+        await asyncio.wait_for(big, timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_idle_slots_are_never_held_back():
+    async def main():
+        scheduler = SessionScheduler(slots=1)
+        scheduler.expect("small", 1.0)
+        await asyncio.wait_for(scheduler.acquire(10.0, key="big"), timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_forget_releases_held_back_input():
+    async def main():
+        scheduler = SessionScheduler(slots=2)
+        await scheduler.acquire(1.0)
+        scheduler.expect("small", 1.0)
+        big = asyncio.create_task(scheduler.acquire(10.0))
+        await asyncio.sleep(0)
+        assert not big.done()
+
+        scheduler.forget("small")
+        await asyncio.wait_for(big, timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_no_limit_when_slots_is_zero():
+    async def main():
+        scheduler = SessionScheduler(slots=0)
+        scheduler.expect("small", 1.0)
+        for _ in range(20):
+            await asyncio.wait_for(scheduler.acquire(10.0), timeout=0.1)
+
+    asyncio.run(main())
+
+
+def test_release_skips_waiters_cancelled_before_they_ran():
+    async def main():
+        scheduler = SessionScheduler(slots=1)
+        await scheduler.acquire(1.0)
+        waiters = [asyncio.create_task(scheduler.acquire(estimate)) for estimate in (2.0, 3.0)]
+        await asyncio.sleep(0)
+
+        # Cancelled together with the running input, which gives its slot
+        # back before either waiter has run to leave the queue
+        for waiter in waiters:
+            waiter.cancel()
+        scheduler.release()
+        for waiter in waiters:
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert scheduler.queued == 0
+
+        await asyncio.wait_for(scheduler.acquire(1.0), timeout=0.1)
+
+    asyncio.run(main())
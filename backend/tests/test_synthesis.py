@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.errors import SynthesisFailedError
+from app.services import synthesis
+from app.services.synthesis import merge_sections, synthesize_sections
+
+
+def test_merge_drops_headings_a_later_section_repeats():
+    parts = [
+        "# Standup\n\n## Updates\n\n- shipped the export",
+        "# Standup\n\n\n- fixed the writer\n\n## Blockers\n\n- none",
+        "## updates \n\n- one more",
+    ]
+    assert merge_sections(parts) == (
+        "# Standup\n\n## Updates\n\n- shipped the export\n\n"
+        "- fixed the writer\n\n## Blockers\n\n- none\n\n"
+        "- one more"
+    )
+
+
+def test_merge_skips_empty_sections():
+    assert merge_sections(["# Notes\n\n- a", "  \n", "# Notes\n"]) == "# Notes\n\n- a"
+
+
+async def _sections(*texts: str, gap: float = 0):
+    for text in texts:
+        await asyncio.sleep(gap)
+        yield text
+
+
+def test_sections_are_synthesized_as_they_arrive_and_merged_in_order(monkeypatch):
+    started: list[tuple[str, bool]] = []
+
+    async def synthesize_text(text, deadline=None, continuation=False, **kwargs):
+        started.append((text, continuation))
+        # Later sections finish first
+        await asyncio.sleep(0.03 if text == "one" else 0)
+        return f"## {text}\n\n- {text}"
+
+    monkeypatch.setattr(synthesis, "synthesize_text", synthesize_text)
+    merged = asyncio.run(synthesize_sections(_sections("one", "two", "three", gap=0.01)))
+    assert started == [("one", False), ("two", True), ("three", True)]
+    assert merged == "## one\n\n- one\n\n## two\n\n- two\n\n## three\n\n- three"
+
+
+def test_a_failed_section_cancels_the_rest(monkeypatch):
+    cancelled: list[str] = []
+
+    async def synthesize_text(text, *args, **kwargs):
+        if text == "bad":
+            raise SynthesisFailedError(details="boom")
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+        return text
+
+    monkeypatch.setattr(synthesis, "synthesize_text", synthesize_text)
+
+    async def main():
+        with pytest.raises(SynthesisFailedError):
+            await synthesize_sections(_sections("slow", "bad"))
+        await asyncio.sleep(0)
+        assert cancelled == ["slow"]
+
+    asyncio.run(main())
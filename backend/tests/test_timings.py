@@ -0,0 +1,56 @@
+import pytest
+
+from app.services.timings import MIN_WEIGHT, RATE_GROWTH, RateHistogram, TimingModel, size_bucket
+
+
+def test_no_estimate_without_enough_samples():
+    model = TimingModel()
+    assert model.estimate("transcription", "m", 60) is None
+    for _ in range(int(MIN_WEIGHT) - 1):
+        model.record("transcription", "m", 60, 30)
+    assert model.estimate("transcription", "m", 60) is None
+
+
+def test_estimate_scales_learned_rate_by_size():
+    model = TimingModel()
+    for _ in range(5):
+        model.record("transcription", "m", 64, 32)
+    # Medians sit at a bin centre, so they are within one bin of the true rate
+    estimate = model.estimate("transcription", "m", 64)
+    assert 32 / RATE_GROWTH <= estimate <= 32 * RATE_GROWTH
+    assert model.estimate("transcription", "m", 100) == pytest.approx(estimate * 100 / 64)
+
+
+def test_estimate_falls_back_to_neighbouring_size_class():
+    model = TimingModel()
+    for _ in range(5):
+        model.record("synthesis", "m", 1000, 2)
+    assert size_bucket(2000) == size_bucket(1000) + 1
+    assert model.estimate("synthesis", "m", 2000) is not None
+    assert model.estimate("synthesis", "m", 1_000_000) is None
+
+
+def test_stages_and_models_are_learned_separately():
+    model = TimingModel()
+    for _ in range(5):
+        model.record("synthesis", "fast", 1000, 1)
+    assert model.estimate("synthesis", "slow", 1000) is None
+    assert model.estimate("transcription", "fast", 1000) is None
+    assert model.stats() == {"synthesis": 1}
+
+
+def test_non_positive_samples_are_ignored():
+    model = TimingModel()
+    for _ in range(5):
+        model.record("decoding", "local", 0, 1)
+        model.record("decoding", "local", 100, 0)
+    assert model.stats() == {}
+
+
+def test_histogram_follows_drift():
+    histogram = RateHistogram()
+    for _ in range(50):
+        histogram.add(1.0)
+    for _ in range(100):
+        histogram.add(10.0)
+    assert 10.0 / RATE_GROWTH <= histogram.median() <= 10.0 * RATE_GROWTH
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services import transcripts
+from app.services.transcripts import TranscriptStore, segment_transcript
+
+
+@pytest.fixture
+def store(tmp_path) -> TranscriptStore:
+    return TranscriptStore(tmp_path / "transcripts.db", ttl_seconds=60)
+
+
+def _later(monkeypatch, seconds: float):
+    now = time.time() + seconds
+    monkeypatch.setattr(transcripts.time, "time", lambda: now)
+
+
+def test_round_trip_keeps_speaker_turns(store):
+    record = asyncio.run(store.save("hash", "call.wav", "**A:** hello\n**B:** hi\nthere"))
+    loaded = asyncio.run(store.get(record.id))
+    assert loaded.segments == segment_transcript("**A:** hello\n**B:** hi\nthere")
+    assert loaded.text == "**A:** hello\n**B:** hi\nthere"
+    assert asyncio.run(store.find_by_hash("hash")).id == record.id
+
+
+def test_expired_transcripts_are_not_returned(store, monkeypatch):
+    record = asyncio.run(store.save("hash", "call.wav", "**A:** hello"))
+    _later(monkeypatch, 61)
+    assert asyncio.run(store.get(record.id)) is None
+    assert asyncio.run(store.find_by_hash("hash")) is None
+
+
+def test_unexpired_transcripts_are_returned(store, monkeypatch):
+    record = asyncio.run(store.save("hash", "call.wav", "**A:** hello"))
+    _later(monkeypatch, 59)
+    assert asyncio.run(store.get(record.id)).id == record.id
+
+
+def test_save_purges_expired_rows(store, monkeypatch):
+    asyncio.run(store.save("old", "old.wav", "**A:** old"))
+    _later(monkeypatch, 61)
+    asyncio.run(store.save("new", "new.wav", "**A:** new"))
+    (count,) = store._db.execute("SELECT COUNT(*) FROM transcripts").fetchone()
+    assert count == 1
+
+
+def test_save_replaces_earlier_transcript_of_same_audio(store):
+    first = asyncio.run(store.save("hash", "call.wav", "**A:** first"))
+    second = asyncio.run(store.save("hash", "call.wav", "**A:** second"))
+    assert asyncio.run(store.get(first.id)) is None
+    assert asyncio.run(store.find_by_hash("hash")).id == second.id
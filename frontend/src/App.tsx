@@ -16,9 +16,11 @@ function App() {
     isProcessing,
     progress,
     results,
+    exportUrl,
     error,
     processFiles,
     processText,
+    cancel,
     reset: wsReset,
   } = useWebSocket();
 
@@ -128,11 +130,11 @@ function App() {
             />
 
             {/* Progress Display */}
-            {isProcessing && <ProgressDisplay progress={progress} />}
+            {isProcessing && <ProgressDisplay progress={progress} onCancel={cancel} />}
           </>
         ) : (
           /* Results View */
-          <ResultsView results={results} onReset={handleReset} />
+          <ResultsView results={results} exportUrl={exportUrl} onReset={handleReset} />
         )}
       </main>
 
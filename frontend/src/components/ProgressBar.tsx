@@ -2,10 +2,21 @@ import type { FileProgress } from '../types';
 
 interface ProgressBarProps {
   progress: FileProgress[];
+  onCancel?: (file: string) => void;
 }
 
 /** Single 10-block progress indicator */
-function ProgressBlocks({ percent, status, error }: { percent: number; status: string; error?: string }) {
+function ProgressBlocks({
+  percent,
+  status,
+  eta,
+  error,
+}: {
+  percent: number;
+  status: string;
+  eta?: number;
+  error?: string;
+}) {
   const blocks = 10;
   const filled = Math.floor(percent / 10);
 
@@ -31,13 +42,13 @@ function ProgressBlocks({ percent, status, error }: { percent: number; status: s
         <span className="text-sm font-bold w-12">{percent}%</span>
       </div>
       <span className={`text-xs uppercase tracking-wider truncate ${error ? 'text-coral' : 'text-gray-600'}`}>
-        {error || status}
+        {error || (eta && percent < 100 ? `${status} ~${Math.ceil(eta)}S` : status)}
       </span>
     </div>
   );
 }
 
-export function ProgressDisplay({ progress }: ProgressBarProps) {
+export function ProgressDisplay({ progress, onCancel }: ProgressBarProps) {
   if (progress.length === 0) return null;
 
   return (
@@ -46,8 +57,18 @@ export function ProgressDisplay({ progress }: ProgressBarProps) {
       <div className="space-y-4">
         {progress.map((file) => (
           <div key={file.name} className="flex flex-col gap-2">
-            <span className="text-sm font-bold truncate max-w-[300px]">{file.name}</span>
-            <ProgressBlocks percent={file.percent} status={file.status} error={file.error} />
+            <div className="flex items-center gap-3">
+              <span className="text-sm font-bold truncate max-w-[300px]">{file.name}</span>
+              {onCancel && file.percent < 100 && !file.error && (
+                <button
+                  onClick={() => onCancel(file.name)}
+                  className="text-xs font-bold uppercase border-2 border-black px-2 hover:bg-coral"
+                >
+                  CANCEL
+                </button>
+              )}
+            </div>
+            <ProgressBlocks percent={file.percent} status={file.status} eta={file.eta} error={file.error} />
           </div>
         ))}
       </div>
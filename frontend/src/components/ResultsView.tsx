@@ -4,10 +4,11 @@ import type { ProcessResult } from '../types';
 
 interface ResultsViewProps {
   results: ProcessResult[];
+  exportUrl: string | null;
   onReset: () => void;
 }
 
-export function ResultsView({ results, onReset }: ResultsViewProps) {
+export function ResultsView({ results, exportUrl, onReset }: ResultsViewProps) {
   const [currentIndex, setCurrentIndex] = useState(0);
   const [copied, setCopied] = useState(false);
 
@@ -30,7 +31,15 @@ export function ResultsView({ results, onReset }: ResultsViewProps) {
   };
 
   const downloadAll = () => {
-    // Combined file for MVP
+    // Server streams a zip of the whole session
+    if (exportUrl) {
+      const a = document.createElement('a');
+      a.href = exportUrl;
+      a.click();
+      return;
+    }
+
+    // Fallback: combined file
     const combined = results
       .map((r) => `${'='.repeat(60)}\n${r.name}\n${'='.repeat(60)}\n\n${r.content}\n\n`)
       .join('\n');
@@ -1,44 +1,64 @@
 import { useCallback, useRef, useState } from 'react';
 import type {
+  BatchMessage,
   FileData,
   FileProgress,
   ProcessResult,
   ServerMessage,
 } from '../types';
-import { fileToFileData } from '../types';
+import { fileToFileData, getMimeType } from '../types';
 
 interface UseWebSocketReturn {
   isConnected: boolean;
   isProcessing: boolean;
   progress: FileProgress[];
   results: ProcessResult[];
+  exportUrl: string | null;
   error: string | null;
   processFiles: (files: File[]) => Promise<void>;
   processText: (text: string) => Promise<void>;
+  cancel: (file?: string) => void;
   reset: () => void;
 }
 
+/** Origin of the backend, for both the socket and HTTP downloads */
+function backendOrigin(): string {
+  const host = import.meta.env.DEV ? 'localhost:8000' : window.location.host;
+  return `${window.location.protocol}//${host}`;
+}
+
 export function useWebSocket(): UseWebSocketReturn {
   const [isConnected, setIsConnected] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
   const [progress, setProgress] = useState<FileProgress[]>([]);
   const [results, setResults] = useState<ProcessResult[]>([]);
+  const [exportUrl, setExportUrl] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
 
   // All refs declared together at the top
   const wsRef = useRef<WebSocket | null>(null);
   const resultsRef = useRef<ProcessResult[]>([]);
   const progressRef = useRef<FileProgress[]>([]);
+  const doneRef = useRef(false);
+  const readyRef = useRef<{
+    resolve: (accepted: string[]) => void;
+    reject: (reason: string) => void;
+  } | null>(null);
 
   // Handle incoming messages - parallel processing version
   const handleMessage = useCallback((msg: ServerMessage) => {
     console.log('[WS] Received:', msg.type);
 
     switch (msg.type) {
+      case 'ready':
+        readyRef.current?.resolve(msg.accepted);
+        readyRef.current = null;
+        break;
+
       case 'progress':
         setProgress((prev) => {
           const updated = prev.map((p) =>
-            p.name === msg.file ? { ...p, percent: msg.percent, status: msg.status } : p
+            p.name === msg.file ? { ...p, percent: msg.percent, status: msg.status, eta: msg.eta_seconds } : p
           );
           progressRef.current = updated;
           return updated;
@@ -50,6 +70,7 @@ export function useWebSocket(): UseWebSocketReturn {
           name: msg.file.replace(/\.[^/.]+$/, '_smelt.md'),
           sourceName: msg.file,
           content: msg.content,
+          transcriptId: msg.transcript_id,
         };
         resultsRef.current = [...resultsRef.current, newResult];
         console.log('[WS] Result added:', resultsRef.current.length);
@@ -64,6 +85,11 @@ export function useWebSocket(): UseWebSocketReturn {
 
       case 'error':
         console.error('[WS] Error:', msg.file, msg.message);
+        if (msg.file === 'unknown' && readyRef.current) {
+          // Whole batch refused before upload
+          readyRef.current.reject(msg.message);
+          readyRef.current = null;
+        }
         setProgress((prev) => {
           const updated = prev.map((p) =>
             p.name === msg.file ? { ...p, percent: 100, error: msg.message } : p
@@ -76,7 +102,9 @@ export function useWebSocket(): UseWebSocketReturn {
       case 'done': {
         // ALL files complete - backend sends this after all parallel tasks finish
         console.log('[WS] All complete:', resultsRef.current.length, 'results');
+        doneRef.current = true;
         setResults([...resultsRef.current]);
+        setExportUrl(msg.export ? `${backendOrigin()}${msg.export}` : null);
         setIsProcessing(false);
 
         // Check if there were any errors
@@ -95,15 +123,23 @@ export function useWebSocket(): UseWebSocketReturn {
         }
         break;
       }
+
+      case 'reconnect':
+        // Server is draining for a restart; the next connection goes elsewhere
+        console.log('[WS] Server restarting:', msg.message);
+        if (!doneRef.current) {
+          setResults([...resultsRef.current]);
+          setIsProcessing(false);
+          setError(`SERVER RESTARTING. TRY AGAIN IN ${msg.retry_after}s.`);
+        }
+        break;
     }
   }, []);
 
   // Connect to WebSocket
   const connect = useCallback((): Promise<WebSocket> => {
     return new Promise((resolve, reject) => {
-      const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-      const host = import.meta.env.DEV ? 'localhost:8000' : window.location.host;
-      const wsUrl = `${protocol}//${host}/ws/process`;
+      const wsUrl = `${backendOrigin().replace(/^http/, 'ws')}/ws/process`;
 
       console.log('[WS] Connecting:', wsUrl);
       const ws = new WebSocket(wsUrl);
@@ -129,8 +165,12 @@ export function useWebSocket(): UseWebSocketReturn {
 
       ws.onmessage = (event) => {
         try {
-          const msg: ServerMessage = JSON.parse(event.data);
-          handleMessage(msg);
+          const msg: ServerMessage | BatchMessage = JSON.parse(event.data);
+          if (msg.type === 'batch') {
+            msg.messages.forEach(handleMessage);
+          } else {
+            handleMessage(msg);
+          }
         } catch (e) {
           console.error('[WS] Parse error:', e);
         }
@@ -145,8 +185,10 @@ export function useWebSocket(): UseWebSocketReturn {
     setError(null);
     setProgress([]);
     setResults([]);
+    setExportUrl(null);
     resultsRef.current = [];
     progressRef.current = [];
+    doneRef.current = false;
     setIsProcessing(true);
 
     // Initialize progress for all files
@@ -155,17 +197,26 @@ export function useWebSocket(): UseWebSocketReturn {
     progressRef.current = initialProgress;
 
     try {
-      console.log('[WS] Converting', files.length, 'files...');
-
-      // Convert all files to base64
-      const fileData: FileData[] = await Promise.all(files.map(fileToFileData));
-
       // Connect to WebSocket
       const ws = await connect();
 
-      // 1. Send start message with file count
+      // 1. Send start message with file count and metadata, so the server can
+      //    reject bad files before any payload is uploaded
       console.log('[WS] Sending start with count:', files.length);
-      ws.send(JSON.stringify({ type: 'start', count: files.length }));
+      const ready = new Promise<string[]>((resolve, reject) => {
+        readyRef.current = { resolve, reject };
+      });
+      ws.send(JSON.stringify({
+        type: 'start',
+        count: files.length,
+        files: files.map((f) => ({ name: f.name, size: f.size, mime: getMimeType(f.name) })),
+      }));
+      const accepted = new Set(await ready);
+
+      // Convert only the cleared files to base64
+      const cleared = files.filter((f) => accepted.has(f.name));
+      console.log('[WS] Converting', cleared.length, 'files...');
+      const fileData: FileData[] = await Promise.all(cleared.map(fileToFileData));
 
       // 2. Send all files immediately (one message per file, but all at once)
       for (const file of fileData) {
@@ -184,7 +235,10 @@ export function useWebSocket(): UseWebSocketReturn {
     } catch (e) {
       console.error('[WS] Error:', e);
       setIsProcessing(false);
-      setError('FAILED TO PROCESS. TRY AGAIN.');
+      setError(typeof e === 'string' ? e : 'FAILED TO PROCESS. TRY AGAIN.');
+      if (wsRef.current) {
+        wsRef.current.close(1000, 'Rejected');
+      }
     }
   }, [connect]);
 
@@ -193,8 +247,10 @@ export function useWebSocket(): UseWebSocketReturn {
     setError(null);
     setProgress([]);
     setResults([]);
+    setExportUrl(null);
     resultsRef.current = [];
     progressRef.current = [];
+    doneRef.current = false;
     setIsProcessing(true);
 
     const initialProgress = [{ name: 'pasted_text', percent: 0, status: 'QUEUED' }];
@@ -215,6 +271,14 @@ export function useWebSocket(): UseWebSocketReturn {
     }
   }, [connect]);
 
+  // Cancel one file, or the whole session when no file is given
+  const cancel = useCallback((file?: string) => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      console.log('[WS] Cancelling:', file ?? 'session');
+      wsRef.current.send(JSON.stringify({ type: 'cancel', file }));
+    }
+  }, []);
+
   // Reset state
   const reset = useCallback(() => {
     if (wsRef.current) {
@@ -228,6 +292,7 @@ export function useWebSocket(): UseWebSocketReturn {
     setIsProcessing(false);
     setProgress([]);
     setResults([]);
+    setExportUrl(null);
     setError(null);
   }, []);
 
@@ -236,9 +301,11 @@ export function useWebSocket(): UseWebSocketReturn {
     isProcessing,
     progress,
     results,
+    exportUrl,
     error,
     processFiles,
     processText,
+    cancel,
     reset,
   };
 }
@@ -12,6 +12,7 @@ export interface ProgressUpdate {
   file: string;
   percent: number;
   status: string;
+  eta_seconds?: number;
 }
 
 /** Completion message from server */
@@ -19,6 +20,7 @@ export interface CompleteMessage {
   type: 'complete';
   file: string;
   content: string;
+  transcript_id?: string; // stored transcript, for a later 'resynthesize'
 }
 
 /** Error message from server */
@@ -27,21 +29,49 @@ export interface ErrorMessage {
   file: string;
   message: string;
   code: string;
+  retry_after?: number; // seconds, when the server is draining or rate limited
 }
 
 /** Done message from server */
 export interface DoneMessage {
   type: 'done';
+  export?: string; // path of the server-side zip export
+}
+
+/** Files cleared by the server's metadata pre-check */
+export interface ReadyMessage {
+  type: 'ready';
+  accepted: string[];
+}
+
+/** Server is shutting down; reconnect to reach another instance */
+export interface ReconnectMessage {
+  type: 'reconnect';
+  message: string;
+  retry_after: number;
 }
 
 /** All possible server messages */
-export type ServerMessage = ProgressUpdate | CompleteMessage | ErrorMessage | DoneMessage;
+export type ServerMessage =
+  | ProgressUpdate
+  | CompleteMessage
+  | ErrorMessage
+  | DoneMessage
+  | ReadyMessage
+  | ReconnectMessage;
+
+/** Several messages coalesced into one frame by the server */
+export interface BatchMessage {
+  type: 'batch';
+  messages: ServerMessage[];
+}
 
 /** Processing result */
 export interface ProcessResult {
   name: string;
   sourceName: string;
   content: string;
+  transcriptId?: string;
 }
 
 /** File processing state */
@@ -49,6 +79,7 @@ export interface FileProgress {
   name: string;
   percent: number;
   status: string;
+  eta?: number;
   error?: string;
 }
 